@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the SAJE project
+
+`generator` makes synthetic catalogs of any size and `scenarios` times the loading,
+search and display of their items. Run them from the root of the repository with
+`python -m benchmarks`, see __main__.py
+"""
+
+from src import version
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = version.__version__
+__maintainer__ = "Quentin Soubeyran"
+__status__ = version.__status__
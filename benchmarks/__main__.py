@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Runs the benchmarks of the SAJE project on synthetic catalogs of several sizes, and
+writes their results as JSON
+
+Usage, from the root of the repository:
+    python -m benchmarks --scales 1000 10000 --output results.json
+"""
+import argparse
+import datetime
+import platform
+import sys
+
+from src import version
+from src.json_utils import jsoncolumn
+from src.json_utils import jsonplus as json
+
+from . import generator, scenarios
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = version.__version__
+__maintainer__ = "Quentin Soubeyran"
+__status__ = version.__status__
+
+SCALES = (1000, 10000, 100000, 1000000)
+
+
+def main(argv=None):
+    defaults = generator.Spec()
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Times SAJE on synthetic catalogs and outputs the results as JSON",
+    )
+    parser.add_argument(
+        "--scales",
+        nargs="+",
+        type=int,
+        default=list(SCALES),
+        help="numbers of items of the catalogs (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=scenarios.REPEAT,
+        help="number of runs of each scenario (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=scenarios.PAGE_SIZE,
+        help="number of items rendered by get_display (default: %(default)s)",
+    )
+    for name in generator.Spec._fields[1:]:
+        parser.add_argument(
+            "--" + name.replace("_", "-"),
+            type=int,
+            default=getattr(defaults, name),
+            help="see generator.Spec (default: %(default)s)",
+        )
+    parser.add_argument(
+        "--output", help="file to write the results to, instead of the standard output"
+    )
+    args = parser.parse_args(argv)
+
+    results = {
+        "saje_version": version.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": jsoncolumn.numpy is not None,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "repeat": args.repeat,
+        "runs": [],
+    }
+    for items in args.scales:
+        spec = generator.Spec(
+            items, *(getattr(args, name) for name in generator.Spec._fields[1:])
+        )
+        log = lambda name: print("%s items: %s" % (items, name), file=sys.stderr)
+        results["runs"].append(
+            {
+                "spec": spec._asdict(),
+                "scenarios": scenarios.run(spec, args.repeat, args.page_size, log),
+            }
+        )
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generator of synthetic SAJE catalogs for the benchmarks
+
+The catalogs only depend on their Spec: the same Spec always gives the same items,
+so that benchmark results of different versions can be compared
+"""
+import random
+from collections import namedtuple
+
+from src import version
+from src.json_utils import jsonplus as json
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = version.__version__
+__maintainer__ = "Quentin Soubeyran"
+__status__ = version.__status__
+
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "zu", "an", "el", "or")
+VOCABULARY_SIZE = 2000
+MAX_TAGS = 5
+MISSING_RATE = 0.05
+
+Spec = namedtuple(
+    "Spec",
+    [
+        "items",
+        "depth",
+        "option_cardinality",
+        "text_length",
+        "array_fields",
+        "seed",
+    ],
+    defaults=(1000, 2, 16, 80, 2, 0),
+)
+Spec.__doc__ = """
+Parameters of a synthetic catalog
+
+Args:
+    items               : the number of items
+    depth               : the nesting depth of the objects holding the `level` and
+        `category` values of the items, 1 for flat items
+    option_cardinality  : the number of distinct values of the Option fields
+    text_length         : the number of characters of the `description` texts
+    array_fields        : the number of array-valued `tags_<n>` Option fields
+    seed                : the seed of the random generator
+"""
+
+
+def vocabulary(spec):
+    """
+    Returns the list of the words of the texts of a catalog
+    """
+    rng = random.Random("vocabulary %s" % spec.seed)
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+def option_values(spec):
+    """
+    Returns the values of the `category` Option field
+    """
+    return ["category_%d" % value for value in range(spec.option_cardinality)]
+
+
+def tag_values(spec):
+    """
+    Returns the values of the array-valued `tags_<n>` Option fields
+    """
+    return ["tag_%d" % value for value in range(spec.option_cardinality)]
+
+
+def nested_key(spec, key):
+    """
+    Returns the key path of a value stored at the nesting depth of the items
+    """
+    return ".".join(["n%d" % level for level in range(1, spec.depth)] + [key])
+
+
+def text(rng, words, length):
+    """
+    Returns a random text of `length` characters
+    """
+    parts, size = [], 0
+    while size <= length:
+        parts.append(rng.choice(words))
+        size += len(parts[-1]) + 1
+    return " ".join(parts)[:length]
+
+
+def items(spec):
+    """
+    Iterates over the items of a catalog
+    """
+    rng = random.Random(spec.seed)
+    words = vocabulary(spec)
+    options, tags = option_values(spec), tag_values(spec)
+    for item_id in range(spec.items):
+        nested = {"category": rng.choice(options), "level": rng.randint(1, 100)}
+        if rng.random() < MISSING_RATE:
+            del nested["level"]
+        for level in range(spec.depth - 1, 0, -1):
+            nested = {"n%d" % level: nested}
+        json_obj = {
+            "id": item_id,
+            "name": text(rng, words, 24),
+            "description": text(rng, words, spec.text_length),
+        }
+        json_obj.update(nested)
+        for array in range(spec.array_fields):
+            json_obj["tags_%d" % array] = rng.sample(
+                tags, rng.randint(0, min(MAX_TAGS, len(tags)))
+            )
+        yield json_obj
+
+
+def fields(spec):
+    """
+    Returns the `fields` member of a catalog, with one field of each type
+    """
+    fields = [
+        [
+            {"name": "Id", "type": "Integer", "key": "id", "min": 0},
+            {
+                "name": "Level",
+                "type": "Integer",
+                "key": nested_key(spec, "level"),
+                "comparison": ["eq", "neq", "lt", "leq", "gt", "geq"],
+                "min": 1,
+                "max": 100,
+            },
+            {
+                "name": "Category",
+                "type": "Option",
+                "key": nested_key(spec, "category"),
+                "values": option_values(spec),
+                "multi_selection": True,
+            },
+        ],
+        [
+            {"name": "Name", "type": "Text", "key": "name"},
+            {"name": "Description", "type": "Text", "key": "description"},
+            {"name": "Description regex", "type": "Regex", "key": "description"},
+            {"name": "Description fuzzy", "type": "Fuzzy", "key": "description"},
+        ],
+    ]
+    if spec.array_fields:
+        fields.append(
+            [
+                {
+                    "name": "Tags %d" % array,
+                    "type": "Option",
+                    "key": "tags_%d" % array,
+                    "values": tag_values(spec),
+                    "multi_selection": True,
+                }
+                for array in range(spec.array_fields)
+            ]
+        )
+    return fields
+
+
+def display_string(spec):
+    """
+    Returns the `display_string` member of a catalog, using each type of display
+    string
+    """
+    display_string = [
+        "<h3>{name}</h3>",
+        {
+            "if_json_type": "id",
+            "json_value": "<i>#{id}</i> ",
+            "json_array": "",
+            "json_object": "",
+        },
+        {
+            "key": nested_key(spec, "category"),
+            "table": {"category_0": "<b>first category</b> ", "": ""},
+        },
+        "<p>{description}</p>",
+    ]
+    if spec.array_fields:
+        display_string.append(
+            {
+                "has_key": "tags_0",
+                "yes": {
+                    "forall": "tags_0",
+                    "display_string": "<u>{value}</u>",
+                    "separator": ", ",
+                },
+                "no": "<i>no tags</i>",
+            }
+        )
+    return display_string
+
+
+def catalog(spec):
+    """
+    Returns a synthetic catalog, as decoded from a JSON file
+    """
+    return {
+        "version": version.__version__,
+        "name": "Synthetic catalog of %d items" % spec.items,
+        "display_string": display_string(spec),
+        "fields": fields(spec),
+        "data": list(items(spec)),
+    }
+
+
+def write(spec, path):
+    """
+    Writes a synthetic catalog to a JSON file
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(catalog(spec), file)
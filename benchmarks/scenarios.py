@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Timed scenarios of the benchmarks
+
+Each scenario is called a few times, and reported with the minimum, median and mean of
+its durations in seconds. Searches run with an empty search cache, and display strings
+are rendered without their cached value
+"""
+import copy
+import statistics
+import time
+
+from src import parsing, version
+from src.json_utils import jsondb
+from src.json_utils import jsonplus as json
+
+from . import generator
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = version.__version__
+__maintainer__ = "Quentin Soubeyran"
+__status__ = version.__status__
+
+REPEAT = 3
+PAGE_SIZE = 100
+
+
+def measure(function, repeat=REPEAT, setup=None):
+    """
+    Times the calls of a function
+
+    Args:
+        function: the function to time
+        repeat  : the number of calls
+        setup   : a function returning the tuple of the arguments of each call, that is
+            not timed. No arguments are passed by default
+
+    Returns:
+        The dict of the timings, and the result of the last call
+    """
+    durations, result = [], None
+    for _ in range(repeat):
+        arguments = () if setup is None else setup()
+        start = time.perf_counter()
+        result = function(*arguments)
+        durations.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(durations),
+        "median": statistics.median(durations),
+        "mean": statistics.mean(durations),
+    }, result
+
+
+def queries(spec):
+    """
+    Returns the searches of the benchmarks, with each field type and operator
+
+    Returns:
+        A list of (scenario name, criteria, operator) tuples, see jsondb.Database.search
+    """
+    options, tags = generator.option_values(spec), generator.tag_values(spec)
+    # words of the first item, so that every text search has results
+    words = next(generator.items(spec._replace(items=1)))["description"].split()
+    first, second = words[0], words[2]
+    level = {"value": 50, "comparison": "geq"}
+    queries = [
+        ("option.value", {"Category": {"valid_values": options[0]}}, "and"),
+        (
+            "option.or",
+            {
+                "Category": {
+                    "valid_values": jsondb.ValueSet(options[:2]),
+                    "operator": "or",
+                }
+            },
+            "and",
+        ),
+    ]
+    if spec.array_fields:
+        queries += [
+            (
+                "option.array.%s" % operator,
+                {
+                    "Tags 0": {
+                        "valid_values": jsondb.ValueSet(tags[:2]),
+                        "operator": operator,
+                    }
+                },
+                "and",
+            )
+            for operator in ("or", "and")
+        ]
+    queries += [
+        (
+            "integer.%s" % comparison,
+            {"Level": {"value": 50, "comparison": comparison}},
+            "and",
+        )
+        for comparison in ("eq", "neq", "lt", "leq", "gt", "geq")
+    ]
+    queries += [
+        (
+            "text.%s" % operator,
+            {"Description": {"value": [first, second], "operator": operator}},
+            "and",
+        )
+        for operator in ("or", "and")
+    ]
+    queries += [
+        ("text.case", {"Description": {"value": [first], "case": True}}, "and"),
+        ("regex", {"Description regex": {"value": "%s.*%s" % (first, second)}}, "and"),
+        ("fuzzy", {"Description fuzzy": {"value": first, "distance": 1}}, "and"),
+    ]
+    queries += [
+        (
+            "operator.%s" % operator,
+            {"Category": {"valid_values": options[0]}, "Level": level},
+            operator,
+        )
+        for operator in ("and", "or")
+    ]
+    return queries
+
+
+def run(spec, repeat=REPEAT, page_size=PAGE_SIZE, log=None):
+    """
+    Runs all the scenarios on a synthetic catalog
+
+    Args:
+        spec        : the generator.Spec of the catalog
+        repeat      : the number of calls of each scenario
+        page_size   : the number of items rendered by the display scenario
+        log         : a function called with the name of each scenario before it runs
+
+    Returns:
+        The JSON-like mapping of the scenario names to their timings. Searches also
+        report their number of results
+    """
+    log = log or (lambda name: None)
+    catalog = generator.catalog(spec)
+    results = {}
+
+    log("json.loads")
+    content = json.dumps(catalog)
+    results["json.loads"], _ = measure(json.loads, repeat, lambda: (content,))
+    results["json.loads"]["bytes"] = len(content.encode("utf-8"))
+    del content
+
+    # the fields are consumed by the parsing of their GUI data
+    def fresh_catalog():
+        return (dict(catalog, fields=copy.deepcopy(catalog["fields"])), "synthetic")
+
+    log("parse_file")
+    results["parse_file"], parsed_file = measure(
+        parsing.parse_file, repeat, fresh_catalog
+    )
+    database = parsed_file.database
+    fields = {name: field.to_json() for name, field in database.fields.items()}
+
+    def fresh_database():
+        return ({"fields": copy.deepcopy(fields), "data": catalog["data"]},)
+
+    log("Database.from_json")
+    results["Database.from_json"], _ = measure(
+        jsondb.Database.from_json, repeat, fresh_database
+    )
+
+    def uncached(criteria, operator):
+        database.cache_clear()
+        return (criteria, operator)
+
+    for name, criteria, operator in queries(spec):
+        name = "search." + name
+        log(name)
+        results[name], found = measure(
+            database.search, repeat, lambda: uncached(criteria, operator)
+        )
+        results[name]["results"] = len(found)
+
+    page = database.data[:page_size]
+
+    def uncached_page():
+        for json_obj in page:
+            json_obj.pop(parsing.CACHE_KEY, None)
+        return ()
+
+    log("get_display")
+    results["get_display"], _ = measure(
+        lambda: [
+            parsing.get_display(parsed_file.display_string, item) for item in page
+        ],
+        repeat,
+        uncached_page,
+    )
+    results["get_display"]["items"] = len(page)
+    uncached_page()
+    return results
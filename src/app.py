@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+GUI program to search in JSON-formatted simple databases
+
+Importing this module sets up logging, loads the preferences and the GUI backend:
+it is only imported by main.py when SAJE is run, so that the processes loading the
+shards of catalogs, that import the `src` package, do not
+"""
+
+# WIP version 2
+
+import argparse
+import atexit
+import functools
+import logging
+import traceback
+from pathlib import Path
+
+LOCAL_DIR = Path(__file__).parent.parent
+logging.basicConfig(
+    filename=str(LOCAL_DIR / "saje.log"),
+    encoding="utf-8",
+    level=logging.DEBUG
+)
+
+from . import backends, parsing, utils, version
+from .json_utils import jsonplus as json
+from .json_utils import sidecar, timing
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = version.__version__
+__maintainer__ = "Quentin Soubeyran"
+__status__ = version.__status__
+
+LOGGER = logging.getLogger("SAJE")
+CONFIG_FILE = LOCAL_DIR / "preferences.json"
+DEFAULT_PREFS = {
+    "backend": backends.DEFAULT,
+    "tkinter-scaling": 1.0,
+    "compact-data": False,
+    "compact-records": False,
+    "trace-memory": False,
+    "shard-workers": None,
+    "timing": False,
+}
+
+# Load GUI backend preferences
+if CONFIG_FILE.exists():
+    try:
+        with CONFIG_FILE.open("r") as f:
+            PREFS = json.load(f)
+    except Exception as err:
+        LOGGER.error(
+            "Couldn't open or parse preference file, due to:\n%s\nUsing default preferences",
+            utils.err_str(err),
+        )
+        PREFS = DEFAULT_PREFS.copy()
+else:
+    PREFS = DEFAULT_PREFS.copy()
+    try:
+        with CONFIG_FILE.open("w") as f:
+            json.dump(PREFS, f, indent=4, sort_keys=True)
+    except Exception as err:
+        LOGGER.error("Couldn't create preference file due to:\n%s", utils.err_str(err))
+
+overwrite = False
+for prefkey, prefvalue in DEFAULT_PREFS.items():
+    if prefkey not in PREFS:
+        LOGGER.warning(
+            "No preferences for '%s', falling back to %s" % (prefkey, prefvalue)
+        )
+        PREFS[prefkey] = prefvalue
+        overwrite = True
+if overwrite:
+    try:
+        with CONFIG_FILE.open("w") as f:
+            json.dump(PREFS, f, indent=4, sort_keys=True)
+    except Exception as err:
+        LOGGER.error("Couldn't save preferences:\n%s", utils.err_str(err))
+
+# Load the actual backend
+if PREFS["backend"] not in backends.BACKENDS:
+    LOGGER.error(
+        "Backend '%s' is invalid, defaulting to '%s'",
+        PREFS["backend"],
+        backends.DEFAULT,
+    )
+    PREFS["backend"] = backends.DEFAULT
+
+backend = backends.BACKENDS[PREFS["backend"]]
+
+if PREFS["timing"]:
+    timing.enable()
+    atexit.register(
+        lambda: LOGGER.info("Timing statistics:\n%s", timing.report())
+    )
+
+
+class SAJE(backend.MainApp):
+    """
+    Main SAJE App project class
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.open_dir_cache = "."
+        self.cached_files = {}
+        self.loading_tabs = {}
+
+    def open_file(self):
+        """
+        Method for opening a file, the callback for the "open file" menu button
+        Handle all parts and error display
+        """
+        basepath = self.ask_file()
+        if not basepath:
+            return
+        self.open(Path(basepath))
+
+    def open(self, filepath: Path):
+        self.open_dir_cache = str(filepath.parent)
+        file_id = str(filepath.absolute())
+        if file_id not in self.cached_files:
+            loader = parsing.CatalogLoader(
+                filepath,
+                index_file=sidecar.index_path(filepath),
+                compact=PREFS["compact-data"],
+                records=PREFS["compact-records"],
+                trace_memory=PREFS["trace-memory"],
+                workers=PREFS["shard-workers"],
+            )
+            try:
+                self.cached_files[file_id] = loader.start()
+            except Exception as err:
+                loader.close()
+                LOGGER.error(
+                    "Couldn't parse file %s. Stacktrace:\n%s\n%s",
+                    str(filepath),
+                    "".join(traceback.format_tb(err.__traceback__)),
+                    utils.err_str(err),
+                )
+                self.show_error(
+                    title="Open file",
+                    message="Couldn't parse file, verify it is JSON and complies with SAJE format\n%s"
+                    % utils.err_str(err),
+                )
+                return
+            self.loading_tabs[file_id] = []
+            self.schedule(functools.partial(self.load_step, file_id, loader))
+        parsed_file = self.cached_files[file_id]
+        try:
+            tab = self.new_tab(parsed_file)
+        except Exception as err:
+            LOGGER.error(
+                "Couldn't create tab from file %s. Stacktrace:\n%s\n%s",
+                str(filepath),
+                "".join(traceback.format_tb(err.__traceback__)),
+                utils.err_str(err),
+            )
+            self.show_error(
+                title="Open file",
+                message="Couldn't create the new tab\n%s" % utils.err_str(err),
+            )
+            return
+        self.notebook.add_tab(tab, title=parsed_file.name)
+        if file_id in self.loading_tabs:
+            self.loading_tabs[file_id].append(tab)
+
+    def load_step(self, file_id, loader):
+        """
+        Loads the next batch of items of a file being opened, and schedules the
+        following one until the file is loaded
+        """
+        tabs = self.loading_tabs[file_id]
+        try:
+            done = loader.step()
+        except Exception as err:
+            del self.loading_tabs[file_id]
+            del self.cached_files[file_id]
+            LOGGER.error(
+                "Couldn't load data of file %s. Stacktrace:\n%s\n%s",
+                file_id,
+                "".join(traceback.format_tb(err.__traceback__)),
+                utils.err_str(err),
+            )
+            for tab in tabs:
+                self.set_tab_status(tab, "couldn't load the data")
+            self.show_error(
+                title="Open file",
+                message="Couldn't load the data of the file\n%s" % utils.err_str(err),
+            )
+            return
+        if done:
+            del self.loading_tabs[file_id]
+            # members following the data may have changed the name or sort keys
+            self.cached_files[file_id] = loader.parsed_file
+            for tab in tabs:
+                self.update_tab(tab, loader.parsed_file)
+            message = "Loaded %s items" % len(loader.parsed_file.database.data)
+        else:
+            message = "Loading data ... %d%%" % (100 * loader.progress())
+            self.schedule(functools.partial(self.load_step, file_id, loader))
+        for tab in tabs:
+            self.set_tab_status(tab, message)
+
+
+def main():
+    """
+    Runs the SAJE program
+    """
+    parser = argparse.ArgumentParser(description="Runs the SAJE program")
+    parser.add_argument(
+        "files", nargs="*", type=Path, default=[], help="Files to immediately open"
+    )
+    args = parser.parse_args()
+    saje = SAJE()
+    saje.set_title(
+        "SAJE: Search in Arbitrary Json Engine - v%s" % (version.__version__)
+    )
+    saje.tk.call("tk", "scaling", PREFS["tkinter-scaling"])
+    for path in args.files:
+        if path.exists():
+            saje.open(path)
+    saje.start()
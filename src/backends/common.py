@@ -14,6 +14,7 @@ import traceback
 from abc import ABC, abstractmethod
 
 from .. import parsing, utils, version
+from ..json_utils import timing
 
 __author__ = "Quentin Soubeyran"
 __copyright__ = "Copyright 2020, SAJE project"
@@ -47,12 +48,32 @@ class AbstractHTMLDisplay(ABC):
         )
 
 
+class AbstractFacetDisplay(ABC):
+    @abstractmethod
+    def show_facets(self, counts):
+        """
+        Display the number of items each value would select, from a mapping of values
+        to counts as returned by jsondb.Database.facets()
+        """
+        raise NotImplementedError(
+            "AbstractFacetDisplay subclasses must implement a show_facets() method"
+        )
+
+
 class AbstractSearchCallback(ABC):
     """
     Callable class to handle searching a jsondb.Database object
     """
 
     LOGGER = LOGGER
+    PAGE_SIZE = 500
+    # the steps of a search shown in the status when timing is enabled
+    TIMED_STEPS = (
+        ("count", "Database.count"),
+        ("search", "Database.search"),
+        ("display", "display.html"),
+        ("facets", "Database.facets"),
+    )
 
     def __init__(
         self,
@@ -67,6 +88,10 @@ class AbstractSearchCallback(ABC):
         self.gui_dict = gui_dict
         self.display = display
         self.modes_getter = modes_getter
+        # the criteria, button arguments and sort key of the search shown
+        self.query = None
+        self.count = 0
+        self.page = 0
 
     @abstractmethod
     def show_error(self, title="", message=""):
@@ -83,7 +108,121 @@ class AbstractSearchCallback(ABC):
         Display the current status
         """
 
+    def set_paging(self, previous, next_):
+        """
+        Enables or disables the controls showing the previous and the next page of
+        results. Does nothing by default
+        """
+
+    def show_results(self, results):
+        """
+        Renders the results of a search and displays them
+        """
+        html = "\n".join(
+            parsing.get_display(self.parsed_file.display_string, result)
+            for result in results
+        )
+        self.display.display_html(html)
+
+    def timings(self):
+        """
+        Returns the durations of the steps of the last search as text, or "" if timing
+        is disabled
+        """
+        if not timing.enabled():
+            return ""
+        return ", ".join(
+            "%s %.1f ms" % (step, timing.last(name) * 1000)
+            for step, name in self.TIMED_STEPS
+            if timing.last(name) is not None
+        )
+
+    def show_page(self, page):
+        """
+        Renders the page `page` of the results of the search shown, counting from 0
+
+        Returns:
+            The status describing the page
+        """
+        criteria, button_kwargs, sort_by = self.query
+        results = self.parsed_file.database.search(
+            criteria=criteria,
+            limit=self.PAGE_SIZE,
+            offset=page * self.PAGE_SIZE,
+            sort_by=sort_by,
+            **button_kwargs,
+        )
+        self.set_status("Rendering ...")
+        self.show_results(results)
+        self.page = page
+        start = page * self.PAGE_SIZE
+        self.set_paging(page > 0, start + len(results) < self.count)
+        if len(results) < self.count:
+            return "Found %s items, showing %s to %s" % (
+                self.count,
+                start + 1 if results else start,
+                start + len(results),
+            )
+        return "Found %s items" % self.count
+
+    def previous_page(self):
+        """
+        Shows the previous page of the results of the search shown
+        """
+        if self.query is not None and self.page > 0:
+            self.change_page(self.page - 1)
+
+    def next_page(self):
+        """
+        Shows the next page of the results of the search shown
+        """
+        if self.query is not None and (self.page + 1) * self.PAGE_SIZE < self.count:
+            self.change_page(self.page + 1)
+
+    def change_page(self, page):
+        """
+        Shows another page of the results of the search shown
+        """
+        try:
+            self.set_status(self.with_timings(self.show_page(page)))
+        except Exception as err:
+            self.report_error(err)
+
+    def with_timings(self, status):
+        """
+        Appends the durations of the steps of the last search to a status, if timing
+        is enabled, and logs them
+        """
+        timings = self.timings()
+        if timings:
+            self.LOGGER.info("Search timings: %s", timings)
+            status += " (%s)" % timings
+        return status
+
+    def report_error(self, err):
+        """
+        Logs and shows an error raised during a search
+        """
+        self.LOGGER.error(
+            "Error during search:\n%s\n%s",
+            "".join(traceback.format_tb(err.__traceback__)),
+            utils.err_str(err),
+        )
+        self.show_error(
+            title="Search", message="Error during search:\n%s" % utils.err_str(err)
+        )
+        self.set_status("error")
+
     def __call__(self):
+        loader = self.parsed_file.loader
+        if loader is not None and not loader.done:
+            if loader.error is not None:
+                self.set_status(
+                    "Couldn't load the data: %s" % utils.err_str(loader.error)
+                )
+            else:
+                self.set_status("Loading data ... %d%%" % (100 * loader.progress()))
+            return
         self.set_status("Searching ...")
         try:
             search_args = {}
@@ -95,26 +234,31 @@ class AbstractSearchCallback(ABC):
                 kwargs = gui.get_kwargs()
                 if kwargs is not None:
                     search_args[field_name] = kwargs
-            results = self.parsed_file.database.search(
-                criteria=search_args, **self.search_button.get_kwargs()
-            )
-            self.set_status("Rendering ...")
-            html = "\n".join(
-                parsing.get_display(self.parsed_file.display_string, result)
-                for result in results
-            )
-            self.display.display_html(html)
-            self.set_status("Found %s items" % len(results))
+            database = self.parsed_file.database
+            button_kwargs = self.search_button.get_kwargs()
+            sort_by = button_kwargs.pop("sort_by", None)
+            self.query = (search_args, button_kwargs, sort_by)
+            self.count = database.count(criteria=search_args, **button_kwargs)
+            status = self.show_page(0)
+            facet_guis = {
+                field_name: gui
+                for field_name, gui in self.gui_dict.items()
+                if isinstance(gui, AbstractFacetDisplay)
+            }
+            if facet_guis:
+                facets = database.facets(
+                    criteria=search_args, fields=list(facet_guis), **button_kwargs
+                )
+                for field_name, counts in facets.items():
+                    facet_guis[field_name].show_facets(counts)
+            self.set_status(self.with_timings(status))
         except Exception as err:
-            self.LOGGER.error(
-                "Error during search:\n%s\n%s",
-                "".join(traceback.format_tb(err.__traceback__)),
-                utils.err_str(err),
-            )
-            self.show_error(
-                title="Search", message="Error during search:\n%s" % utils.err_str(err)
-            )
-            self.set_status("error")
+            self.query = None
+            self.set_paging(False, False)
+            self.report_error(err)
+
+
+timing.instrument(AbstractSearchCallback, "show_results", "display.html")
 
 
 class AbstractNotebook(ABC):
@@ -188,6 +332,34 @@ class AbstractMainApp(ABC):
             "MainAppCommon subclasses must implement a new_tab() method"
         )
 
+    @abstractmethod
+    def schedule(self, function, delay=0):
+        """
+        Calls `function` from the event loop of the App, after `delay` milliseconds
+        """
+        raise NotImplementedError(
+            "MainAppCommon subclasses must implement a schedule() method"
+        )
+
+    @abstractmethod
+    def update_tab(self, tab, parsed_file: parsing.ParsedFile):
+        """
+        Updates a tab created by new_tab() for a file whose name or sort keys were
+        read after the tab was created
+        """
+        raise NotImplementedError(
+            "MainAppCommon subclasses must implement a update_tab() method"
+        )
+
+    @abstractmethod
+    def set_tab_status(self, tab, msg):
+        """
+        Display a status in a tab created by new_tab()
+        """
+        raise NotImplementedError(
+            "MainAppCommon subclasses must implement a set_tab_status() method"
+        )
+
     @abstractmethod
     def on_modes(self):
         """Adapts the display after a change of modes"""
@@ -30,27 +30,70 @@ __status__ = version.__status__
 LOGGER = logging.getLogger("SAJE.backend.tkinter")
 DEFAULT_SIZE = (1024, 768)  # width, height
 VALUE_ANY = "--Any--"
+VALUE_NONE = "--None--"
 
 GeometryType = list[Union["GeometryType", str]]
 
 
+def count_label(value, counts):
+    """
+    Returns the label of a value followed by its count, if it has one in `counts`
+    """
+    if value in counts:
+        return "%s (%s)" % (value, format(counts[value], ","))
+    return str(value)
+
+
 class Dropdown(ttk.Combobox):
     def __init__(self, master, values, *args, interactive=True, **kwargs):
         state = "readonly" if not interactive else None
         width = max(len(str(v)) for v in values) + 1
         values = list(values)
+        self.choices = values
+        self.label_values = {}
+        self.value_labels = {}
         super().__init__(
             master, *args, state=state, values=values, width=width, **kwargs
         )
         if values:
             self.set(values[0])
 
+    def get(self):
+        """
+        Returns the selected value, without the count shown by `set_counts`
+        """
+        label = super().get()
+        return self.label_values.get(label, label)
+
+    def set(self, value):
+        super().set(self.value_labels.get(value, value))
+
     def set_values(self, values):
         selected = self.get()
         values = list(values)
+        self.choices = values
+        self.label_values, self.value_labels = {}, {}
         self.configure(values=values, width=max(len(str(v)) for v in values) + 1)
         self.set(selected if selected in values else values[0])
 
+    def set_counts(self, counts):
+        """
+        Shows the number of matching items next to each value
+
+        Args:
+            counts: mapping from values to counts. Other values are shown as is
+        """
+        selected = self.get()
+        self.value_labels = {
+            value: count_label(value, counts)
+            for value in self.choices
+            if value in counts
+        }
+        self.label_values = {label: value for value, label in self.value_labels.items()}
+        labels = [self.value_labels.get(value, value) for value in self.choices]
+        self.configure(values=labels, width=max(len(str(v)) for v in labels) + 1)
+        self.set(selected)
+
 
 class MultiSelector(ttk.Frame):
     """
@@ -139,6 +182,16 @@ class MultiSelector(ttk.Frame):
         self.set_selection(selection & set(values))
         self.adapt_display(len(values))
 
+    def set_counts(self, counts):
+        """
+        Shows the number of matching items next to each value
+
+        Args:
+            counts: mapping from values to counts. Other values are shown as is
+        """
+        for item, value in self.id_value_map.items():
+            self.tree.item(item, text=count_label(value, counts))
+
     def get_selection(self):
         """
         Returns the selected element from the `values` passed to `__init__()`
@@ -268,7 +321,7 @@ class OptionalDropdown:
 
 
 class TkSearchButton(common.AbstractKwargsProvider, ttk.Frame):
-    def __init__(self, master):
+    def __init__(self, master, sort_keys=()):
         super().__init__(master=master)
         self.button = ttk.Button(master=self, text="Search")
         self.mode_label = ttk.Label(master=self, text="criteria to fulfill: ")
@@ -281,14 +334,61 @@ class TkSearchButton(common.AbstractKwargsProvider, ttk.Frame):
         self.button.grid(row=0, column=0, columnspan=2, stick="ew")
         self.mode_label.grid(row=1, column=0)
         self.mode_selector.grid(row=1, column=1)
-        self.status_label.grid(row=2, column=0, columnspan=2)
+        self.sort_keys = {}
+        self.sort_label = self.sort_selector = None
+        self.set_sort_keys(sort_keys)
+        self.status_label.grid(row=3, column=0, columnspan=2)
+        self.previous_button = ttk.Button(
+            master=self, text="< Previous page", state="disabled"
+        )
+        self.next_button = ttk.Button(master=self, text="Next page >", state="disabled")
+        self.previous_button.grid(row=4, column=0, sticky="ew")
+        self.next_button.grid(row=4, column=1, sticky="ew")
         for i in range(2):
             self.columnconfigure(i, weight=1)
-        for i in range(3):
+        for i in range(5):
             self.rowconfigure(i, weight=1)
 
+    def set_paging(self, previous, next_):
+        """
+        Enables or disables the buttons showing the previous and next page of results
+        """
+        self.previous_button.configure(state="normal" if previous else "disabled")
+        self.next_button.configure(state="normal" if next_ else "disabled")
+
+    def set_sort_keys(self, sort_keys):
+        """
+        Sets the sort keys offered by the sort selector, shown only if there are some
+        """
+        self.sort_keys = {
+            ", ".join(
+                name if order is jsondb.Order.ASC else "%s (%s)" % (name, order.value)
+                for name, order in spec
+            ): spec
+            for spec in sort_keys
+        }
+        if not self.sort_keys:
+            if self.sort_selector is not None:
+                self.sort_label.grid_remove()
+                self.sort_selector.grid_remove()
+            return
+        if self.sort_selector is None:
+            self.sort_label = ttk.Label(master=self, text="sort by: ")
+            self.sort_selector = Dropdown(
+                master=self,
+                values=[VALUE_NONE] + list(self.sort_keys),
+                interactive=False,
+            )
+        else:
+            self.sort_selector.set_values([VALUE_NONE] + list(self.sort_keys))
+        self.sort_label.grid(row=2, column=0)
+        self.sort_selector.grid(row=2, column=1)
+
     def get_kwargs(self):
-        return {"operator": self.mode_selector.get()}
+        kwargs = {"operator": self.mode_selector.get()}
+        if self.sort_keys and self.sort_selector.get() != VALUE_NONE:
+            kwargs["sort_by"] = self.sort_keys[self.sort_selector.get()]
+        return kwargs
 
 
 class VisibilityMixin(ttk.Widget):
@@ -388,7 +488,7 @@ class TkFieldGui(VisibilityMixin, common.AbstractKwargsProvider, ttk.LabelFrame)
         return class_(master=master, gui_data=gui_data, field=field)
 
 
-class TkOptionGui(TkFieldGui):
+class TkOptionGui(common.AbstractFacetDisplay, TkFieldGui):
     """
     Class for the GUI of Option field
     """
@@ -440,8 +540,11 @@ class TkOptionGui(TkFieldGui):
                 return None
         return args
 
+    def show_facets(self, counts):
+        self.selector.set_counts(counts)
 
-class TkIntegerGui(TkFieldGui):
+
+class TkIntegerGui(common.AbstractFacetDisplay, TkFieldGui):
     """
     Class for the GUI of an Integer field
     """
@@ -483,6 +586,9 @@ class TkIntegerGui(TkFieldGui):
             "comparison": self.comp_selector.get(),
         }
 
+    def show_facets(self, counts):
+        self.selector.set_counts(counts)
+
 
 class TkTextGui(TkFieldGui):
     GUI_DATA_CLS = parsing.TextGuiData
@@ -524,6 +630,79 @@ class TkTextGui(TkFieldGui):
         }
 
 
+class TkRegexGui(TkFieldGui):
+    GUI_DATA_CLS = parsing.RegexGuiData
+
+    def __init__(
+        self, master, gui_data: parsing.RegexGuiData, field: jsondb.RegexField
+    ):
+        super().__init__(master, gui_data, field)
+        self.selector_case = OptionalDropdown(
+            master=self.frame_option,
+            json_value=gui_data.case,
+            label="case sensitive:",
+        )
+        self.add_to_grid(
+            self.frame_option,
+            [self.button_acceptNA, self.button_invert, self.selector_case],
+        )
+        self.selector = ttk.Entry(master=self, width=30)
+        self.selector.grid(row=1, column=0, sticky="ew")
+        self.rowconfigure(1, weight=1)
+
+    def get_kwargs(self):
+        value = self.selector.get()
+        if not value:
+            return None
+        return {
+            "accept_missing": self.var_acceptNA.get(),
+            "invert": self.var_invert.get(),
+            "case": str(self.selector_case.get()) == "True",
+            "value": value,
+        }
+
+
+class TkFuzzyGui(TkFieldGui):
+    GUI_DATA_CLS = parsing.FuzzyGuiData
+
+    def __init__(
+        self, master, gui_data: parsing.FuzzyGuiData, field: jsondb.FuzzyField
+    ):
+        super().__init__(master, gui_data, field)
+        self.frame_config_selectors = ttk.Frame(self)
+        self.selector_case = OptionalDropdown(
+            master=self.frame_config_selectors,
+            json_value=gui_data.case,
+            label="case sensitive:",
+        )
+        self.selector_distance = OptionalDropdown(
+            master=self.frame_config_selectors,
+            json_value=gui_data.distance,
+            label="typos allowed:",
+        )
+        self.add_to_grid(self.frame_option, [self.button_acceptNA, self.button_invert])
+        self.add_to_grid(
+            self.frame_config_selectors, [self.selector_case, self.selector_distance]
+        )
+        self.selector = ttk.Entry(master=self, width=30)
+        self.frame_config_selectors.grid(row=1, column=0)
+        self.selector.grid(row=2, column=0, sticky="ew")
+        for i in range(1, 3):
+            self.rowconfigure(i, weight=1)
+
+    def get_kwargs(self):
+        value = self.selector.get()
+        if not value:
+            return None
+        return {
+            "accept_missing": self.var_acceptNA.get(),
+            "invert": self.var_invert.get(),
+            "case": str(self.selector_case.get()) == "True",
+            "distance": int(self.selector_distance.get()),
+            "value": value,
+        }
+
+
 class VisibleSeparator(VisibilityMixin, ttk.Separator):
     pass
 
@@ -635,6 +814,9 @@ class TkSearchCallback(common.AbstractSearchCallback):
             if self.app is not None:
                 self.app.update()
 
+    def set_paging(self, previous, next_):
+        self.search_button.set_paging(previous, next_)
+
 
 class TkNotebook(common.AbstractNotebook, ttk.Notebook):
     def __init__(self, *args, **kwargs):
@@ -723,7 +905,9 @@ class MainApp(common.AbstractMainApp, tk.Tk):
             tab.frame_mode.columnconfigure(0, weight=1)
             tab.frame_mode.grid(row=0, column=0, sticky="nsew")
         ### Search Button
-        tab.search_button = TkSearchButton(tab.frame_search_upper)
+        tab.search_button = TkSearchButton(
+            tab.frame_search_upper, sort_keys=parsed_file.database.sort_keys
+        )
         tab.search_button.grid(row=0, column=1, sticky="nsew")
 
         ## Search Fields
@@ -740,21 +924,34 @@ class MainApp(common.AbstractMainApp, tk.Tk):
         tab.display = TkHTMLDisplay(
             master=tab.frame_main, wrap="word", state="disabled", width=-10
         )
-        tab.search_button.button.configure(
-            command=TkSearchCallback(
-                parsed_file=parsed_file,
-                search_button=tab.search_button,
-                gui_dict=tab.gui_dict,
-                display=tab.display,
-                modes_getter=tab.modes_selector.get_selection
-                if tab.modes_selector
-                else lambda: None,
-                textvar=tab.search_button.status_var,
-                app=self,
-            )
+        search_callback = TkSearchCallback(
+            parsed_file=parsed_file,
+            search_button=tab.search_button,
+            gui_dict=tab.gui_dict,
+            display=tab.display,
+            modes_getter=tab.modes_selector.get_selection
+            if tab.modes_selector
+            else lambda: None,
+            textvar=tab.search_button.status_var,
+            app=self,
+        )
+        tab.search_button.button.configure(command=search_callback)
+        tab.search_button.previous_button.configure(
+            command=search_callback.previous_page
         )
+        tab.search_button.next_button.configure(command=search_callback.next_page)
         return tab
 
+    def schedule(self, function, delay=0):
+        self.after(delay, function)
+
+    def update_tab(self, tab, parsed_file: parsing.ParsedFile):
+        self.notebook.tab(tab.frame_main, text=parsed_file.name)
+        tab.search_button.set_sort_keys(parsed_file.database.sort_keys)
+
+    def set_tab_status(self, tab, msg):
+        tab.search_button.status_var.set("Status: " + msg)
+
     def on_modes(self, tab):
         modes = set(tab.modes_selector.get_selection())
         tab.nested_search_fields.notify_modes(modes)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Multi-pattern substring matching for the SAJE project
+
+An `Automaton` is built once from a set of patterns, then finds which patterns occur
+in a text in a single pass over that text, instead of one `in` test per pattern
+(Aho-Corasick algorithm)
+"""
+from collections import deque
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = "0.1.0"
+__maintainer__ = "Quentin Soubeyran"
+__status__ = "beta"
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton over a set of patterns
+
+    States are the prefixes of the patterns. `delta[state]` maps a character to the
+    next state, characters that are absent lead back to the root state 0.
+    `outputs[state]` is the bitmask of the patterns that end at that state, pattern i
+    being bit i of the mask
+    """
+
+    def __init__(self, patterns):
+        """
+        Create a new Automaton object
+
+        Args:
+            patterns: an iterable of strings to search for. Duplicates are ignored
+        """
+        self.patterns = tuple(dict.fromkeys(patterns))
+        self.complete = (1 << len(self.patterns)) - 1
+        # trie of the patterns
+        goto, outputs = [{}], [0]
+        for position, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                child = goto[state].get(char)
+                if child is None:
+                    child = goto[state][char] = len(goto)
+                    goto.append({})
+                    outputs.append(0)
+                state = child
+            outputs[state] |= 1 << position
+        # breadth-first walk to follow failure links, so that the transitions of a
+        # state include those of its longest proper suffix that is also a prefix
+        delta = [None] * len(goto)
+        delta[0] = goto[0]
+        queue = deque()
+        for child in goto[0].values():
+            outputs[child] |= outputs[0]
+            delta[child] = dict(goto[0], **goto[child])
+            queue.append((child, 0))
+        while queue:
+            state, fail = queue.popleft()
+            for char, child in goto[state].items():
+                child_fail = delta[fail].get(char, 0)
+                outputs[child] |= outputs[child_fail]
+                delta[child] = dict(delta[child_fail], **goto[child])
+                queue.append((child, child_fail))
+        self.delta = delta
+        self.outputs = outputs
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, list(self.patterns))
+
+    def scan(self, text):
+        """
+        Returns the bitmask of the patterns that occur in `text`
+        """
+        delta, outputs = self.delta, self.outputs
+        state, found = 0, outputs[0]
+        for char in text:
+            state = delta[state].get(char, 0)
+            found |= outputs[state]
+        return found
+
+    def find(self, text):
+        """
+        Returns the set of the patterns that occur in `text`
+        """
+        found = self.scan(text)
+        return frozenset(
+            pattern
+            for position, pattern in enumerate(self.patterns)
+            if found >> position & 1
+        )
+
+    def match_any(self, text):
+        """
+        Returns whether any pattern occurs in `text`, stopping at the first one found
+        """
+        delta, outputs = self.delta, self.outputs
+        if outputs[0]:
+            return True
+        state = 0
+        for char in text:
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                return True
+        return False
+
+    def match_all(self, text):
+        """
+        Returns whether all patterns occur in `text`, stopping once they are all found
+        """
+        delta, outputs, complete = self.delta, self.outputs, self.complete
+        state, found = 0, outputs[0]
+        if found == complete:
+            return True
+        for char in text:
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                found |= outputs[state]
+                if found == complete:
+                    return True
+        return False
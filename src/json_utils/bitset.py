@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compact sets of item ids, for combining search results in the SAJE project
+
+A `Bitset` stores a set of non-negative integers below a size as the bits of a python
+integer, so that intersections, unions and complements are single big-integer
+operations. Sets of different sizes can be combined, as happens when the data grows:
+the result has the larger size
+"""
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = "0.1.0"
+__maintainer__ = "Quentin Soubeyran"
+__status__ = "beta"
+
+# positions of the set bits of each byte value, for fast iteration
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+if hasattr(int, "bit_count"):
+
+    def popcount(bits):
+        return bits.bit_count()
+
+else:  # python < 3.10
+
+    def popcount(bits):
+        return bin(bits).count("1")
+
+
+class Bitset:
+    """
+    Set of item ids in range(size), backed by the bits of an integer
+    """
+
+    __slots__ = ("bits", "size")
+
+    def __init__(self, bits=0, size=0):
+        """
+        Create a new Bitset object
+
+        Args:
+            bits: the integer whose bit i is set if i is in the set
+            size: the number of possible ids. Bits at or above `size` must be 0
+        """
+        self.bits = bits
+        self.size = size
+
+    @classmethod
+    def empty(cls, size):
+        """
+        Returns the empty set of ids in range(size)
+        """
+        return cls(0, size)
+
+    @classmethod
+    def full(cls, size):
+        """
+        Returns the set of all ids in range(size)
+        """
+        return cls((1 << size) - 1, size)
+
+    @classmethod
+    def from_ids(cls, ids, size):
+        """
+        Returns the set of the ids from the iterable `ids`
+        """
+        buffer = bytearray((size + 7) // 8)
+        for item_id in ids:
+            buffer[item_id >> 3] |= 1 << (item_id & 7)
+        return cls(int.from_bytes(buffer, "little"), size)
+
+    @classmethod
+    def from_mask(cls, mask):
+        """
+        Returns the set of the positions of the True values of a NumPy boolean array
+        """
+        import numpy  # only called with NumPy arrays
+
+        packed = numpy.packbits(mask, bitorder="little")
+        return cls(int.from_bytes(packed.tobytes(), "little"), len(mask))
+
+    def to_mask(self):
+        """
+        Returns the NumPy boolean array of length `size`, True at the ids in the set
+        """
+        import numpy  # only called when NumPy is available
+
+        packed = numpy.frombuffer(
+            self.bits.to_bytes((self.size + 7) // 8, "little"), dtype=numpy.uint8
+        )
+        return numpy.unpackbits(packed, count=self.size, bitorder="little").view(
+            numpy.bool_
+        )
+
+    def __and__(self, other):
+        if not isinstance(other, Bitset):
+            return NotImplemented
+        return Bitset(self.bits & other.bits, max(self.size, other.size))
+
+    def __or__(self, other):
+        if not isinstance(other, Bitset):
+            return NotImplemented
+        return Bitset(self.bits | other.bits, max(self.size, other.size))
+
+    def __xor__(self, other):
+        if not isinstance(other, Bitset):
+            return NotImplemented
+        return Bitset(self.bits ^ other.bits, max(self.size, other.size))
+
+    def __sub__(self, other):
+        if not isinstance(other, Bitset):
+            return NotImplemented
+        return Bitset(self.bits & ~other.bits, max(self.size, other.size))
+
+    def union(self, *others):
+        """
+        Returns the union of this set and all the others
+        """
+        bits, size = self.bits, self.size
+        for other in others:
+            bits |= other.bits
+            size = max(size, other.size)
+        return Bitset(bits, size)
+
+    def intersection(self, *others):
+        """
+        Returns the intersection of this set and all the others
+        """
+        bits, size = self.bits, self.size
+        for other in others:
+            bits &= other.bits
+            size = max(size, other.size)
+        return Bitset(bits, size)
+
+    def __invert__(self):
+        return Bitset(self.bits ^ ((1 << self.size) - 1), self.size)
+
+    def __eq__(self, other):
+        if not isinstance(other, Bitset):
+            return NotImplemented
+        return self.bits == other.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __bool__(self):
+        return bool(self.bits)
+
+    def __len__(self):
+        return popcount(self.bits)
+
+    def __contains__(self, item_id):
+        return 0 <= item_id < self.size and bool(self.bits >> item_id & 1)
+
+    def __iter__(self):
+        """
+        Iterates over the ids in the set, in ascending order
+        """
+        if not self.bits:
+            return
+        data = self.bits.to_bytes((self.size + 7) // 8, "little")
+        for position, byte in enumerate(data):
+            if byte:
+                base = position << 3
+                for bit in _BYTE_BITS[byte]:
+                    yield base + bit
+
+    def __repr__(self):
+        return "%s(%s, size=%s)" % (type(self).__name__, list(self), self.size)
+
+    def add(self, item_id):
+        """
+        Returns the set with `item_id` added, its size grown to include it if needed
+        """
+        return Bitset(self.bits | 1 << item_id, max(self.size, item_id + 1))
+
+    def discard(self, item_id):
+        """
+        Returns the set with `item_id` removed
+        """
+        return Bitset(self.bits & ~(1 << item_id), self.size)
+
+    def count(self):
+        """
+        Returns the number of ids in the set
+        """
+        return popcount(self.bits)
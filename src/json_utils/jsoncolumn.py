@@ -0,0 +1,551 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Module for the columnar storage of searchable values in the SAJE project
+
+A column holds the values of a single key for all the items of a `jsondb.Database`,
+extracted once when the database is built, with a mask of the items that have no value.
+Searches then read the column instead of resolving the key in every item.
+Items are identified by their position in the data, called the item id. Columns grow
+and their values change with the data through `grow`, `set` and `clear`. Columns stored
+in an index file with `dump` are loaded back without copy, their arrays being
+memoryviews of the mapped file until they first grow
+"""
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from ..json_utils import jsonplus as json
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional: columns are then only searched in python
+    numpy = None
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = "0.1.0"
+__maintainer__ = "Quentin Soubeyran"
+__status__ = "beta"
+
+
+RANK_GAP = 1 << 32
+
+
+class ColumnTypeError(Exception):
+    """
+    Exception when a json value cannot be stored in a specialized column
+    """
+
+
+class Column:
+    """
+    Generic column, storing the raw json values in a list
+
+    Subclasses store values in a more compact form, and fall back to this class when
+    the data contains a value they cannot store
+    """
+
+    def __init__(self, size):
+        """
+        Create a new column where all items are missing
+
+        Args:
+            size: the number of items in the data
+        """
+        self.size = size
+        self.missing = bytearray(b"\x01") * size
+        self.values = [None] * size
+
+    @classmethod
+    def build(cls, data, path):
+        """
+        Extracts the column of values under `path` from `data`
+
+        Args:
+            data: the list of JSON-objects to extract values from
+            path: the jsonplus.Path of the values
+
+        Returns:
+            An instance of `cls`, or a generic Column if `cls` cannot store some values
+        """
+        try:
+            column = cls(len(data))
+            for item_id, json_obj in enumerate(data):
+                json_value = path.resolve(json_obj)
+                if json_value is not json.MISSING:
+                    column.set(item_id, json_value)
+        except ColumnTypeError:
+            if cls is Column:
+                raise
+            return Column.build(data, path)
+        column.finalize()
+        return column
+
+    def set(self, item_id, json_value):
+        """
+        Stores the value of an item
+        """
+        self.values[item_id] = json_value
+        self.missing[item_id] = 0
+
+    def clear(self, item_id):
+        """
+        Marks an item as having no value
+        """
+        self.values[item_id] = None
+        self.missing[item_id] = 1
+
+    def grow(self, size):
+        """
+        Extends the column to `size` items, the new items having no value
+        """
+        extra = size - self.size
+        if extra > 0:
+            self.extend(extra)
+            if not isinstance(self.missing, bytearray):  # loaded from an index file
+                self.missing = bytearray(self.missing)
+            self.missing.extend(b"\x01" * extra)
+            self.size = size
+
+    def extend(self, extra):
+        """
+        Appends storage for `extra` values. Overridden by subclasses with another storage
+        """
+        self.values.extend([None] * extra)
+
+    def append(self, other):
+        """
+        Appends the items of another column of the same class, that follow the items of
+        this one
+        """
+        if not isinstance(self.missing, bytearray):  # loaded from an index file
+            self.missing = bytearray(self.missing)
+        self.missing.extend(other.missing)
+        self.append_values(other)
+        self.size += other.size
+
+    def append_values(self, other):
+        """
+        Appends the stored values of another column, see `append`. Overridden by
+        subclasses with another storage
+        """
+        self.values.extend(other.values)
+
+    def finalize(self):
+        """
+        Called once all values have been set. Can be overridden by subclasses
+        """
+        pass
+
+    def dump(self, writer):
+        """
+        Stores the arrays of the column in an index file
+
+        Args:
+            writer: the sidecar.Writer of the index file
+
+        Returns:
+            The JSON-like description of the column for `load`, or None if the column
+            is not stored and must be extracted from the data again
+        """
+        return None
+
+    @classmethod
+    def load(cls, description, reader):
+        """
+        Rebuilds a column stored by `dump`, using the stored arrays without copy
+
+        Args:
+            description : the description returned by `dump`
+            reader      : the sidecar.Reader of the index file
+        """
+        raise TypeError("%s columns cannot be loaded from a file" % cls.__name__)
+
+    def get(self, item_id, default=json.MISSING):
+        """
+        Returns the value of an item, or `default` if it has none
+        """
+        if self.missing[item_id]:
+            return default
+        return self.values[item_id]
+
+    def items(self):
+        """
+        Iterates over the (item id, value) pairs of the items that have a value
+        """
+        missing = self.missing
+        for item_id, json_value in enumerate(self.values):
+            if not missing[item_id]:
+                yield item_id, json_value
+
+    def predicate(self, test):
+        """
+        Returns a function of item ids evaluating `test` on the value of that item. The
+        item must have a value
+
+        Args:
+            test: a function of json values returning a boolean
+        """
+        values = self.values
+        return lambda item_id: test(values[item_id])
+
+    def value_counts(self, ids):
+        """
+        Returns a Counter of the values of the items in `ids` that have a value. The
+        values must be hashable
+
+        Args:
+            ids: the Bitset of the item ids to count
+        """
+        missing, values = self.missing, self.values
+        return Counter(values[item_id] for item_id in ids if not missing[item_id])
+
+    @staticmethod
+    def sort_key(json_value):
+        """
+        Returns the key ordering a value for sorting, or None if it cannot be sorted.
+        Numbers come first, then strings in case-insensitive order
+        """
+        if isinstance(json_value, (int, float)):
+            return (0, json_value)
+        if isinstance(json_value, str):
+            return (1, json_value.lower(), json_value)
+        return None
+
+    def ranks(self):
+        """
+        Returns the Ranking of the values of the items, see Ranking
+        """
+        return Ranking(self)
+
+    def vector(self):
+        """
+        Returns a NumPy view of the values, or None if they cannot be vectorized
+        """
+        return None
+
+    def mask(self, tested, accept_missing=True, invert=False):
+        """
+        Returns the NumPy boolean mask of the items that match a field
+
+        Args:
+            tested          : the NumPy boolean array of the test on the value of each
+                item, whatever its value for missing items
+            accept_missing  : whether items without value match
+            invert          : whether to invert the test for items with a value
+        """
+        missing = numpy.frombuffer(self.missing, dtype=numpy.bool_)
+        if invert:
+            tested = ~tested
+        if accept_missing:
+            return tested | missing
+        return tested & ~missing
+
+
+class IntegerColumn(Column):
+    """
+    Column of integer values, stored in a 64-bit signed array
+    """
+
+    def __init__(self, size):
+        super().__init__(size)
+        self.values = array("q", [0]) * size
+
+    def set(self, item_id, json_value):
+        if not isinstance(json_value, int):
+            raise ColumnTypeError("Non-integer value %r" % (json_value,))
+        try:
+            self.values[item_id] = json_value
+        except (OverflowError, ValueError) as err:
+            raise ColumnTypeError(str(err)) from err
+        self.missing[item_id] = 0
+
+    def clear(self, item_id):
+        self.missing[item_id] = 1
+
+    def extend(self, extra):
+        if not isinstance(self.values, array):  # loaded from an index file
+            self.values = array("q", self.values.tobytes())
+        self.values.extend(array("q", [0]) * extra)
+
+    def append_values(self, other):
+        self.extend(0)  # converts the values loaded from an index file
+        self.values.extend(other.values)
+
+    def dump(self, writer):
+        return {
+            "size": self.size,
+            "values": writer.add(self.values),
+            "missing": writer.add(self.missing),
+        }
+
+    @classmethod
+    def load(cls, description, reader):
+        column = cls(0)
+        column.size = description["size"]
+        column.values = reader.view(description["values"], "q")
+        column.missing = reader.view(description["missing"], "B")
+        return column
+
+    def vector(self):
+        if numpy is None:
+            return None
+        return numpy.frombuffer(self.values, dtype=numpy.int64)
+
+    def value_counts(self, ids):
+        vector = self.vector()
+        if vector is None:
+            return super().value_counts(ids)
+        selected = ids.to_mask() & ~numpy.frombuffer(self.missing, dtype=numpy.bool_)
+        values, counts = numpy.unique(vector[selected], return_counts=True)
+        return Counter(dict(zip(values.tolist(), counts.tolist())))
+
+
+class TextColumn(Column):
+    """
+    Column of string values, stored as interned strings
+    """
+
+    def set(self, item_id, json_value):
+        if not isinstance(json_value, str):
+            raise ColumnTypeError("Non-string value %r" % (json_value,))
+        super().set(item_id, sys.intern(json_value))
+
+
+class DictionaryColumn(Column):
+    """
+    Dictionary-encoded column: each distinct value is stored once in `dictionary` and
+    items store the small integer code of their value
+
+    Arrays and objects holding the same set of values share a code, so that tests that
+    only depend on that set are evaluated once per code
+    """
+
+    def __init__(self, size):
+        super().__init__(size)
+        self.values = None
+        self.codes = array("i", [0]) * size
+        self.dictionary = []
+        self.encoding = {}
+
+    @staticmethod
+    def encoding_key(json_value):
+        """
+        Returns the hashable key under which a value is encoded
+        """
+        type_ = json.Type(json_value)
+        if type_ is json.Value:
+            return (json.Value, json_value)
+        values = json_value if type_ is json.Array else json_value.values()
+        try:
+            return (json.Array, frozenset(values))
+        except TypeError as err:
+            raise ColumnTypeError(str(err)) from err
+
+    def set(self, item_id, json_value):
+        try:
+            key = self.encoding_key(json_value)
+        except json.JsonTypeError as err:
+            raise ColumnTypeError(str(err)) from err
+        code = self.encoding.get(key)
+        if code is None:
+            code = self.encoding[key] = len(self.dictionary)
+            self.dictionary.append(json_value)
+        self.codes[item_id] = code
+        self.missing[item_id] = 0
+
+    def clear(self, item_id):
+        self.missing[item_id] = 1
+
+    def extend(self, extra):
+        if not isinstance(self.codes, array):  # loaded from an index file
+            self.codes = array("i", self.codes.tobytes())
+        self.codes.extend(array("i", [0]) * extra)
+
+    def append_values(self, other):
+        # the codes of the other column are translated to the codes of this one
+        codes = []
+        for json_value in other.dictionary:
+            key = self.encoding_key(json_value)
+            code = self.encoding.get(key)
+            if code is None:
+                code = self.encoding[key] = len(self.dictionary)
+                self.dictionary.append(json_value)
+            codes.append(code)
+        self.extend(0)  # converts the codes loaded from an index file
+        if codes:
+            self.codes.extend(array("i", map(codes.__getitem__, other.codes)))
+        else:  # all the items of the other column are missing
+            self.codes.extend(other.codes)
+
+    def dump(self, writer):
+        return {
+            "size": self.size,
+            "codes": writer.add(self.codes),
+            "missing": writer.add(self.missing),
+            "dictionary": self.dictionary,
+        }
+
+    @classmethod
+    def load(cls, description, reader):
+        column = cls(0)
+        column.size = description["size"]
+        column.codes = reader.view(description["codes"], "i")
+        column.missing = reader.view(description["missing"], "B")
+        column.dictionary = description["dictionary"]
+        column.encoding = {
+            cls.encoding_key(json_value): code
+            for code, json_value in enumerate(column.dictionary)
+        }
+        return column
+
+    def get(self, item_id, default=json.MISSING):
+        if self.missing[item_id]:
+            return default
+        return self.dictionary[self.codes[item_id]]
+
+    def items(self):
+        missing, dictionary = self.missing, self.dictionary
+        for item_id, code in enumerate(self.codes):
+            if not missing[item_id]:
+                yield item_id, dictionary[code]
+
+    def predicate(self, test):
+        """
+        Returns a function of item ids evaluating `test` on the value of that item. The
+        test is evaluated once per distinct value
+        """
+        results = [bool(test(json_value)) for json_value in self.dictionary]
+        codes = self.codes
+        return lambda item_id: results[codes[item_id]]
+
+    def code_counts(self, ids):
+        """
+        Returns the list of the number of items in `ids` holding each code, missing
+        items excluded
+
+        Args:
+            ids: the Bitset of the item ids to count
+        """
+        vector = self.vector()
+        if vector is not None:
+            selected = ids.to_mask() & ~numpy.frombuffer(
+                self.missing, dtype=numpy.bool_
+            )
+            counts = numpy.bincount(vector[selected], minlength=len(self.dictionary))
+            return counts.tolist()
+        counts = [0] * len(self.dictionary)
+        missing, codes = self.missing, self.codes
+        for item_id in ids:
+            if not missing[item_id]:
+                counts[codes[item_id]] += 1
+        return counts
+
+    def vector(self):
+        if numpy is None:
+            return None
+        return numpy.frombuffer(self.codes, dtype=numpy.intc)
+
+    def vector_predicate(self, test):
+        """
+        Returns the NumPy boolean array of `test` evaluated on the value of each item.
+        The test is evaluated once per distinct value, then gathered through the codes
+        """
+        results = numpy.array(
+            [bool(test(json_value)) for json_value in self.dictionary],
+            dtype=numpy.bool_,
+        )
+        if not len(results):
+            return numpy.zeros(self.size, dtype=numpy.bool_)
+        return results[self.vector()]
+
+
+class Ranking:
+    """
+    Ranks of the values of a column in sorted order, that `jsondb.Database` sorts the
+    items by. Equal values share a rank, items without a value or with a value that
+    cannot be sorted have rank None
+
+    Ranks are spaced by RANK_GAP, so that a new distinct value takes a rank between
+    those of its neighbours without changing the others. Only when two neighbours have
+    no rank left between them are all ranks renumbered, keeping their order. The keys
+    of values no item has anymore are kept
+    """
+
+    def __init__(self, column):
+        """
+        Ranks the values of a column
+
+        Args:
+            column: the Column of the values
+        """
+        keyed = []
+        for item_id, json_value in column.items():
+            key = Column.sort_key(json_value)
+            if key is not None:
+                keyed.append((key, item_id))
+        keyed.sort()
+        self.keys = []
+        self.key_ranks = []
+        self.ranks = [None] * column.size
+        for key, item_id in keyed:
+            if not self.keys or key != self.keys[-1]:
+                self.keys.append(key)
+                self.key_ranks.append(len(self.key_ranks) * RANK_GAP)
+            self.ranks[item_id] = self.key_ranks[-1]
+
+    def rank(self, json_value):
+        """
+        Returns the rank of a value, adding it to the ranked values if needed
+        """
+        key = Column.sort_key(json_value)
+        if key is None:
+            return None
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return self.key_ranks[position]
+        low = self.key_ranks[position - 1] if position else None
+        high = self.key_ranks[position] if position < len(self.keys) else None
+        if low is None and high is None:
+            rank = 0
+        elif low is None:
+            rank = high - RANK_GAP
+        elif high is None:
+            rank = low + RANK_GAP
+        elif high - low > 1:
+            rank = (low + high) // 2
+        else:
+            self.renumber()
+            return self.rank(json_value)
+        self.keys.insert(position, key)
+        self.key_ranks.insert(position, rank)
+        return rank
+
+    def renumber(self):
+        """
+        Spaces the ranks by RANK_GAP again, updating the ranks of the items in-place
+        """
+        renumbered = {
+            rank: position * RANK_GAP for position, rank in enumerate(self.key_ranks)
+        }
+        self.key_ranks = list(renumbered.values())
+        self.ranks[:] = [
+            None if rank is None else renumbered[rank] for rank in self.ranks
+        ]
+
+    def grow(self, size):
+        """
+        Extends the ranks to `size` items, the new items having rank None
+        """
+        self.ranks.extend([None] * (size - len(self.ranks)))
+
+    def set(self, item_id, json_value=json.MISSING):
+        """
+        Updates the rank of an item for its new value, MISSING if it has none
+        """
+        self.ranks[item_id] = (
+            None if json_value is json.MISSING else self.rank(json_value)
+        )
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compact in-memory storage of JSON data for the SAJE project
+
+The json module gives every decoded object its own copies of its keys and values.
+A `Compactor` is used as the `object_pairs_hook` of a json.JSONDecoder to share them
+instead: keys and short strings are interned, and equal objects and arrays decoded
+under the same Compactor are the same python object. Objects can also be stored as
+`Record`s, mappings whose keys are shared by all records with the same keys
+
+Shared values must not be modified in place: items are only replaced as a whole,
+see jsondb.Database.update
+"""
+from collections.abc import MutableMapping
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = "0.1.0"
+__maintainer__ = "Quentin Soubeyran"
+__status__ = "beta"
+
+MAX_LENGTH = 64
+
+SCALARS = (str, int, bool, type(None))
+
+
+class Shape:
+    """
+    The keys of Records, in order, shared by all the Records having these keys
+    """
+
+    __slots__ = ("keys", "positions", "transitions", "shapes")
+
+    def __init__(self, keys, shapes):
+        self.keys = keys
+        self.positions = {key: position for position, key in enumerate(keys)}
+        self.transitions = {}
+        self.shapes = shapes
+
+    @staticmethod
+    def get(keys, shapes):
+        """
+        Returns the Shape of a tuple of keys
+
+        Args:
+            keys    : the tuple of keys
+            shapes  : the mapping from tuples of keys to the existing Shapes
+        """
+        shape = shapes.get(keys)
+        if shape is None:
+            shape = shapes[keys] = Shape(keys, shapes)
+        return shape
+
+    def add(self, key):
+        """
+        Returns the Shape with `key` after the keys of this one
+        """
+        shape = self.transitions.get(key)
+        if shape is None:
+            shape = self.transitions[key] = self.get(self.keys + (key,), self.shapes)
+        return shape
+
+    def remove(self, key):
+        """
+        Returns the Shape without `key`
+        """
+        keys = tuple(other for other in self.keys if other != key)
+        return self.get(keys, self.shapes)
+
+
+class Record(MutableMapping):
+    """
+    JSON object storing its values in a list, its keys being held by its Shape
+    """
+
+    __slots__ = ("shape", "cells")
+
+    def __init__(self, shape, cells):
+        self.shape = shape
+        self.cells = cells
+
+    def __getitem__(self, key):
+        return self.cells[self.shape.positions[key]]
+
+    def get(self, key, default=None):
+        position = self.shape.positions.get(key)
+        if position is None:
+            return default
+        return self.cells[position]
+
+    def __contains__(self, key):
+        return key in self.shape.positions
+
+    def __setitem__(self, key, value):
+        position = self.shape.positions.get(key)
+        if position is None:
+            self.shape = self.shape.add(key)
+            self.cells.append(value)
+        else:
+            self.cells[position] = value
+
+    def __delitem__(self, key):
+        position = self.shape.positions[key]
+        self.shape = self.shape.remove(key)
+        del self.cells[position]
+
+    def __iter__(self):
+        return iter(self.shape.keys)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, dict(self))
+
+    def copy(self):
+        return Record(self.shape, list(self.cells))
+
+
+class Compactor:
+    """
+    Decoding hook sharing the keys, short strings, objects and arrays of the decoded
+    JSON values
+
+    A Compactor is used as the `object_pairs_hook` of a json.JSONDecoder. The
+    top-level values that are given to the program, such as the items of a database,
+    must be passed to `item` once decoded: they are not shared, so that they can be
+    modified in place
+    """
+
+    def __init__(self, records=False, max_length=MAX_LENGTH):
+        """
+        Create a new Compactor object
+
+        Args:
+            records     : whether to decode objects as Records instead of dicts
+            max_length  : the maximal length of the string values that are interned.
+                Keys are always interned
+        """
+        self.records = records
+        self.max_length = max_length
+        self.strings = {}
+        # maps the signature of the shared objects and arrays to them
+        self.shared = {}
+        # the ids of the shared values, whose id is part of signatures
+        self.shared_ids = set()
+        self.shapes = {}
+        self.last = None
+
+    def string(self, string):
+        """
+        Returns the shared copy of a string value
+        """
+        if len(string) > self.max_length:
+            return string
+        return self.strings.setdefault(string, string)
+
+    def value(self, json_value):
+        """
+        Returns the shared copy of a value, that is already shared if it is an object
+        """
+        if type(json_value) is str:
+            return self.string(json_value)
+        if type(json_value) is list:
+            return self.array(json_value)
+        return json_value
+
+    def signature(self, parts, json_value):
+        """
+        Extends `parts` with the parts identifying a value
+
+        Returns:
+            False if the value is not shared and the signature cannot be computed
+        """
+        type_ = type(json_value)
+        if type_ is float:
+            # 0.0 and -0.0 are equal but must not be shared
+            parts.append(type_)
+            parts.append(json_value.hex())
+        elif type_ in SCALARS:
+            parts.append(type_)
+            parts.append(json_value)
+        elif id(json_value) in self.shared_ids:
+            parts.append(id(json_value))
+        else:
+            return False
+        return True
+
+    def share(self, parts, json_obj):
+        """
+        Returns the shared value of signature `parts`, registering `json_obj` as that
+        value if there is none
+        """
+        signature = tuple(parts)
+        shared = self.shared.setdefault(signature, json_obj)
+        if shared is json_obj:
+            self.shared_ids.add(id(json_obj))
+            self.last = (json_obj, signature)
+        else:
+            self.last = (shared, None)
+        return shared
+
+    def array(self, json_array):
+        """
+        Returns the shared copy of an array
+        """
+        parts = [list]
+        shareable = True
+        for position, json_value in enumerate(json_array):
+            json_value = json_array[position] = self.value(json_value)
+            if shareable:
+                shareable = self.signature(parts, json_value)
+        if not shareable:
+            return json_array
+        return self.share(parts, json_array)
+
+    def __call__(self, pairs):
+        """
+        Builds a decoded object from its (key, value) pairs, see `object_pairs_hook`
+        in the json module
+        """
+        strings = self.strings
+        parts = [Record if self.records else dict]
+        shareable = True
+        keys, values = [], []
+        for key, json_value in pairs:
+            key = strings.setdefault(key, key)
+            json_value = self.value(json_value)
+            keys.append(key)
+            values.append(json_value)
+            if shareable:
+                parts.append(key)
+                shareable = self.signature(parts, json_value)
+        if self.records:
+            json_obj = Record(Shape.get(tuple(keys), self.shapes), values)
+        else:
+            json_obj = dict(zip(keys, values))
+        if not shareable:
+            self.last = None
+            return json_obj
+        return self.share(parts, json_obj)
+
+    def item(self, json_value):
+        """
+        Returns a top-level value decoded by the hook, not shared with other values
+        """
+        if self.last is not None and self.last[0] is json_value:
+            _, signature = self.last
+            self.last = None
+            if signature is None:
+                # an equal value was decoded before
+                return json_value.copy()
+            del self.shared[signature]
+            self.shared_ids.discard(id(json_value))
+        return json_value
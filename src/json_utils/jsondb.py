@@ -12,9 +12,15 @@ A `Database` represents an association of data and fields to search on that data
 """
 import copy
 import enum
+import heapq
+import itertools
+import re
 import warnings
+from collections import Counter, OrderedDict, namedtuple
 
+from ..json_utils import ahocorasick, jsoncolumn, jsonindex, textmatch, timing
 from ..json_utils import jsonplus as json
+from ..json_utils.bitset import Bitset
 
 __author__ = "Quentin Soubeyran"
 __copyright__ = "Copyright 2020, SAJE project"
@@ -76,6 +82,24 @@ class Operator(enum.Enum):
                 return member
 
 
+class Order(enum.Enum):
+    ASC = ("asc", "ascending")
+    DESC = ("desc", "descending")
+
+    def __new__(cls, *aliases):
+        obj = object.__new__(cls)
+        obj._value_ = aliases[0]
+        obj.aliases = aliases
+        return obj
+
+    @classmethod
+    def _missing_(cls, value):
+        string = str(value).lower()
+        for member in cls:
+            if string in member.aliases:
+                return member
+
+
 class FieldBase:
     """
     Represent a search field in a database. Base class, should not be instanciated
@@ -86,6 +110,10 @@ class FieldBase:
     CLASSES = {}
     KEY_TRANSLATION = {}
     TYPE = None
+    COLUMN = jsoncolumn.Column
+    INDEX = None
+    # whether the field can count the items holding each of its values, see facet()
+    FACETED = False
 
     def __init_subclass__(cls, **kwargs):
         """
@@ -103,6 +131,7 @@ class FieldBase:
             optional: whether this field should always check or allows any item is no value is provided
         """
         self.key = key
+        self.path = json.Path(key)
         self.optional = bool(optional)
 
     def compare(self, json_obj, accept_missing=True, invert=False, **kwargs):
@@ -121,12 +150,76 @@ class FieldBase:
         Returns:
             True if the object passes the test, false otherwise
         """
-        if json.has(json_obj, self.key):
-            return bool(invert) ^ bool(
-                self.test(json.get(json_obj, self.key), **kwargs)
-            )
-        else:
+        json_value = self.path.resolve(json_obj)
+        if json_value is json.MISSING:
             return accept_missing
+        return bool(invert) ^ bool(self.test(json_value, **kwargs))
+
+    def prepare(self, accept_missing=True, invert=False, **kwargs):
+        """
+        Validates and normalizes the arguments of `compare` once, for evaluating them
+        on many items. See `compare` for arguments
+
+        Returns:
+            A Criterion object
+        """
+        return Criterion(self, accept_missing, invert, self.prepare_test(**kwargs))
+
+    def prepare_test(self, **kwargs):
+        """
+        Validates the arguments of `test` and returns them as a dict of canonical values,
+        so that test() and the other methods taking them do not have to convert them
+        again. Subclasses should override this, the default returns them as is
+        """
+        return kwargs
+
+    def compile_test(self, **kwargs):
+        """
+        Returns a function of json values equivalent to test() with the arguments
+        returned by prepare_test(), without validating them again. Subclasses should
+        override this, the default calls test()
+        """
+        return lambda json_value: self.test(json_value, **kwargs)
+
+    def normalize(self, accept_missing=True, invert=False, **kwargs):
+        """
+        Returns a canonical hashable form of the arguments of `compare`, such that
+        arguments with the same canonical form select the same items
+
+        Raises:
+            TypeError if the arguments cannot be made hashable
+        """
+        return (bool(accept_missing), bool(invert), self.normalize_test(**kwargs))
+
+    def normalize_test(self, **kwargs):
+        """
+        Returns a canonical hashable form of the arguments of `test`. Subclasses should
+        override this to merge equivalent arguments, the default uses them as is
+        """
+        return tuple(sorted(kwargs.items()))
+
+    def narrows(self, new, old):
+        """
+        Returns whether the items selected by the arguments `new` are always a subset
+        of those selected by `old`. Both arguments are canonical forms returned by
+        `normalize`. False negatives are allowed, false positives are not
+        """
+        new_accept, new_invert, new_test = new
+        old_accept, old_invert, old_test = old
+        if new_accept and not old_accept or new_invert != old_invert:
+            return False
+        # inverting the test reverses the inclusion of the items with a value
+        if new_invert:
+            return self.narrows_test(old_test, new_test)
+        return self.narrows_test(new_test, old_test)
+
+    def narrows_test(self, new, old):
+        """
+        Returns whether all values passing test() with the arguments `new` also pass it
+        with the arguments `old`. Both are canonical forms returned by `normalize_test`.
+        Subclasses should override this, the default only detects equal arguments
+        """
+        return new == old
 
     def test(self, json_value, **kwargs):
         """
@@ -136,6 +229,114 @@ class FieldBase:
             "Subclasses of FieldBase must implement the test() method"
         )
 
+    def make_column(self, data):
+        """
+        Extracts the values of this field from `data` into a column
+
+        Returns:
+            An instance of the COLUMN class attribute, or a generic jsoncolumn.Column
+            if the values do not fit in COLUMN
+        """
+        return self.COLUMN.build(data, self.path)
+
+    def new_index(self, size):
+        """
+        Returns a new empty index for `size` items, or None if this field has no index
+        """
+        if self.INDEX is None:
+            return None
+        return self.INDEX(size)
+
+    def make_index(self, column):
+        """
+        Build the index of this field from its column of values
+
+        Returns:
+            An instance of the INDEX class attribute, or None if this field has no index
+            or if the values cannot be indexed. Searching then tests every item
+        """
+        index = self.new_index(column.size)
+        if index is None:
+            return None
+        try:
+            for item_id, json_value in column.items():
+                index.add(item_id, json_value)
+        except (TypeError, json.JsonTypeError, jsonindex.UnindexableError):
+            return None
+        index.finalize()
+        return index
+
+    def select(self, column, ids, index=None, **kwargs):
+        """
+        Selects the items that match this field, equivalent to calling `compare` on
+        each item. See Criterion.select, `kwargs` are the arguments of `compare`
+        """
+        return self.prepare(**kwargs).select(column, ids, index=index)
+
+    def mask(self, column, **kwargs):
+        """
+        Vectorized equivalent of `select` on all items, requires NumPy. See
+        Criterion.mask, `kwargs` are the arguments of `compare`
+        """
+        return self.prepare(**kwargs).mask(column)
+
+    def vectorizable(self, column):
+        """
+        Returns whether `mask` can be used on this column. Subclasses that implement
+        vector_test() should override this
+        """
+        return False
+
+    def vector_test(self, column, **kwargs):
+        """
+        Returns the NumPy boolean array of test() on the value of each item of the
+        column, whatever the result for missing items. Must be defined by subclasses
+        that can be vectorized
+        """
+        raise NotImplementedError(
+            "Subclasses of FieldBase that can be vectorized must implement the "
+            "vector_test() method"
+        )
+
+    def lookup(self, index, column, **kwargs):
+        """
+        Returns the Bitset of the items in `index` whose value passes test(). `column`
+        is the column of values the index was built from.
+        Must be defined by subclasses that have an INDEX
+        """
+        raise NotImplementedError(
+            "Subclasses of FieldBase with an INDEX must implement the lookup() method"
+        )
+
+    def estimate(self, size, index=None, **kwargs):
+        """
+        Estimates the number of items that match this field, without searching. See
+        Criterion.estimate, `kwargs` are the arguments of `compare`
+        """
+        return self.prepare(**kwargs).estimate(size, index=index)
+
+    def estimate_lookup(self, index, **kwargs):
+        """
+        Estimates the number of ids lookup() would return. Subclasses should override
+        this with a better estimate than the default, all the items with a value
+        """
+        return len(index.present)
+
+    def facet(self, column, ids, index=None):
+        """
+        Counts the items holding each value of this field. Must be defined by
+        subclasses that set FACETED
+
+        Args:
+            column  : the column of values of the field, as returned by make_column()
+            ids     : the Bitset of the ids of the items to count
+            index   : the index of the field, as returned by make_index()
+
+        Returns:
+            A dict mapping values to their number of items in `ids`
+        """
+        raise TypeError("Field type %s does not support facets" % type(self).TYPE)
+
     def to_json(self):
         """
         Return a JSON-like object (that can be written to file using the `json` module)
@@ -194,16 +395,157 @@ class FieldBase:
         )
 
 
+class Criterion:
+    """
+    A search criterion on a field, validated and normalized once by FieldBase.prepare()
+    so that it can be evaluated on many items and reused across searches
+    """
+
+    def __init__(self, field, accept_missing, invert, kwargs):
+        """
+        Create a new Criterion object
+
+        Args:
+            field           : the FieldBase object this criterion tests
+            accept_missing  : whether items without value for the field match
+            invert          : whether to invert the test for items with a value
+            kwargs          : the arguments of the test, as returned by
+                field.prepare_test()
+        """
+        self.field = field
+        self.accept_missing = bool(accept_missing)
+        self.invert = bool(invert)
+        self.kwargs = kwargs
+        self.predicate = field.compile_test(**kwargs)
+        try:
+            self.key = field.normalize(self.accept_missing, self.invert, **kwargs)
+        except TypeError:
+            self.key = None
+
+    def select(self, column, ids, index=None):
+        """
+        Selects the items that match this criterion
+
+        Args:
+            column  : the column of values of the field, as returned by make_column()
+            ids     : the Bitset of the ids (positions in the data) of the items to consider
+            index   : the index of the field, as returned by make_index()
+
+        Returns:
+            The Bitset of the ids from `ids` of the items that pass the test
+        """
+        if index is None:
+            test = column.predicate(self.test_function())
+            missing, accept_missing, invert = (
+                column.missing,
+                self.accept_missing,
+                self.invert,
+            )
+            return Bitset.from_ids(
+                (
+                    item_id
+                    for item_id in ids
+                    if (accept_missing if missing[item_id] else invert ^ test(item_id))
+                ),
+                column.size,
+            )
+        # lookup() only returns items with a value, so inverting is a xor with them
+        matched = self.field.lookup(index, column, **self.kwargs)
+        if self.invert:
+            matched = matched ^ index.present
+        if self.accept_missing:
+            matched = matched | index.missing()
+        return matched & ids
+
+    def match(self, json_obj):
+        """
+        Returns whether a single JSON-object matches this criterion, like
+        FieldBase.compare()
+        """
+        json_value = self.field.path.resolve(json_obj)
+        if json_value is json.MISSING:
+            return self.accept_missing
+        return self.invert ^ bool(self.test_function()(json_value))
+
+    def test_function(self):
+        """
+        Returns the compiled test of this criterion. While timing is enabled, its calls
+        are recorded under "<field>.test", see timing_name
+        """
+        if timing.enabled():
+            return timing.timed(self.predicate, "%s.test" % timing_name(self.field))
+        return self.predicate
+
+    def mask(self, column):
+        """
+        Vectorized equivalent of `select` on all items, requires NumPy
+
+        Args:
+            column: the column of values of the field, as returned by make_column()
+
+        Returns:
+            A NumPy boolean array, True for the items that pass the test
+        """
+        tested = self.field.vector_test(column, **self.kwargs)
+        return column.mask(
+            tested, accept_missing=self.accept_missing, invert=self.invert
+        )
+
+    def estimate(self, size, index=None):
+        """
+        Estimates the number of items that match this criterion, without searching
+
+        Args:
+            size    : the number of items in the data
+            index   : the index of the field over the data, as returned by make_index()
+
+        Returns:
+            The estimated number of matching items. Without an index nothing is known
+            and all items are assumed to match
+        """
+        if index is None:
+            return size
+        present = len(index.present)
+        matched = min(self.field.estimate_lookup(index, **self.kwargs), present)
+        if self.invert:
+            matched = present - matched
+        if self.accept_missing:
+            matched += size - present
+        return matched
+
+
 class OptionField(FieldBase):
     """
     Represent a search field that may take one value from a set of possible values
     """
 
     TYPE = "Option"
+    COLUMN = jsoncolumn.DictionaryColumn
+    INDEX = jsonindex.PostingIndex
+    FACETED = True
+    # the number of compiled tests test() keeps, see compiled_test()
+    COMPILED_TESTS = 64
 
     def __init__(self, key, values=[], optional=True):
         super().__init__(key, optional=optional)
         self.values = set(values)
+        self.compiled_tests = OrderedDict()
+
+    def check_values(self, valid_values):
+        """
+        Raises ValueError if the value(s) to test against are not valid for that field
+        """
+        if isinstance(valid_values, ValueSet):
+            unkown_values = valid_values - set(self.values)
+            if unkown_values:
+                raise ValueError(
+                    "Invalid test values %s, must be included in %s"
+                    % (unkown_values, self.values)
+                )
+        elif valid_values not in self.values:
+            raise ValueError(
+                "Invalid value %s: must be in %s" % (valid_values, self.values)
+            )
 
     def test(self, json_value, valid_values, operator: Operator = Operator.OR):
         """
@@ -216,43 +558,180 @@ class OptionField(FieldBase):
         Return:
             True if json_value is (one of) the valid value, False otherwise
         """
+        return self.compiled_test(valid_values, operator)(json_value)
+
+    def compiled_test(self, valid_values, operator: Operator = Operator.OR):
+        """
+        Returns the function compiled by compile_test() for the arguments of test(),
+        validating them only the first time they are given. The last COMPILED_TESTS
+        functions are kept
+        """
+        key = self.normalize_test(valid_values, operator)
+        test = self.compiled_tests.get(key)
+        if test is not None:
+            self.compiled_tests.move_to_end(key)
+            return test
+        if isinstance(valid_values, ValueSet):  # the caller may change its set
+            valid_values = ValueSet(valid_values)
+        test = self.compile_test(**self.prepare_test(valid_values, operator))
+        self.compiled_tests[key] = test
+        if len(self.compiled_tests) > self.COMPILED_TESTS:
+            self.compiled_tests.popitem(last=False)
+        return test
+
+    def prepare_test(self, valid_values, operator: Operator = Operator.OR):
+        self.check_values(valid_values)
         if isinstance(valid_values, ValueSet):
-            unkown_values = valid_values - set(self.values)
-            if unkown_values:
-                raise ValueError(
-                    "Invalid test values %s, must be included in %s"
-                    % (unkown_values, self.values)
-                )
-            if json.Type(json_value) is json.Value:
-                return json_value in valid_values
-            else:
-                values = set(
-                    json_value
-                    if json.Type(json_value) is json.Array
-                    else json_value.values()
-                )
-                match = values & valid_values
-                ops = Operator(operator)  # pylint: disable=no-value-for-parameter
-                if ops is Operator.OR:
-                    return bool(match)
-                elif ops is Operator.AND:
-                    return match == valid_values
-                else:
-                    raise TypeError("Unhandled Operator in OptionField test() method")
+            operator = Operator(operator)  # pylint: disable=no-value-for-parameter
+        return {"valid_values": valid_values, "operator": operator}
+
+    def compile_test(self, valid_values, operator: Operator = Operator.OR):
+        type_of = json.Type.of
+        if not isinstance(valid_values, ValueSet):
+
+            def test(json_value):
+                type_ = type_of(json_value)
+                if type_ is json.Value:
+                    return json_value == valid_values
+                values = json_value if type_ is json.Array else json_value.values()
+                return valid_values in set(values)
+
+        elif operator is Operator.OR:
+
+            def test(json_value):
+                type_ = type_of(json_value)
+                if type_ is json.Value:
+                    return json_value in valid_values
+                values = json_value if type_ is json.Array else json_value.values()
+                return not set(values).isdisjoint(valid_values)
+
+        elif operator is Operator.AND:
+
+            def test(json_value):
+                type_ = type_of(json_value)
+                if type_ is json.Value:
+                    return json_value in valid_values
+                values = json_value if type_ is json.Array else json_value.values()
+                return set(values) >= valid_values
+
         else:
-            if valid_values not in self.values:
-                raise ValueError(
-                    "Invalid value %s: must be in %s" % (valid_values, self.values)
-                )
-            if json.Type(json_value) is json.Value:
-                return json_value == valid_values
-            else:
-                values = set(
-                    json_value
-                    if json.Type(json_value) is json.Array
-                    else json_value.values()
+            raise TypeError("Unhandled Operator in OptionField compile_test() method")
+        return test
+
+    def normalize_test(self, valid_values, operator: Operator = Operator.OR):
+        if isinstance(valid_values, ValueSet):
+            ops = Operator(operator)  # pylint: disable=no-value-for-parameter
+            return (ValueSet, frozenset(valid_values), ops)
+        return (None, valid_values)
+
+    def narrows_test(self, new, old):
+        if new == old:
+            return True
+        new_values = new[1] if new[0] is ValueSet else frozenset([new[1]])
+        old_values = old[1] if old[0] is ValueSet else frozenset([old[1]])
+        # a single value tests like a ValueSet of that value with Operator.OR
+        new_ops = new[2] if new[0] is ValueSet else Operator.OR
+        old_ops = old[2] if old[0] is ValueSet else Operator.OR
+        if old_ops is Operator.OR:
+            # scalars must be in the values, arrays and objects must share one
+            return new_values <= old_values and (
+                new_ops is Operator.OR or bool(new_values)
+            )
+        # scalars must be in the values, arrays and objects must contain them all
+        return new_values == old_values and new_ops is Operator.AND
+
+    def lookup(self, index, column, valid_values, operator: Operator = Operator.OR):
+        """
+        Index equivalent of test(), combining the posting lists of the valid values
+        """
+        self.check_values(valid_values)
+        if not isinstance(valid_values, ValueSet):
+            return index.scalar_postings(valid_values) | index.collection_postings(
+                valid_values
+            )
+        matched = index.empty.union(
+            *(index.scalar_postings(value) for value in valid_values)
+        )
+        ops = Operator(operator)  # pylint: disable=no-value-for-parameter
+        if ops is Operator.OR:
+            return matched.union(
+                *(index.collection_postings(value) for value in valid_values)
+            )
+        elif ops is Operator.AND:
+            return matched | index.collection_ids.intersection(
+                *(index.collection_postings(value) for value in valid_values)
+            )
+        else:
+            raise TypeError("Unhandled Operator in OptionField lookup() method")
+
+    def vectorizable(self, column):
+        return jsoncolumn.numpy is not None and isinstance(
+            column, jsoncolumn.DictionaryColumn
+        )
+
+    def vector_test(self, column, valid_values, operator: Operator = Operator.OR):
+        """
+        Vectorized test(), evaluated once per distinct value of the column
+        """
+        self.check_values(valid_values)
+        return column.vector_predicate(
+            lambda json_value: self.test(json_value, valid_values, operator)
+        )
+
+    def estimate_lookup(self, index, valid_values, operator: Operator = Operator.OR):
+        """
+        Estimates the number of matching items from the size of the posting lists
+        """
+        self.check_values(valid_values)
+        if not isinstance(valid_values, ValueSet):
+            return len(index.scalar_postings(valid_values)) + len(
+                index.collection_postings(valid_values)
+            )
+        scalars = sum(len(index.scalar_postings(value)) for value in valid_values)
+        collections = [len(index.collection_postings(value)) for value in valid_values]
+        ops = Operator(operator)  # pylint: disable=no-value-for-parameter
+        if ops is Operator.AND:
+            return scalars + min(collections, default=len(index.collection_ids))
+        return scalars + sum(collections)
+
+    def facet_values(self, json_value):
+        """
+        Returns the set of the values of this field that test() accepts for
+        `json_value` when tested against them one at a time
+        """
+        type_ = json.Type(json_value)
+        if type_ is json.Value:
+            return {json_value} & self.values
+        values = json_value if type_ is json.Array else json_value.values()
+        return {value for value in values if value in self.values}
+
+    def facet(self, column, ids, index=None):
+        """
+        Counts the items of `ids` that each value of the field would select. Uses the
+        posting lists of the index if any, else counts the codes of the column in a
+        single pass and resolves each code once
+        """
+        if index is not None:
+            return {
+                value: len(
+                    (index.scalar_postings(value) | index.collection_postings(value))
+                    & ids
                 )
-                return valid_values in values
+                for value in self.values
+            }
+        counts = dict.fromkeys(self.values, 0)
+        if isinstance(column, jsoncolumn.DictionaryColumn):
+            for code, count in enumerate(column.code_counts(ids)):
+                if count:
+                    for value in self.facet_values(column.dictionary[code]):
+                        counts[value] += count
+        else:
+            for item_id in ids:
+                json_value = column.get(item_id)
+                if json_value is not json.MISSING:
+                    for value in self.facet_values(json_value):
+                        counts[value] += 1
+        return counts
 
     def _add_json_values(self, json_repr):
         json_repr["values"] = list(self.values)
@@ -267,7 +746,10 @@ class IntegerField(FieldBase):
     """
 
     TYPE = "Integer"
+    COLUMN = jsoncolumn.IntegerColumn
+    INDEX = jsonindex.SortedIndex
     KEY_TRANSLATION = {"min": "min_", "max": "max_"}
+    FACETED = True
 
     def __init__(self, key, min_=None, max_=None, optional=True):
         """
@@ -297,13 +779,157 @@ class IntegerField(FieldBase):
             comparison (optional): the comparison operation to use
                 the comparison is json_value OPS value
         """
+        value = self.check_value(value)
+        comparison = Comparison(comparison)  # pylint: disable=no-value-for-parameter
+        return comparison.compare(json_value, value)
+
+    def check_value(self, value):
+        """
+        Returns the value to compare against as an int
+
+        Raises:
+            ValueError if the value is out of the bounds of that field
+        """
         value = int(value)
         if self.min_ is not None and value < self.min_:
             raise ValueError("Invalid value %s: must be >= %s" % (value, self.min_))
         if self.max_ is not None and value > self.max_:
             raise ValueError("Invalid value %s: must be <= %s" % (value, self.max_))
+        return value
+
+    def prepare_test(self, value, comparison: Comparison = Comparison.EQ):
         comparison = Comparison(comparison)  # pylint: disable=no-value-for-parameter
-        return comparison.compare(json_value, value)
+        return {"value": self.check_value(value), "comparison": comparison}
+
+    def compile_test(self, value, comparison: Comparison = Comparison.EQ):
+        compare = comparison.compare
+        return lambda json_value: compare(json_value, value)
+
+    def normalize_test(self, value, comparison: Comparison = Comparison.EQ):
+        comparison = Comparison(comparison)  # pylint: disable=no-value-for-parameter
+        return (self.check_value(value), comparison)
+
+    @staticmethod
+    def interval(value, comparison):
+        """
+        Returns the interval of the values passing a comparison with `value`, as a
+        (low, low_strict, high, high_strict) tuple where None is infinite, or None
+        for Comparison.NEQ
+        """
+        if comparison is Comparison.LT:
+            return (None, False, value, True)
+        elif comparison is Comparison.LEQ:
+            return (None, False, value, False)
+        elif comparison is Comparison.EQ:
+            return (value, False, value, False)
+        elif comparison is Comparison.GEQ:
+            return (value, False, None, False)
+        elif comparison is Comparison.GT:
+            return (value, True, None, False)
+        return None
+
+    def narrows_test(self, new, old):
+        if new == old:
+            return True
+        new_interval = self.interval(*new)
+        old_interval = self.interval(*old)
+        if new_interval is None:
+            return False
+        if old_interval is None:
+            # the new values must exclude the old value
+            low, low_strict, high, high_strict = new_interval
+            value = old[0]
+            return (
+                low is not None
+                and (value < low or value == low and low_strict)
+                or high is not None
+                and (value > high or value == high and high_strict)
+            )
+        new_low, new_low_strict, new_high, new_high_strict = new_interval
+        old_low, old_low_strict, old_high, old_high_strict = old_interval
+        if old_low is not None:
+            if new_low is None or new_low < old_low:
+                return False
+            if new_low == old_low and old_low_strict and not new_low_strict:
+                return False
+        if old_high is not None:
+            if new_high is None or new_high > old_high:
+                return False
+            if new_high == old_high and old_high_strict and not new_high_strict:
+                return False
+        return True
+
+    def spans(self, index, value, comparison: Comparison = Comparison.EQ):
+        """
+        Returns the list of (start, stop) slices of the sorted index that hold the
+        items passing test()
+        """
+        value = self.check_value(value)
+        comparison = Comparison(comparison)  # pylint: disable=no-value-for-parameter
+        start, stop = index.bounds(value)
+        end = len(index.ids)
+        if comparison is Comparison.LT:
+            return [(0, start)]
+        elif comparison is Comparison.LEQ:
+            return [(0, stop)]
+        elif comparison is Comparison.EQ:
+            return [(start, stop)]
+        elif comparison is Comparison.NEQ:
+            return [(0, start), (stop, end)]
+        elif comparison is Comparison.GEQ:
+            return [(start, end)]
+        elif comparison is Comparison.GT:
+            return [(stop, end)]
+        else:
+            raise TypeError("Unhandled Comparison in IntegerField spans() method")
+
+    def lookup(self, index, column, value, comparison: Comparison = Comparison.EQ):
+        """
+        Index equivalent of test(), using bisection in the sorted values
+        """
+        return Bitset.empty(index.size).union(
+            *(
+                index.slice(start, stop)
+                for start, stop in self.spans(index, value, comparison)
+            )
+        )
+
+    def vectorizable(self, column):
+        return jsoncolumn.numpy is not None and isinstance(
+            column, jsoncolumn.IntegerColumn
+        )
+
+    def vector_test(self, column, value, comparison: Comparison = Comparison.EQ):
+        """
+        Vectorized test(), comparing the whole column at once
+        """
+        value = self.check_value(value)
+        comparison = Comparison(comparison)  # pylint: disable=no-value-for-parameter
+        return comparison.compare(column.vector(), value)
+
+    def estimate_lookup(self, index, value, comparison: Comparison = Comparison.EQ):
+        """
+        Exact count of the matching items, from the bisection bounds
+        """
+        return sum(stop - start for start, stop in self.spans(index, value, comparison))
+
+    def facet(self, column, ids, index=None):
+        """
+        Counts the items of `ids` holding each distinct integer value, in a single pass
+        over the column
+
+        Returns:
+            A dict mapping values to their number of items, in increasing value order
+        """
+        if isinstance(column, jsoncolumn.IntegerColumn):
+            counts = column.value_counts(ids)
+        else:
+            counts = Counter()
+            for item_id in ids:
+                json_value = column.get(item_id)
+                if isinstance(json_value, int):
+                    counts[json_value] += 1
+        return dict(sorted(counts.items()))
 
     def _add_json_values(self, json_repr):
         if self.min_ is not None:
@@ -318,6 +944,20 @@ class TextField(FieldBase):
     """
 
     TYPE = "Text"
+    COLUMN = jsoncolumn.TextColumn
+    INDEX = jsonindex.TrigramIndex
+    # from this number of subtexts, a single pass of an automaton beats one `in` each
+    AUTOMATON_THRESHOLD = 24
+
+    def __init__(self, key, optional=True, trigram_index=True):
+        """
+        Create a new TextField object. See FieldBase.__init__ for arguments
+
+        Args:
+            trigram_index: whether to index the values by trigrams to speed up searches
+        """
+        super().__init__(key, optional=optional)
+        self.trigram_index = bool(trigram_index)
 
     def test(self, json_value, value, operator: Operator = Operator.OR, case=False):
         """
@@ -335,89 +975,1140 @@ class TextField(FieldBase):
         else:
             return ops(subtxt.lower() in json_value.lower() for subtxt in value)
 
+    def prepare_test(self, value, operator: Operator = Operator.OR, case=False):
+        operator = Operator(operator)  # pylint: disable=no-value-for-parameter
+        return {"value": list(value), "operator": operator, "case": bool(case)}
 
-class Database:
-    """
-    A class to specify data and how to search on that data in JSON format
-    """
-
-    def __init__(self, data=[], fields={}):
+    @classmethod
+    def matcher(cls, subtexts, operator: Operator):
         """
-        Create a new database object
-
-        Args:
-            data: a list of JSON-like python object to search in
-            search_fields: a mapping from names (str) to Field objects, represents the
-                search fields
+        Returns a function of strings testing whether any (Operator.OR) or all
+        (Operator.AND) of the subtexts are in a string. Many subtexts are searched
+        together with an ahocorasick.Automaton, in a single pass over the string
         """
-        self.data = data
-        self.fields = fields
+        if len(subtexts) < cls.AUTOMATON_THRESHOLD:
+            function = operator.function
+            return lambda text: function(subtxt in text for subtxt in subtexts)
+        automaton = ahocorasick.Automaton(subtexts)
+        if operator is Operator.OR:
+            return automaton.match_any
+        elif operator is Operator.AND:
+            return automaton.match_all
+        raise TypeError("Unhandled Operator in TextField matcher() method")
+
+    def compile_test(self, value, operator: Operator = Operator.OR, case=False):
+        if case:
+            return self.matcher(value, operator)
+        match = self.matcher([subtxt.lower() for subtxt in value], operator)
+        return lambda json_value: match(json_value.lower())
 
-    def search(self, criteria, operator: Operator = Operator.AND):
-        """
-        Searches the database
+    def normalize_test(self, value, operator: Operator = Operator.OR, case=False):
+        ops = Operator(operator)  # pylint: disable=no-value-for-parameter
+        if case:
+            return (frozenset(value), ops, True)
+        return (frozenset(subtxt.lower() for subtxt in value), ops, False)
+
+    def narrows_test(self, new, old):
+        if new == old:
+            return True
+        new_lines, new_ops, new_case = new
+        old_lines, old_ops, old_case = old
+        if old_case and not new_case:
+            return False
+        if new_case and not old_case:
+            new_lines = [line.lower() for line in new_lines]
+
+        def implies(line, old_line):
+            # a text containing `line` contains all of its substrings
+            return old_line in line
+
+        def implies_all(old_line):
+            # whether any value passing the new test contains old_line
+            if new_ops is Operator.AND:
+                return any(implies(line, old_line) for line in new_lines)
+            return all(implies(line, old_line) for line in new_lines)
+
+        if old_ops is Operator.AND:
+            return all(implies_all(old_line) for old_line in old_lines)
+        if new_ops is Operator.AND:
+            return any(implies_all(old_line) for old_line in old_lines)
+        return all(
+            any(implies(line, old_line) for old_line in old_lines) for line in new_lines
+        )
 
-        Args:
-            criteria: mapping from field names to dictionary of keyword arguments
-                for their `test` method
-            operator (optional): the operator to use between the field return values
-                Operator.AND (default): all fields must be fullfilled
-                Operator.OR           : a single field suffice
+    def new_index(self, size):
+        if not self.trigram_index:
+            return None
+        return super().new_index(size)
 
-        Returns:
-            A list of item from the data that fullfills the search
+    def lookup(
+        self, index, column, value, operator: Operator = Operator.OR, case=False
+    ):
         """
-        for field_name, field in self.fields.items():
-            if not field.optional and field_name not in criteria:
-                raise ValueError("Field %s must be specified" % field_name)
-        if set(criteria) - set(self.fields):
-            raise ValueError(
-                "Unknown search field %s" % set(criteria) - set(self.fields)
+        Index equivalent of test(): pre-filters the items with the trigrams of the
+        subtexts, then checks the candidates exactly
+        """
+        ops = Operator(operator)  # pylint: disable=no-value-for-parameter
+        subtexts = list(value) if case else [subtxt.lower() for subtxt in value]
+        if ops is Operator.OR:
+            candidates = index.empty.union(
+                *(index.candidates(subtxt, case) for subtxt in subtexts)
             )
-        field_kwargs = [
-            (self.fields[field_name], kwargs) for field_name, kwargs in criteria.items()
+        elif ops is Operator.AND:
+            candidates = index.present.intersection(
+                *(index.candidates(subtxt, case) for subtxt in subtexts)
+            )
+        else:
+            raise TypeError("Unhandled Operator in TextField lookup() method")
+        texts = index.get_texts(column, case)
+        match = self.matcher(subtexts, ops)
+        return Bitset.from_ids(
+            (item_id for item_id in candidates if match(texts[item_id])),
+            index.size,
+        )
+
+    def estimate_lookup(
+        self, index, value, operator: Operator = Operator.OR, case=False
+    ):
+        """
+        Estimates the number of matching items from the trigram posting lists
+        """
+        ops = Operator(operator)  # pylint: disable=no-value-for-parameter
+        subtexts = list(value) if case else [subtxt.lower() for subtxt in value]
+        estimates = [index.estimate(subtxt, case) for subtxt in subtexts]
+        if ops is Operator.AND:
+            return min(estimates, default=len(index.present))
+        return sum(estimates)
+
+    def _add_json_values(self, json_repr):
+        if not self.trigram_index:
+            json_repr["trigram_index"] = False
+
+
+class RegexField(TextField):
+    """
+    Represent a Field for regular expression searching
+    """
+
+    TYPE = "Regex"
+
+    def test(self, json_value, value, case=False):
+        """
+        Test if the regular expression matches somewhere in the json value
+
+        Args:
+            value   : the regular expression, as a string
+            case    : should the search be case sensitive
+        """
+        return textmatch.compile_regex(value, bool(case)).search(json_value) is not None
+
+    def prepare_test(self, value, case=False):
+        textmatch.compile_regex(value, bool(case))
+        return {"value": value, "case": bool(case)}
+
+    def compile_test(self, value, case=False):
+        search = textmatch.compile_regex(value, case).search
+        return lambda json_value: search(json_value) is not None
+
+    def normalize_test(self, value, case=False):
+        return (value, bool(case))
+
+    def narrows_test(self, new, old):
+        return new == old
+
+    @staticmethod
+    def literals(value, case=False):
+        """
+        Returns the literals required by the regular expression and whether they are
+        case sensitive, which an inline (?i) flag can change
+        """
+        regex = textmatch.compile_regex(value, bool(case))
+        case = not regex.flags & re.IGNORECASE
+        return textmatch.required_literals(value, case), case
+
+    def lookup(self, index, column, value, case=False):
+        """
+        Index equivalent of test(): pre-filters the items with the trigrams of the
+        literals the regular expression requires, then matches the candidates
+        """
+        search = textmatch.compile_regex(value, bool(case)).search
+        literals, literal_case = self.literals(value, case)
+        candidates = index.present.intersection(
+            *(index.candidates(literal, literal_case) for literal in literals)
+        )
+        texts = index.get_texts(column)
+        return Bitset.from_ids(
+            (item_id for item_id in candidates if search(texts[item_id]) is not None),
+            index.size,
+        )
+
+    def estimate_lookup(self, index, value, case=False):
+        literals, literal_case = self.literals(value, case)
+        return min(
+            (index.estimate(literal, literal_case) for literal in literals),
+            default=len(index.present),
+        )
+
+
+class FuzzyField(TextField):
+    """
+    Represent a Field for typo-tolerant searching: the searched text must appear in
+    the value with at most a given number of edits
+    """
+
+    TYPE = "Fuzzy"
+
+    def test(self, json_value, value, distance=1, case=False):
+        """
+        Test if the json value contains a substring within `distance` edits of `value`
+
+        Args:
+            value   : the text to find in the json_value
+            distance: the maximum number of inserted, deleted or substituted characters
+            case    : should the search be case sensitive
+        """
+        if not case:
+            value, json_value = value.lower(), json_value.lower()
+        return textmatch.FuzzyMatcher(value, int(distance))(json_value)
+
+    def prepare_test(self, value, distance=1, case=False):
+        if not isinstance(value, str):
+            raise TypeError("Fuzzy search value must be a string, got %r" % (value,))
+        distance = int(distance)
+        if distance < 0:
+            raise ValueError("Edit distance must be positive, got %s" % distance)
+        return {"value": value, "distance": distance, "case": bool(case)}
+
+    def compile_test(self, value, distance=1, case=False):
+        if case:
+            return textmatch.FuzzyMatcher(value, distance)
+        match = textmatch.FuzzyMatcher(value.lower(), distance)
+        return lambda json_value: match(json_value.lower())
+
+    def normalize_test(self, value, distance=1, case=False):
+        return (value if case else value.lower(), int(distance), bool(case))
+
+    def narrows_test(self, new, old):
+        new_value, new_distance, new_case = new
+        old_value, old_distance, old_case = old
+        return (
+            new_value == old_value
+            and new_case == old_case
+            and new_distance <= old_distance
+        )
+
+    def lookup(self, index, column, value, distance=1, case=False):
+        """
+        Index equivalent of test(): an approximate match contains one of the
+        `distance` + 1 pieces of `value` exactly, and all but `distance` * N of its
+        trigrams. The items are pre-filtered with the trigrams, then checked
+        """
+        match = textmatch.FuzzyMatcher(value if case else value.lower(), int(distance))
+        if len(match.pattern) <= match.distance:
+            candidates = index.present
+        else:
+            candidates = index.empty.union(
+                *(index.candidates(piece, case) for _, piece in match.pieces)
+            )
+            minimum = len(index.ngrams(match.pattern)) - match.distance * index.N
+            candidates &= index.count_candidates(match.pattern, minimum, case)
+        texts = index.get_texts(column, case)
+        return Bitset.from_ids(
+            (item_id for item_id in candidates if match(texts[item_id])), index.size
+        )
+
+    def estimate_lookup(self, index, value, distance=1, case=False):
+        match = textmatch.FuzzyMatcher(value if case else value.lower(), int(distance))
+        if len(match.pattern) <= match.distance:
+            return len(index.present)
+        return sum(index.estimate(piece, case) for _, piece in match.pieces)
+
+
+PlanStep = namedtuple("PlanStep", ["field_name", "criterion", "engine", "estimate"])
+
+
+class Engine(enum.Enum):
+    """
+    The ways a field can be evaluated during a search, in order of preference
+    """
+
+    VECTOR = "vectorized"
+    INDEX = "index lookup"
+    SCAN = "scan"
+
+
+class QueryPlan:
+    """
+    Represents the order in which a Database evaluates the fields of a search
+
+    When NumPy is available, fields that can be vectorized are evaluated first on all
+    items at once, and their boolean masks are combined with the operator.
+    Under Operator.AND, the indexed fields are then evaluated, the most selective
+    first, and each step only considers the items kept by the previous ones. Fields
+    without index test each remaining item, so they come last.
+    Under Operator.OR, indexed fields are evaluated first, the least selective first,
+    so that fields without index only test the items not yet selected.
+    """
+
+    ENGINE_ORDER = {engine: order for order, engine in enumerate(Engine)}
+
+    def __init__(self, size, operator, steps, candidates=None, cached=None):
+        """
+        Create a new QueryPlan object
+
+        Args:
+            size    : the number of items in the database
+            operator: the Operator combining the fields
+            steps   : the list of PlanStep, in evaluation order
+            candidates: under Operator.AND, a Bitset known to contain all the
+                results, such as the results of a broader search. None to start
+                from all items
+            cached  : the cached results of the same search, that the database
+                returns instead of executing the plan, or None
+        """
+        self.size = size
+        self.operator = operator
+        self.steps = steps
+        self.candidates = candidates
+        self.cached = cached
+
+    @classmethod
+    def make(cls, database, prepared):
+        """
+        Plans a search of `database`
+
+        Args:
+            database: the Database to search
+            prepared: the PreparedSearch to plan, as returned by Database.prepare()
+        """
+        size = len(database.data)
+        steps = []
+        for field_name, criterion in prepared.criteria.items():
+            index = database.indexes[field_name]
+            if criterion.field.vectorizable(database.columns[field_name]):
+                engine = Engine.VECTOR
+            elif index is not None:
+                engine = Engine.INDEX
+            else:
+                engine = Engine.SCAN
+            estimate = criterion.estimate(size, index=index)
+            steps.append(PlanStep(field_name, criterion, engine, estimate))
+        sign = 1 if prepared.operator is Operator.AND else -1
+        steps.sort(
+            key=lambda step: (cls.ENGINE_ORDER[step.engine], sign * step.estimate)
+        )
+        return cls(size, prepared.operator, steps)
+
+    def execute(self, database):
+        """
+        Executes the plan on `database`
+
+        Returns:
+            The Bitset of the ids of the items that fulfill the search
+        """
+        all_ids = database.alive
+        vector_steps = [step for step in self.steps if step.engine is Engine.VECTOR]
+        steps = self.steps[len(vector_steps) :]
+        if vector_steps:
+            combined = None
+            for step in vector_steps:
+                mask = step.criterion.mask(database.columns[step.field_name])
+                if combined is None:
+                    combined = mask
+                elif self.operator is Operator.AND:
+                    combined &= mask
+                else:
+                    combined |= mask
+            selected = Bitset.from_mask(combined) & all_ids
+        else:
+            selected = (
+                all_ids if self.operator is Operator.AND else Bitset.empty(all_ids.size)
+            )
+        if self.operator is Operator.AND and self.candidates is not None:
+            selected = selected & self.candidates
+        if self.operator is Operator.AND:
+            for step in steps:
+                if not selected:
+                    break
+                selected = step.criterion.select(
+                    database.columns[step.field_name],
+                    selected,
+                    index=database.indexes[step.field_name],
+                )
+        else:
+            for step in steps:
+                if selected == all_ids:
+                    break
+                selected |= step.criterion.select(
+                    database.columns[step.field_name],
+                    all_ids - selected,
+                    index=database.indexes[step.field_name],
+                )
+        return selected
+
+    def explain(self):
+        """
+        Returns a human-readable description of the plan
+        """
+        lines = [
+            "%s of %s field(s) over %s items"
+            % (self.operator.name, len(self.steps), self.size)
         ]
+        if self.cached is not None:
+            lines.append("  answered from the cache: %s items" % len(self.cached))
+        elif self.candidates is not None:
+            lines.append(
+                "  refines a cached broader search of %s items" % len(self.candidates)
+            )
+        for position, step in enumerate(self.steps, start=1):
+            lines.append(
+                "  %s. %s: %s, ~%s items (%.1f%%)"
+                % (
+                    position,
+                    step.field_name,
+                    step.engine.value,
+                    step.estimate,
+                    100 * step.estimate / self.size if self.size else 0,
+                )
+            )
+        return "\n".join(lines)
+
+
+class PreparedSearch:
+    """
+    A search validated and normalized once by Database.prepare(). It can be passed
+    in place of the criteria to the search methods of that database, to repeat the
+    search without converting its criteria again
+    """
+
+    def __init__(self, operator, criteria):
+        """
+        Create a new PreparedSearch object
+
+        Args:
+            operator: the Operator combining the fields
+            criteria: mapping from field names to Criterion objects
+        """
+        self.operator = operator
+        self.criteria = criteria
+        if any(criterion.key is None for criterion in criteria.values()):
+            self.key = None
+        else:
+            self.key = (
+                operator,
+                frozenset(
+                    (field_name, criterion.key)
+                    for field_name, criterion in criteria.items()
+                ),
+            )
+
+    def match(self, json_obj):
+        """
+        Returns whether a single JSON-object fulfills the search
+        """
+        return self.operator.function(
+            criterion.match(json_obj) for criterion in self.criteria.values()
+        )
+
+    def __repr__(self):
+        return "%s(%s, %s)" % (
+            type(self).__name__,
+            self.operator.name,
+            sorted(self.criteria),
+        )
+
+
+CacheInfo = namedtuple(
+    "CacheInfo", ["hits", "misses", "refinements", "maxsize", "currsize"]
+)
+
+
+class Database:
+    """
+    A class to specify data and how to search on that data in JSON format
+
+    The results of the last searches are kept in a LRU cache, keyed by the canonical
+    form of their criteria. In refine mode, a search under Operator.AND that narrows a
+    cached search only evaluates the items of the cached results
+
+    The data is modified with `insert`, `update`, `delete` and `bulk_apply`, which
+    maintain the columns, indexes and cached results of the changed items only. Items
+    keep their id: a deleted item leaves None in the data, and is excluded from `alive`,
+    the Bitset of the ids of the items that can be found. If the data is modified
+    otherwise, the database must be rebuilt
+    """
+
+    def __init__(
+        self,
+        data=[],
+        fields={},
+        cache_size=128,
+        refine=True,
+        sort_keys=(),
+        stored=None,
+    ):
+        """
+        Create a new database object
+
+        Args:
+            data: a list of JSON-like python object to search in
+            search_fields: a mapping from names (str) to Field objects, represents the
+                search fields
+            cache_size: the maximum number of search results to cache, 0 disables
+                the cache
+            refine: whether to evaluate narrowing searches on cached results only
+            sort_keys: the sort keys to presort the data by, see `search`. Other sort
+                keys are sorted on first use
+            stored: a sidecar.Stored object, the columns, indexes and orders loaded
+                from the index file of the data, used instead of building them
+        """
+        self.fields = fields
+        self.observers = []
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_refinements = 0
+        self.refine = refine
+        self.sort_keys = [self.sort_spec(sort_key) for sort_key in sort_keys]
+        self.load(data, stored=stored)
+
+    def load(self, data, stored=None):
+        """
+        Replaces the data of the database, and builds its columns, indexes and
+        presorted orders
+
+        Args:
+            data: a list of JSON-like python object to search in
+            stored: an object providing the columns, indexes and orders of the data,
+                such as a sidecar.Stored object or a DatabaseBuilder, or None to build
+                them
+        """
+        if stored is not None and stored.size != len(data):
+            raise ValueError(
+                "Stored index of %s items does not match the %s items of the data"
+                % (stored.size, len(data))
+            )
+        self.data = data
+        self.alive = Bitset.full(len(data))
+        self.cache.clear()
+        self.columns = {}
+        self.indexes = {}
+        # fields with the same key and column type share their column and index
+        shared_columns, shared_indexes = {}, {}
+        for field_name, field in self.fields.items():
+            column_key = (field.COLUMN, field.path.keys)
+            column = None if stored is None else stored.column(field_name)
+            if column is None:
+                if column_key not in shared_columns:
+                    shared_columns[column_key] = field.make_column(data)
+                column = shared_columns[column_key]
+            self.columns[field_name] = column
+            if stored is not None and stored.has_index(field_name):
+                self.indexes[field_name] = stored.index(field_name, column)
+                continue
+            index_key = (field.INDEX, column_key)
+            if shared_indexes.get(index_key) is None:
+                shared_indexes[index_key] = field.make_index(column)
+            self.indexes[field_name] = shared_indexes[index_key]
+        self.ranks = {}
+        self.sort_orders = {}
+        for spec in self.sort_keys:
+            order = None if stored is None else stored.sort_order(spec)
+            if order is not None:
+                self.sort_orders[spec] = order
+            else:
+                self.sort_order(spec)
+
+    def prepare(self, criteria, operator: Operator = Operator.AND):
+        """
+        Validates and normalizes a search once, so that it can be repeated without
+        converting its criteria again. See `search` for arguments
+
+        Returns:
+            A PreparedSearch object. If `criteria` is already one, it is returned as is
+        """
+        if isinstance(criteria, PreparedSearch):
+            return criteria
+        for field_name, field in self.fields.items():
+            if not field.optional and field_name not in criteria:
+                raise ValueError("Field %s must be specified" % field_name)
+        if set(criteria) - set(self.fields):
+            raise ValueError(
+                "Unknown search field %s" % (set(criteria) - set(self.fields))
+            )
         ops = Operator(operator)  # pylint: disable=no-value-for-parameter
+        return PreparedSearch(
+            ops,
+            {
+                field_name: self.fields[field_name].prepare(**kwargs)
+                for field_name, kwargs in criteria.items()
+            },
+        )
+
+    def plan(self, criteria, operator: Operator = Operator.AND):
+        """
+        Plans a search of the database. See `search` for arguments
+
+        Returns:
+            A QueryPlan object
+        """
+        prepared = self.prepare(criteria, operator)
+        plan = QueryPlan.make(self, prepared)
+        if prepared.key is not None and prepared.key in self.cache:
+            plan.cached = self.cache[prepared.key][1]
+        elif (
+            self.refine
+            and prepared.operator is Operator.AND
+            and prepared.key is not None
+        ):
+            plan.candidates = self.refinement_base(prepared.key)
+        return plan
+
+    def narrows(self, new_key, old_key):
+        """
+        Returns whether the search with canonical form `new_key` always selects a subset
+        of the search with canonical form `old_key`. Only detected under Operator.AND,
+        when each criterion of the old search is narrowed by the new search
+        """
+        new_ops, new_criteria = new_key
+        old_ops, old_criteria = old_key
+        if new_ops is not Operator.AND or old_ops is not Operator.AND:
+            return False
+        new_criteria = dict(new_criteria)
+        return all(
+            field_name in new_criteria
+            and self.fields[field_name].narrows(new_criteria[field_name], old)
+            for field_name, old in old_criteria
+        )
+
+    def refinement_base(self, key):
+        """
+        Returns the smallest cached result of a search that the search with canonical
+        form `key` narrows, or None if there is none
+        """
+        base = None
+        for old_key, (_, selected) in self.cache.items():
+            if old_key == key:
+                continue
+            if (base is None or len(selected) < len(base)) and self.narrows(
+                key, old_key
+            ):
+                base = selected
+        return base
+
+    def cache_info(self):
+        """
+        Returns the statistics of the search cache, as a CacheInfo namedtuple
+        """
+        return CacheInfo(
+            self.cache_hits,
+            self.cache_misses,
+            self.cache_refinements,
+            self.cache_size,
+            len(self.cache),
+        )
+
+    def cache_clear(self):
+        """
+        Clears the search cache and its statistics
+        """
+        self.cache.clear()
+        self.cache_hits = self.cache_misses = self.cache_refinements = 0
+
+    def select(self, criteria, operator: Operator = Operator.AND):
+        """
+        Searches the database, using the cache. See `search` for arguments
+
+        Returns:
+            The Bitset of the ids of the items that fulfill the search
+        """
+        prepared = self.prepare(criteria, operator)
+        key = prepared.key if self.cache_size > 0 else None
+        if key is not None and key in self.cache:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key][1]
+        self.cache_misses += 1
+        plan = self.plan(prepared)
+        if plan.candidates is not None:
+            self.cache_refinements += 1
+        selected = plan.execute(self)
+        if key is not None:
+            self.cache[key] = (prepared, selected)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return selected
+
+    def facets(self, criteria, fields=None, operator: Operator = Operator.AND):
+        """
+        Counts, for each value of some fields, the items that the search would return
+        with that value selected. Under Operator.AND, the items of a field are counted
+        among the results of the search without the criterion on that field, so that
+        the counts are not restricted to the values already selected. Under
+        Operator.OR, they are counted among the results of the search
+
+        Args:
+            criteria: see `search`
+            fields (optional): the names of the fields to count, all the fields that
+                support facets if None
+            operator (optional): see `search`
+
+        Returns:
+            A dict mapping field names to dicts mapping values to their count
+        """
+        prepared = self.prepare(criteria, operator)
+        if fields is None:
+            fields = [name for name, field in self.fields.items() if field.FACETED]
+        facets = {}
+        for field_name in fields:
+            if field_name not in self.fields:
+                raise ValueError("Unknown search field %s" % field_name)
+            if prepared.operator is Operator.AND and field_name in prepared.criteria:
+                others = PreparedSearch(
+                    prepared.operator,
+                    {
+                        name: criterion
+                        for name, criterion in prepared.criteria.items()
+                        if name != field_name
+                    },
+                )
+                selected = self.select(others)
+            else:
+                selected = self.select(prepared)
+            facets[field_name] = self.fields[field_name].facet(
+                self.columns[field_name], selected, index=self.indexes[field_name]
+            )
+        return facets
+
+    def explain(self, criteria, operator: Operator = Operator.AND):
+        """
+        Returns a human-readable description of how a search would be performed.
+        See `search` for arguments
+        """
+        return self.plan(criteria, operator).explain()
+
+    def sort_spec(self, sort_by):
+        """
+        Returns the canonical form of a sort key, a tuple of (field name, Order) pairs.
+        See `search` for the accepted forms
+        """
+        if isinstance(sort_by, str) or (
+            isinstance(sort_by, tuple)
+            and not all(isinstance(key, tuple) for key in sort_by)
+        ):
+            # a single key, rather than a canonical form or a list of keys
+            sort_by = [sort_by]
+        spec = []
+        for key in sort_by:
+            if isinstance(key, str):
+                if key not in self.fields and key.startswith("-"):
+                    key = (key[1:], Order.DESC)
+                else:
+                    key = (key, Order.ASC)
+            field_name, order = key
+            if field_name not in self.fields:
+                raise ValueError("Unknown sort field %s" % (field_name,))
+            spec.append(
+                (field_name, Order(order))  # pylint: disable=no-value-for-parameter
+            )
+        return tuple(spec)
+
+    def sort_function(self, spec):
+        """
+        Returns the function mapping item ids to their key for the canonical sort key
+        `spec`. Items without a sortable value come last, whatever the order
+        """
+        columns = []
+        for field_name, order in spec:
+            if field_name not in self.ranks:
+                self.ranks[field_name] = self.columns[field_name].ranks()
+            columns.append((self.ranks[field_name].ranks, order is Order.DESC))
+        if len(columns) == 1:
+            ranks, descending = columns[0]
+            sign = -1 if descending else 1
+            return lambda item_id: (
+                (1, 0) if ranks[item_id] is None else (0, sign * ranks[item_id])
+            )
+        return lambda item_id: tuple(
+            (1, 0)
+            if ranks[item_id] is None
+            else (0, -ranks[item_id] if descending else ranks[item_id])
+            for ranks, descending in columns
+        )
+
+    def sort_order(self, spec):
+        """
+        Returns the list of all item ids sorted by the canonical sort key `spec`. It is
+        computed once and cached, ties keep the data order
+        """
+        if spec not in self.sort_orders:
+            self.sort_orders[spec] = sorted(
+                range(len(self.data)), key=self.sort_function(spec)
+            )
+        return self.sort_orders[spec]
+
+    def sorted_ids(self, selected, sort_by, limit=None):
+        """
+        Iterates over the ids of `selected` in the order of `sort_by`
+
+        A presorted order is filtered lazily, so only its start is read when few items
+        are needed. Otherwise, the `limit` first ids are selected with a heap, and
+        without limit the whole order is sorted and cached
+        """
+        spec = self.sort_spec(sort_by)
+        if (
+            limit is not None
+            and spec not in self.sort_orders
+            and spec not in self.sort_keys
+        ):
+            return iter(heapq.nsmallest(limit, selected, key=self.sort_function(spec)))
+        order = self.sort_order(spec)
+        if len(selected) == len(order):
+            return iter(order)
+        member = bytearray(len(order))
+        for item_id in selected:
+            member[item_id] = 1
+        return (item_id for item_id in order if member[item_id])
+
+    def search_iter(self, criteria, operator: Operator = Operator.AND, sort_by=None):
+        """
+        Searches the database, yielding the matching items lazily in data order, or in
+        the order of `sort_by`. See `search` for arguments
+        """
+        data = self.data
+        selected = self.select(criteria, operator)
+        if sort_by is not None:
+            selected = self.sorted_ids(selected, sort_by)
+        for item_id in selected:
+            yield data[item_id]
+
+    def search(
+        self,
+        criteria,
+        operator: Operator = Operator.AND,
+        limit=None,
+        offset=0,
+        sort_by=None,
+    ):
+        """
+        Searches the database
+
+        Args:
+            criteria: mapping from field names to dictionary of keyword arguments
+                for their `compare` method, or a PreparedSearch returned by `prepare`
+            operator (optional): the operator to use between the field return values,
+                ignored for a PreparedSearch
+                Operator.AND (default): all fields must be fullfilled
+                Operator.OR           : a single field suffice
+            limit (optional): the maximum number of items to return, None for all
+            offset (optional): the number of matching items to skip
+            sort_by (optional): the order of the items, data order if None. Either a
+                field name, prefixed with "-" for descending order, a (field name,
+                order) tuple where order is an Order or one of "asc" and "desc", or a
+                list of them to break ties with the next ones. Items without a value
+                for a field come last
+
+        Returns:
+            A list of item from the data that fullfills the search
+        """
+        stop = None if limit is None else offset + limit
+        if sort_by is None:
+            ids = self.select(criteria, operator)
+        else:
+            ids = self.sorted_ids(self.select(criteria, operator), sort_by, limit=stop)
+        data = self.data
+        return [data[item_id] for item_id in itertools.islice(ids, offset, stop)]
+
+    def count(self, criteria, operator: Operator = Operator.AND):
+        """
+        Returns the number of items that fulfill a search, without listing them.
+        See `search` for arguments
+        """
+        return len(self.select(criteria, operator))
+
+    def insert(self, json_obj):
+        """
+        Adds a JSON-object to the data
+
+        Returns:
+            The id of the new item
+        """
+        return self.bulk_apply([("insert", json_obj)])[0]
+
+    def update(self, item_id, json_obj):
+        """
+        Replaces the item `item_id` with the JSON-object `json_obj`
+        """
+        self.bulk_apply([("update", item_id, json_obj)])
+
+    def delete(self, item_id):
+        """
+        Removes the item `item_id` from the data
+        """
+        self.bulk_apply([("delete", item_id)])
+
+    def check_operations(self, operations):
+        """
+        Validates a list of operations for `bulk_apply` without applying them
+
+        Returns:
+            The list of (item id, new JSON-object or None) pairs of the operations
+        """
+        size, deleted, changes = len(self.data), set(), []
+        for operation in operations:
+            if not isinstance(operation, (tuple, list)) or not operation:
+                raise ValueError("Invalid database operation %r" % (operation,))
+            kind, *arguments = operation
+            if kind == "insert" and len(arguments) == 1:
+                item_id, json_obj = size, arguments[0]
+                size += 1
+            elif kind == "update" and len(arguments) == 2:
+                item_id, json_obj = arguments
+            elif kind == "delete" and len(arguments) == 1:
+                item_id, json_obj = arguments[0], None
+            else:
+                raise ValueError("Invalid database operation %r" % (operation,))
+            if kind != "insert" and (
+                not isinstance(item_id, int)
+                or not 0 <= item_id < size
+                or item_id in deleted
+                or (item_id < len(self.data) and self.data[item_id] is None)
+            ):
+                raise KeyError("No item with id %r" % (item_id,))
+            if json_obj is None:
+                deleted.add(item_id)
+            elif json.Type(json_obj) is not json.Object:
+                raise ValueError(
+                    "Invalid data element %r: should be a json object" % (json_obj,)
+                )
+            changes.append((item_id, json_obj))
+        return changes
+
+    def bulk_apply(self, operations):
+        """
+        Applies a batch of modifications to the data. The whole batch is validated
+        before any is applied, then the columns, indexes and cached search results are
+        updated once for all the changed items, and the changed items are moved to
+        their place in the presorted orders. The observers, functions in the
+        `observers` list, are then called with (item id, old JSON-object, new
+        JSON-object) for each operation, None standing for the object of a missing item
+
+        Args:
+            operations: an iterable of tuples, either ("insert", json_obj),
+                ("update", item_id, json_obj) or ("delete", item_id)
+
+        Returns:
+            The list of the item ids of the operations, in order
+        """
+        changes = self.check_operations(list(operations))
+        if not changes:
+            return []
+        data, previous, notifications = self.data, {}, []
+        self.remove_sorted({item_id for item_id, _ in changes if item_id < len(data)})
+        for item_id, json_obj in changes:
+            if item_id == len(data):
+                old_obj = None
+                data.append(json_obj)
+            else:
+                old_obj = data[item_id]
+                data[item_id] = json_obj
+            previous.setdefault(item_id, old_obj)
+            notifications.append((item_id, old_obj, json_obj))
+        self.apply_columns(previous)
+        self.apply_indexes(previous)
+        self.insert_sorted(previous)
+        changed = Bitset.from_ids(previous, len(data))
+        alive = [item_id for item_id in previous if data[item_id] is not None]
+        self.alive = (self.alive - changed) | Bitset.from_ids(alive, len(data))
+        for key, (prepared, selected) in list(self.cache.items()):
+            try:
+                matched = Bitset.from_ids(
+                    (item_id for item_id in alive if prepared.match(data[item_id])),
+                    len(data),
+                )
+            except Exception:  # the search fails on a new value, let it fail again
+                del self.cache[key]
+                continue
+            self.cache[key] = (prepared, (selected - changed) | matched)
+        for notification in notifications:
+            for observer in self.observers:
+                observer(*notification)
+        return [item_id for item_id, _ in changes]
+
+    def shared_fields(self, structures):
+        """
+        Groups the fields that share a column or an index
+
+        Args:
+            structures: the `columns` or `indexes` mapping
+
+        Returns:
+            A list of (structure, field names) pairs, fields without index excluded
+        """
+        groups = {}
+        for field_name, structure in structures.items():
+            if structure is not None:
+                groups.setdefault(id(structure), (structure, []))[1].append(field_name)
+        return list(groups.values())
+
+    @staticmethod
+    def resolve(field, json_obj):
+        """
+        Returns the value of a field in a JSON-object, MISSING if the object is None
+        """
+        return json.MISSING if json_obj is None else field.path.resolve(json_obj)
+
+    def apply_columns(self, previous):
+        """
+        Updates the columns for the changed items of `bulk_apply`. A column that cannot
+        store a new value is extracted again from the data
+        """
+        data = self.data
+        for column, field_names in self.shared_fields(self.columns):
+            field = self.fields[field_names[0]]
+            try:
+                column.grow(len(data))
+                for item_id in previous:
+                    json_value = self.resolve(field, data[item_id])
+                    if json_value is json.MISSING:
+                        column.clear(item_id)
+                    else:
+                        column.set(item_id, json_value)
+            except jsoncolumn.ColumnTypeError:
+                column = field.make_column(data)
+                for field_name in field_names:
+                    self.columns[field_name] = column
+
+    @staticmethod
+    def order_position(order, sort_function, item_id):
+        """
+        Returns the position of an item in a sorted order by bisection, where it is or
+        would be inserted. Ties in an order are in item id order
+        """
+        key = (sort_function(item_id), item_id)
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if (sort_function(order[middle]), order[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def remove_sorted(self, item_ids):
+        """
+        Removes the items about to change in `bulk_apply` from the presorted orders,
+        while the ranks still are those of their current values
+        """
+        for spec in self.sort_orders:
+            sort_function = self.sort_function(spec)
+            order = self.sort_orders[spec]
+            if not isinstance(order, list):  # loaded from an index file
+                order = self.sort_orders[spec] = list(order)
+            for item_id in item_ids:
+                del order[self.order_position(order, sort_function, item_id)]
+
+    def insert_sorted(self, previous):
+        """
+        Updates the ranks for the changed items of `bulk_apply`, and inserts them at
+        their new place in the presorted orders
+        """
+        size = len(self.data)
+        for field_name, ranking in self.ranks.items():
+            column = self.columns[field_name]
+            ranking.grow(size)
+            for item_id in previous:
+                ranking.set(item_id, column.get(item_id))
+        for spec, order in self.sort_orders.items():
+            sort_function = self.sort_function(spec)
+            for item_id in previous:
+                position = self.order_position(order, sort_function, item_id)
+                order.insert(position, item_id)
+
+    def apply_indexes(self, previous):
+        """
+        Updates the indexes for the changed items of `bulk_apply`, from the objects
+        they had before. An index that cannot store a new value is dropped, so that its
+        fields test the items instead
+        """
+        data = self.data
+        for index, field_names in self.shared_fields(self.indexes):
+            field = self.fields[field_names[0]]
+            try:
+                index.grow(len(data))
+                for item_id, old_obj in previous.items():
+                    json_value = self.resolve(field, old_obj)
+                    if json_value is not json.MISSING:
+                        index.remove(item_id, json_value)
+                    json_value = self.resolve(field, data[item_id])
+                    if json_value is not json.MISSING:
+                        index.insert(item_id, json_value)
+            except (TypeError, json.JsonTypeError, jsonindex.UnindexableError):
+                for field_name in field_names:
+                    self.indexes[field_name] = None
+
+    @staticmethod
+    def valid_item(name, json_obj):
+        """
+        Returns whether an element of the `data` member of a JSON database is a valid
+        item, warning that it is ignored otherwise
+
+        Args:
+            name    : the position or key of the element in `data`
+            json_obj: the element
+        """
+        # dicts, as returned by the json module, skip the slower generic check
+        if type(json_obj) is dict or json.Type(json_obj) is json.Object:
+            return True
+        warnings.warn(
+            "Invalid data element %s in json db: should be a json object, was ignored"
+            % name
+        )
+        return False
+
+    @staticmethod
+    def valid_items(raw_data):
+        """
+        Returns the list of the valid items of the `data` member of a JSON database,
+        see `valid_item`
+        """
+        type_ = json.Type(raw_data)
+        if type_ not in (json.Array, json.Object):
+            raise ValueError(
+                "Invalid json DB: `data` key must have type json array or object"
+            )
+        if type_ is json.Array:
+            raw_data_iter = enumerate(raw_data)
+        else:
+            raw_data_iter = raw_data.items()
         return [
             json_obj
-            for json_obj in self.data
-            if ops(field.compare(json_obj, **kwargs) for field, kwargs in field_kwargs)
+            for name, json_obj in raw_data_iter
+            if Database.valid_item(name, json_obj)
         ]
 
     @staticmethod
-    def from_json(json_db):
+    def from_json(json_db, stored=None):
         if json.Type(json_db) is not json.Object:
             raise ValueError("Json representation of database must be a Json object")
         if "data" not in json_db:
             raise ValueError("Json representation of database has no `data` member")
         if "fields" not in json_db:
             raise ValueError("Json representation of database has not `fields` member")
-        for name in set(json_db.keys()) - set(["data", "fields"]):
+        for name in set(json_db.keys()) - set(["data", "fields", "sort_keys"]):
             warnings.warn("Unused key '%s' in json representation of database" % name)
-        raw_data = json_db["data"]
-        type_ = json.Type(raw_data)
-        if type_ not in (json.Array, json.Object):
-            raise ValueError(
-                "Invalid json DB: `data` key must have type json array or object"
-            )
-        data = []
-        if type_ is json.Array:
-            raw_data_iter = enumerate(raw_data)
-        else:
-            raw_data_iter = raw_data.items()
-        for name, json_obj in raw_data_iter:
-            if json.Type(json_obj) is not json.Object:
-                warnings.warn(
-                    "Invalid data element %s in json db: should be a json object, was ignored"
-                    % name
-                )
-            else:
-                data.append(json_obj)
+        data = Database.valid_items(json_db["data"])
         fields = {
             name: FieldBase.from_json(json_field, data=data)
             for name, json_field in json_db["fields"].items()
         }
-        return Database(data=data, fields=fields)
+        return Database(
+            data=data,
+            fields=fields,
+            sort_keys=json_db.get("sort_keys", []),
+            stored=stored,
+        )
 
     def to_json(self):
         """
@@ -430,5 +2121,217 @@ class Database:
             "fields": {
                 field_name: field.to_json() for field_name, field in self.fields.items()
             },
-            "data": self.data,
+            "data": [json_obj for json_obj in self.data if json_obj is not None],
+        }
+
+
+class DatabaseBuilder:
+    """
+    Builds the columns and indexes of a database as its items are added one at a
+    time, for instance while the data is read from a file
+
+    The builder provides the same methods as sidecar.Stored, and is given to
+    Database.load by `finish`
+    """
+
+    def __init__(self, database, build=True, data=None, indexes=True):
+        """
+        Create a new DatabaseBuilder object
+
+        Args:
+            database: the Database whose data is built, with its fields set
+            build   : whether to build the columns and indexes, or only collect the
+                items. Disabled when the structures are expected from an index file
+            data    : the sequence of the items, a new list by default. Items added to
+                it by other means are passed to `extract`
+            indexes : whether to build the indexes, or only the columns
+        """
+        self.database = database
+        self.build = build
+        self.data = [] if data is None else data
+        self.columns = {}
+        self.indexes = {}
+        # fields with the same key and column type share their column and index
+        shared_columns, shared_indexes = {}, {}
+        for field_name, field in database.fields.items() if build else ():
+            column_key = (field.COLUMN, field.path.keys)
+            if column_key not in shared_columns:
+                shared_columns[column_key] = field.COLUMN(0)
+            self.columns[field_name] = shared_columns[column_key]
+            if not indexes:
+                self.indexes[field_name] = None
+                continue
+            index_key = (field.INDEX, column_key)
+            if index_key not in shared_indexes:
+                shared_indexes[index_key] = field.new_index(0)
+            self.indexes[field_name] = shared_indexes[index_key]
+        self.paths = {
+            id(column): (column, database.fields[field_name].path)
+            for field_name, column in self.columns.items()
         }
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def extend(self, json_objs):
+        """
+        Appends a list of items to the data, and to the columns and indexes
+        """
+        self.data.extend(json_objs)
+        self.extract(json_objs, len(self.data) - len(json_objs))
+
+    def extract(self, json_objs, start):
+        """
+        Adds the values of items already in the data to the columns and indexes
+
+        Args:
+            json_objs   : the list of the items
+            start       : the id of the first item
+        """
+        stop = start + len(json_objs)
+        for column, path in list(self.paths.values()):
+            column.grow(stop)
+            try:
+                for item_id, json_obj in enumerate(json_objs, start):
+                    json_value = path.resolve(json_obj)
+                    if json_value is not json.MISSING:
+                        column.set(item_id, json_value)
+            except jsoncolumn.ColumnTypeError:
+                self.fallback(column, path)
+        self.index_items(start, stop)
+
+    def merge(self, json_objs, columns, indexes=None):
+        """
+        Appends a list of items whose columns were extracted by another builder, for
+        instance in another process
+
+        Args:
+            json_objs   : the list of the items
+            columns     : the `columns` of a DatabaseBuilder of a database with the
+                same fields, holding the values of these items only
+            indexes     : the `indexes` of that DatabaseBuilder, not finalized, or None
+                to index the items from the columns
+        """
+        start = len(self.data)
+        self.data.extend(json_objs)
+        stop = len(self.data)
+        for column, path in list(self.paths.values()):
+            field_name = next(
+                name for name, other in self.columns.items() if other is column
+            )
+            other = columns[field_name]
+            column.grow(start)
+            if type(other) is type(column):
+                column.append(other)
+            elif type(column) is jsoncolumn.Column:
+                column.grow(stop)
+                for item_id, json_value in other.items():
+                    column.set(start + item_id, json_value)
+            else:
+                self.fallback(column, path)
+        if indexes is None:
+            self.index_items(start, stop)
+            return
+        merged = set()
+        for field_name, index in list(self.indexes.items()):
+            if index is None or id(index) in merged:
+                continue
+            merged.add(id(index))
+            other = indexes[field_name]
+            if other is None:
+                self.drop(index)
+            else:
+                index.append(other, start)
+
+    def index_items(self, start, stop):
+        """
+        Adds the values in the columns of the items from `start` to `stop` to the
+        indexes
+        """
+        indexed = set()
+        for field_name, index in list(self.indexes.items()):
+            if index is None or id(index) in indexed:
+                continue
+            indexed.add(id(index))
+            column = self.columns[field_name]
+            try:
+                for item_id in range(start, stop):
+                    json_value = column.get(item_id)
+                    if json_value is not json.MISSING:
+                        index.add(item_id, json_value)
+            except (TypeError, json.JsonTypeError, jsonindex.UnindexableError):
+                self.drop(index)
+
+    def fallback(self, column, path):
+        """
+        Replaces a column that cannot store a value by a generic column
+        """
+        generic = jsoncolumn.Column.build(self.data, path)
+        del self.paths[id(column)]
+        self.paths[id(generic)] = (generic, path)
+        for field_name, other in self.columns.items():
+            if other is column:
+                self.columns[field_name] = generic
+
+    def drop(self, index):
+        """
+        Removes an index that cannot store a value, the fields then have no index
+        """
+        for field_name, other in self.indexes.items():
+            if other is index:
+                self.indexes[field_name] = None
+
+    def finish(self):
+        """
+        Finalizes the columns and indexes, and loads the data into the database
+
+        Returns:
+            The database
+        """
+        finalized = set()
+        for structure in [*self.columns.values(), *self.indexes.values()]:
+            if structure is None or id(structure) in finalized:
+                continue
+            finalized.add(id(structure))
+            structure.size = len(self.data)
+            structure.finalize()
+        self.database.load(self.data, stored=self if self.build else None)
+        return self.database
+
+    def column(self, field_name):
+        return self.columns.get(field_name)
+
+    def has_index(self, field_name):
+        return True
+
+    def index(self, field_name, column):
+        return self.indexes[field_name]
+
+    def sort_order(self, spec):
+        return None
+
+
+def timing_name(field):
+    """
+    Returns the name of a field in the timing statistics, its type and key
+    """
+    return "%s(%s)" % (field.TYPE, field.path.sep.join(map(str, field.path.keys)))
+
+
+def timing_naming(method):
+    """
+    Returns the naming function of the calls of a method of fields or criteria, see
+    timing.instrument
+    """
+
+    def naming(obj, *args, **kwargs):
+        return "%s.%s" % (timing_name(getattr(obj, "field", obj)), method)
+
+    return naming
+
+
+for _method in ("search", "count", "facets"):
+    timing.instrument(Database, _method)
+for _method in ("select", "mask", "match"):
+    timing.instrument(Criterion, _method, timing_naming(_method))
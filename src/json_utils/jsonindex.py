@@ -0,0 +1,502 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Module for the search indexes of the SAJE project
+
+An index is built once from the data of a `jsondb.Database` for a single search field,
+and allows that field to answer queries without testing every item of the data.
+Items are identified by their position in the data, called the item id. Sets of item
+ids are collected in lists while building, and stored as `Bitset` once finalized.
+A finalized index follows the changes of the data through `grow`, `insert` and `remove`,
+and can be stored in an index file with `dump` to be loaded back instead of rebuilt
+"""
+import bisect
+from array import array
+
+from ..json_utils import jsonplus as json
+from ..json_utils.bitset import Bitset
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = "0.1.0"
+__maintainer__ = "Quentin Soubeyran"
+__status__ = "beta"
+
+
+class UnindexableError(Exception):
+    """
+    Exception when a json value cannot be stored in an index
+    """
+
+
+class IndexBase:
+    """
+    Base class for field indexes. Keeps track of the items that have a value for the field
+    """
+
+    def __init__(self, size=0):
+        """
+        Create a new empty index
+
+        Args:
+            size: the number of items in the indexed data
+        """
+        self.size = size
+        self.present = []
+
+    def add(self, item_id, json_value):
+        """
+        Add the value of an item to the index. Must be defined by subclasses
+        """
+        raise NotImplementedError("Subclasses of IndexBase must implement add()")
+
+    def append(self, other, offset):
+        """
+        Adds the items of another index of the same class, not finalized yet, whose
+        item ids start at `offset` in this index. Subclasses overriding this must
+        call it
+        """
+        self.present.extend(item_id + offset for item_id in other.present)
+
+    @staticmethod
+    def shift(postings, other, offset):
+        """
+        Adds the id lists of a mapping to those of `postings`, the ids being shifted by
+        `offset`
+        """
+        for key, ids in other.items():
+            postings.setdefault(key, []).extend(item_id + offset for item_id in ids)
+
+    def finalize(self):
+        """
+        Called once all items have been added. Subclasses overriding this must call it
+        """
+        self.present = Bitset.from_ids(self.present, self.size)
+
+    def grow(self, size):
+        """
+        Extends a finalized index to `size` items, the new items having no value
+        """
+        if size > self.size:
+            self.size = size
+            self.present = Bitset(self.present.bits, size)
+
+    def insert(self, item_id, json_value):
+        """
+        Adds the value of an item to a finalized index, the item having no value in the
+        index. Subclasses must check that the value can be indexed before calling this
+        """
+        self.present = self.present.add(item_id)
+        self.size = self.present.size
+
+    def remove(self, item_id, json_value):
+        """
+        Removes the value `json_value` of an item from a finalized index
+        """
+        self.present = self.present.discard(item_id)
+
+    def dump(self, writer):
+        """
+        Stores a finalized index in an index file. Subclasses overriding this must
+        extend the description returned by this method
+
+        Args:
+            writer: the sidecar.Writer of the index file
+
+        Returns:
+            The JSON-like description of the index for `load`, or None if the index is
+            not stored and must be built from the data again
+        """
+        return {"size": self.size, "present": writer.bitset(self.present)}
+
+    @classmethod
+    def load(cls, description, reader, column):
+        """
+        Rebuilds an index stored by `dump`. Subclasses overriding this must call it
+
+        Args:
+            description : the description returned by `dump`
+            reader      : the sidecar.Reader of the index file
+            column      : the column of values the index was built from
+        """
+        index = cls(description["size"])
+        index.present = reader.bitset(description["present"])
+        return index
+
+    def to_bitsets(self, postings):
+        """
+        Converts in-place the id lists of a mapping to Bitsets
+        """
+        for key, ids in postings.items():
+            postings[key] = Bitset.from_ids(ids, self.size)
+
+    @staticmethod
+    def include(postings, key, item_id):
+        """
+        Adds an item id to the Bitset of `key` in a mapping of finalized postings
+        """
+        posting = postings.get(key)
+        postings[key] = (
+            Bitset.empty(0).add(item_id) if posting is None else posting.add(item_id)
+        )
+
+    @staticmethod
+    def exclude(postings, key, item_id):
+        """
+        Removes an item id from the Bitset of `key` in a mapping of finalized postings,
+        dropping the key once no item holds it
+        """
+        posting = postings[key].discard(item_id)
+        if posting:
+            postings[key] = posting
+        else:
+            del postings[key]
+
+    def missing(self):
+        """
+        Returns the Bitset of the item ids that have no value for the indexed field
+        """
+        return ~self.present
+
+
+class PostingIndex(IndexBase):
+    """
+    Inverted index mapping json values to posting lists, the set of the ids of
+    the items holding that value
+
+    Scalar json values and the elements of json arrays or values of json objects
+    are indexed separately, as fields usually treat them differently
+    """
+
+    def __init__(self, size=0):
+        super().__init__(size)
+        self.scalars = {}
+        self.collections = {}
+        self.collection_ids = []
+        self.empty = Bitset.empty(size)
+
+    def add(self, item_id, json_value):
+        if json.Type(json_value) is json.Value:
+            self.scalars.setdefault(json_value, []).append(item_id)
+        else:
+            for value in self.elements(json_value):
+                self.collections.setdefault(value, []).append(item_id)
+            self.collection_ids.append(item_id)
+        self.present.append(item_id)
+
+    def append(self, other, offset):
+        super().append(other, offset)
+        self.shift(self.scalars, other.scalars, offset)
+        self.shift(self.collections, other.collections, offset)
+        self.collection_ids.extend(item_id + offset for item_id in other.collection_ids)
+
+    def finalize(self):
+        super().finalize()
+        self.to_bitsets(self.scalars)
+        self.to_bitsets(self.collections)
+        self.collection_ids = Bitset.from_ids(self.collection_ids, self.size)
+        self.empty = Bitset.empty(self.size)
+
+    @staticmethod
+    def elements(json_value):
+        """
+        Returns the list of the indexed values of an array or object
+        """
+        if json.Type(json_value) is json.Array:
+            return list(json_value)
+        return list(json_value.values())
+
+    def insert(self, item_id, json_value):
+        if json.Type(json_value) is json.Value:
+            hash(json_value)
+            super().insert(item_id, json_value)
+            self.include(self.scalars, json_value, item_id)
+        else:
+            values = set(self.elements(json_value))
+            super().insert(item_id, json_value)
+            for value in values:
+                self.include(self.collections, value, item_id)
+            self.collection_ids = self.collection_ids.add(item_id)
+
+    def remove(self, item_id, json_value):
+        super().remove(item_id, json_value)
+        if json.Type(json_value) is json.Value:
+            self.exclude(self.scalars, json_value, item_id)
+        else:
+            for value in set(self.elements(json_value)):
+                self.exclude(self.collections, value, item_id)
+            self.collection_ids = self.collection_ids.discard(item_id)
+
+    def dump(self, writer):
+        description = super().dump(writer)
+        description["scalars"] = writer.postings(self.scalars)
+        description["collections"] = writer.postings(self.collections)
+        description["collection_ids"] = writer.bitset(self.collection_ids)
+        return description
+
+    @classmethod
+    def load(cls, description, reader, column):
+        index = super().load(description, reader, column)
+        index.scalars = reader.postings(description["scalars"])
+        index.collections = reader.postings(description["collections"])
+        index.collection_ids = reader.bitset(description["collection_ids"])
+        return index
+
+    def scalar_postings(self, value):
+        """
+        Returns the ids of the items whose value is the scalar `value`
+        """
+        return self.scalars.get(value, self.empty)
+
+    def collection_postings(self, value):
+        """
+        Returns the ids of the items whose array or object value contains `value`
+        """
+        return self.collections.get(value, self.empty)
+
+
+class SortedIndex(IndexBase):
+    """
+    Index of numeric values kept as a sorted column of (value, item id) pairs, so that
+    comparisons with a value select a contiguous slice of item ids
+    """
+
+    def __init__(self, size=0):
+        super().__init__(size)
+        self.pairs = []
+        self.keys = []
+        self.ids = []
+
+    @staticmethod
+    def check(json_value):
+        """
+        Raises UnindexableError if `json_value` cannot be sorted
+        """
+        if not json.Type.is_numeric(json_value) or json_value != json_value:
+            raise UnindexableError("Cannot sort non-numeric value %r" % (json_value,))
+
+    def add(self, item_id, json_value):
+        self.check(json_value)
+        self.pairs.append((json_value, item_id))
+        self.present.append(item_id)
+
+    def append(self, other, offset):
+        super().append(other, offset)
+        self.pairs.extend(
+            (json_value, item_id + offset) for json_value, item_id in other.pairs
+        )
+
+    def insert(self, item_id, json_value):
+        self.check(json_value)
+        super().insert(item_id, json_value)
+        if not isinstance(self.keys, list):  # loaded from an index file
+            self.keys, self.ids = self.keys.tolist(), self.ids.tolist()
+        position = bisect.bisect_right(self.keys, json_value)
+        self.keys.insert(position, json_value)
+        self.ids.insert(position, item_id)
+
+    def remove(self, item_id, json_value):
+        super().remove(item_id, json_value)
+        if not isinstance(self.keys, list):  # loaded from an index file
+            self.keys, self.ids = self.keys.tolist(), self.ids.tolist()
+        start, stop = self.bounds(json_value)
+        position = self.ids.index(item_id, start, stop)
+        del self.keys[position]
+        del self.ids[position]
+
+    def finalize(self):
+        super().finalize()
+        self.pairs.sort()
+        self.keys = [value for value, _ in self.pairs]
+        self.ids = [item_id for _, item_id in self.pairs]
+        self.pairs = []
+
+    def dump(self, writer):
+        try:
+            keys = array("q", self.keys)
+        except (TypeError, OverflowError):
+            # floats, or integers beyond 64 bits that are only kept exactly as floats
+            try:
+                keys = array("d", self.keys)
+            except OverflowError:
+                return None
+            if keys.tolist() != self.keys:
+                return None
+        description = super().dump(writer)
+        description["typecode"] = keys.typecode
+        description["keys"] = writer.add(keys)
+        description["ids"] = writer.add(array("q", self.ids))
+        return description
+
+    @classmethod
+    def load(cls, description, reader, column):
+        index = super().load(description, reader, column)
+        index.keys = reader.view(description["keys"], description["typecode"])
+        index.ids = reader.view(description["ids"], "q")
+        return index
+
+    def bounds(self, value):
+        """
+        Returns the (start, stop) positions of `value` in the sorted column: items
+        before start are < value, items from stop onward are > value
+        """
+        return (
+            bisect.bisect_left(self.keys, value),
+            bisect.bisect_right(self.keys, value),
+        )
+
+    def slice(self, start, stop):
+        """
+        Returns the Bitset of the items between positions start and stop in the sorted column
+        """
+        return Bitset.from_ids(self.ids[start:stop], self.size)
+
+
+class TrigramIndex(IndexBase):
+    """
+    Index of string values by their n-grams (trigrams by default), in both case-sensitive
+    and case-folded variants. Looking up the n-grams of a substring gives a superset
+    of the items containing it, that must then be checked exactly, on the values in the
+    column of the index
+    """
+
+    N = 3
+
+    def __init__(self, size=0):
+        super().__init__(size)
+        self.folded_texts = None
+        self.grams = {}
+        self.folded_grams = {}
+
+    @classmethod
+    def ngrams(cls, string):
+        """
+        Returns the set of n-grams of a string
+        """
+        return {string[i : i + cls.N] for i in range(len(string) - cls.N + 1)}
+
+    @staticmethod
+    def check(json_value):
+        """
+        Raises UnindexableError if `json_value` is not a string
+        """
+        if not json.Type.is_string(json_value):
+            raise UnindexableError("Cannot index non-string value %r" % (json_value,))
+
+    def add(self, item_id, json_value):
+        self.check(json_value)
+        folded = json_value.lower()
+        for gram in self.ngrams(json_value):
+            self.grams.setdefault(gram, []).append(item_id)
+        for gram in self.ngrams(folded):
+            self.folded_grams.setdefault(gram, []).append(item_id)
+        self.present.append(item_id)
+
+    def append(self, other, offset):
+        super().append(other, offset)
+        self.shift(self.grams, other.grams, offset)
+        self.shift(self.folded_grams, other.folded_grams, offset)
+
+    def finalize(self):
+        super().finalize()
+        self.to_bitsets(self.grams)
+        self.to_bitsets(self.folded_grams)
+        self.empty = Bitset.empty(self.size)
+
+    def insert(self, item_id, json_value):
+        self.check(json_value)
+        super().insert(item_id, json_value)
+        folded = json_value.lower()
+        if self.folded_texts is not None:
+            self.folded_texts[item_id] = folded
+        for gram in self.ngrams(json_value):
+            self.include(self.grams, gram, item_id)
+        for gram in self.ngrams(folded):
+            self.include(self.folded_grams, gram, item_id)
+
+    def remove(self, item_id, json_value):
+        super().remove(item_id, json_value)
+        if self.folded_texts is not None:
+            del self.folded_texts[item_id]
+        for gram in self.ngrams(json_value):
+            self.exclude(self.grams, gram, item_id)
+        for gram in self.ngrams(json_value.lower()):
+            self.exclude(self.folded_grams, gram, item_id)
+
+    def dump(self, writer):
+        description = super().dump(writer)
+        description["grams"] = writer.postings(self.grams)
+        description["folded_grams"] = writer.postings(self.folded_grams)
+        return description
+
+    @classmethod
+    def load(cls, description, reader, column):
+        index = super().load(description, reader, column)
+        index.grams = reader.postings(description["grams"])
+        index.folded_grams = reader.postings(description["folded_grams"])
+        index.empty = Bitset.empty(index.size)
+        return index
+
+    def get_texts(self, column, case=True):
+        """
+        Returns the mapping from item ids to their string value in `column`, the column
+        of the index, case-folded if not `case`. The case-folded values are computed
+        from the column on the first case-insensitive search, then kept up to date by
+        `insert` and `remove`
+        """
+        if case:
+            return column.values
+        if self.folded_texts is None:
+            self.folded_texts = {
+                item_id: text.lower() for item_id, text in column.items()
+            }
+        return self.folded_texts
+
+    def postings(self, substring, case=True):
+        """
+        Returns the list of posting lists of the n-grams of `substring`, smallest first,
+        or None if the substring is too short to have any n-gram
+        """
+        grams = self.ngrams(substring)
+        if not grams:
+            return None
+        postings = self.grams if case else self.folded_grams
+        return sorted((postings.get(gram, self.empty) for gram in grams), key=len)
+
+    def estimate(self, substring, case=True):
+        """
+        Returns an upper bound on the number of items containing `substring`
+        """
+        postings = self.postings(substring, case)
+        if postings is None:
+            return len(self.present)
+        return len(postings[0])
+
+    def candidates(self, substring, case=True):
+        """
+        Returns the ids of the items that may contain `substring`. If not `case`, the
+        substring must already be case-folded with str.lower()
+        """
+        postings = self.postings(substring, case)
+        if postings is None:
+            return self.present
+        return postings[0].intersection(*postings[1:])
+
+    def count_candidates(self, substring, minimum, case=True):
+        """
+        Returns the ids of the items that contain at least `minimum` of the distinct
+        n-grams of `substring`. Each edit of a string removes at most N of its n-grams,
+        so this pre-filters approximate matches. If not `case`, the substring must
+        already be case-folded with str.lower()
+        """
+        if minimum <= 0:
+            return self.present
+        postings = self.grams if case else self.folded_grams
+        # at_least[j] holds the items that contain j of the n-grams seen so far
+        at_least = [self.present] + [self.empty] * minimum
+        for gram in self.ngrams(substring):
+            posting = postings.get(gram, self.empty)
+            for count in range(minimum, 0, -1):
+                at_least[count] = at_least[count] | (at_least[count - 1] & posting)
+        return at_least[minimum]
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+JSON Lines data files for the SAJE project
+
+A JSON Lines file holds one JSON value per line. `JsonLines` is the sequence of the
+items of such a file, that only keeps the byte offset of each item and decodes it
+from the memory-mapped file when it is accessed
+"""
+import json
+import mmap
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = "0.1.0"
+__maintainer__ = "Quentin Soubeyran"
+__status__ = "beta"
+
+CACHE_SIZE = 4096
+
+
+def scan(file, digest=None):
+    """
+    Iterates over the non-blank lines of a file
+
+    Args:
+        file    : the file object to read, opened in binary mode
+        digest  : a hashlib object updated with the bytes read, or None
+
+    Yields:
+        (line number, byte offset, line) tuples, starting at line 1
+    """
+    offset = 0
+    for number, line in enumerate(file, 1):
+        if digest is not None:
+            digest.update(line)
+        if line.strip():
+            yield number, offset, line
+        offset += len(line)
+
+
+class JsonLines(Sequence):
+    """
+    The items of a JSON Lines file, decoded on access
+
+    The last decoded items are cached, so that the objects of displayed items stay the
+    same. The items can be replaced or appended to as in a list: the changes are kept
+    in memory, the file is never written
+    """
+
+    def __init__(self, path, offsets=None, cache_size=CACHE_SIZE):
+        """
+        Create a new JsonLines object
+
+        Args:
+            path        : the path of the JSON Lines file
+            offsets     : the byte offsets of the lines of the items, in item order.
+                Empty by default, see `extend_offsets`
+            cache_size  : the number of decoded items to keep
+        """
+        self.path = path
+        self.offsets = array("q") if offsets is None else offsets
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.changed = {}
+        self.appended = 0
+        self.buffer = None
+
+    def __len__(self):
+        return len(self.offsets) + self.appended
+
+    def __getitem__(self, item_id):
+        if not isinstance(item_id, int):
+            raise TypeError("JsonLines indices must be integers")
+        if item_id < 0:
+            item_id += len(self)
+        if item_id in self.changed:
+            return self.changed[item_id]
+        json_obj = self.cache.get(item_id)
+        if json_obj is not None:
+            self.cache.move_to_end(item_id)
+            return json_obj
+        json_obj = json.loads(self.line(item_id))
+        self.cache[item_id] = json_obj
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return json_obj
+
+    def line(self, item_id):
+        """
+        Returns the bytes of the line of an item of the file
+        """
+        if not 0 <= item_id < len(self.offsets):
+            raise IndexError("JsonLines index out of range")
+        if self.buffer is None:
+            with open(self.path, "rb") as file:
+                self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        start = self.offsets[item_id]
+        end = self.buffer.find(b"\n", start)
+        return self.buffer[start : None if end < 0 else end]
+
+    def __setitem__(self, item_id, json_obj):
+        if not 0 <= item_id < len(self):
+            raise IndexError("JsonLines assignment index out of range")
+        self.cache.pop(item_id, None)
+        self.changed[item_id] = json_obj
+
+    def append(self, json_obj):
+        self.changed[len(self)] = json_obj
+        self.appended += 1
+
+    def extend(self, json_objs):
+        for json_obj in json_objs:
+            self.append(json_obj)
+
+    def extend_offsets(self, offsets):
+        """
+        Appends the offsets of lines of the file to the items
+        """
+        if self.appended:
+            raise ValueError("Cannot add lines of the file after appended items")
+        if not isinstance(self.offsets, array):  # loaded from an index file
+            self.offsets = array("q", self.offsets)
+        self.offsets.extend(offsets)
+
+    def close(self):
+        """
+        Releases the mapping of the file, that is mapped again on the next access
+        """
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
@@ -16,6 +16,11 @@ __status__ = "beta"
 
 # keep the type
 set_type = set
+# keep the functions of the json module
+json_dump, json_dumps = dump, dumps
+
+# sentinel for missing values
+MISSING = object()
 
 
 class JsonTypeError(Exception):
@@ -72,6 +77,10 @@ class Type(enum.Enum):
     Array = object()
     Value = object()
 
+    def __reduce_ex__(self, protocol):
+        # the values are unique to each process, so members are pickled by name
+        return getattr, (type(self), self.name)
+
     @classmethod
     def _missing_(cls, value):
         return cls.of(value)
@@ -126,6 +135,33 @@ class Type(enum.Enum):
 Object, Array, Value = Type.Object, Type.Array, Type.Value
 
 
+def encode_mapping(json_obj):
+    """
+    `default` function for the json module, encoding any Mapping as a JSON object
+    """
+    if isinstance(json_obj, Mapping):
+        return dict(json_obj)
+    raise TypeError(
+        "Object of type %s is not JSON serializable" % type(json_obj).__name__
+    )
+
+
+def dump(obj, fp, **kwargs):
+    """
+    Same as json.dump, but encodes any Mapping, as Type does
+    """
+    kwargs.setdefault("default", encode_mapping)
+    return json_dump(obj, fp, **kwargs)
+
+
+def dumps(obj, **kwargs):
+    """
+    Same as json.dumps, but encodes any Mapping, as Type does
+    """
+    kwargs.setdefault("default", encode_mapping)
+    return json_dumps(obj, **kwargs)
+
+
 def flatten(json_obj: dict):
     """
     Flatten a json as a list of key-value pairs where the key is the list of keys from the root to the value
@@ -305,7 +341,7 @@ def get(obj, key, jtype=None, sep="."):
         raise KeyError("empty Json key")
     for k in key[:-1]:
         obj = obj[k]
-    value = obj[key[0]]
+    value = obj[key[-1]]
     if jtype and not Type(value) is jtype:
         raise InvalidJsonTypeError(
             jtype,
@@ -324,9 +360,69 @@ def has(obj, key, jtype=None, sep="."):
         return False
 
 
+class Path:
+    """
+    Compiled json key path, to resolve the same key in many json objects
+
+    The key is split once at creation, and resolving walks the object in a single pass
+    without raising exceptions on missing keys
+    """
+
+    def __init__(self, key, sep="."):
+        """
+        Create a new Path object
+
+        Args:
+            key: the key as a string of keys separated by `sep`, or as a sequence of keys
+            sep: the separator of keys in `key`
+        """
+        keys = key.split(sep) if isinstance(key, str) else key
+        if len(keys) == 0:
+            raise KeyError("empty Json key")
+        self.key = key
+        self.keys = tuple(keys)
+        self.sep = sep
+        if len(self.keys) == 1:
+            self.resolve = self._resolve_single
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.key)
+
+    def _resolve_single(self, obj, default=MISSING):
+        if isinstance(obj, dict):
+            return obj.get(self.keys[0], default)
+        return self.__class__.resolve(self, obj, default)
+
+    def resolve(self, obj, default=MISSING):
+        """
+        Returns the value under the key path in `obj`, or `default` if there is none
+        """
+        for key in self.keys:
+            if isinstance(obj, Mapping):
+                obj = obj.get(key, MISSING)
+                if obj is MISSING:
+                    return default
+            elif (
+                isinstance(key, int)
+                and isinstance(obj, Sequence)
+                and not isinstance(obj, str)
+                and -len(obj) <= key < len(obj)
+            ):
+                obj = obj[key]
+            else:
+                return default
+        return obj
+
+    def has(self, obj):
+        """
+        Returns whether `obj` has a value under the key path
+        """
+        return self.resolve(obj) is not MISSING
+
+
 def set(obj, key, value, sep="."):
     if isinstance(key, str):
-        key.split(sep)
+        key = key.split(sep)
     if len(key) == 0:
         raise KeyError
     elif len(key) == 1:
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Incremental reading of large JSON files for the SAJE project
+
+An `ObjectStream` reads the top-level JSON object of a file member by member, and can
+return the elements of a large member one at a time as they are read, so that the file
+is never held in memory at once. Values are decoded with the json module
+"""
+import codecs
+import json
+import re
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = "0.1.0"
+__maintainer__ = "Quentin Soubeyran"
+__status__ = "beta"
+
+CHUNK_SIZE = 1 << 20
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+NUMBER_PARTS = "0123456789+-.eE"
+
+
+class ObjectStream:
+    """
+    Reads the top-level JSON object of a binary file, in file order
+
+    The value of the members named in `streamed` is not decoded at once if it is an
+    array or an object: `members` returns an iterator over its (position or key,
+    element) pairs instead, that must be consumed before reading the next member.
+    Only the text read but not yet decoded is kept in memory
+    """
+
+    def __init__(
+        self,
+        file,
+        streamed=(),
+        chunk_size=CHUNK_SIZE,
+        digest=None,
+        element_decoder=None,
+    ):
+        """
+        Create a new ObjectStream object
+
+        Args:
+            file        : the file object to read, opened in binary mode
+            streamed    : the names of the members whose elements are streamed
+            chunk_size  : the number of bytes read at once
+            digest      : a hashlib object updated with the bytes read, or None
+            element_decoder: the json.JSONDecoder of the elements of the streamed
+                members, by default the same as for the other values
+        """
+        self.file = file
+        self.streamed = set(streamed)
+        self.chunk_size = chunk_size
+        self.digest = digest
+        self.decoder = json.JSONDecoder()
+        self.element_decoder = element_decoder or self.decoder
+        self.text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.buffer = ""
+        self.position = 0
+        self.bytes_read = 0
+        self.eof = False
+
+    def read(self, size):
+        """
+        Appends `size` more bytes of the file to the buffer, dropping the text already
+        decoded
+
+        Returns:
+            False if the end of the file was already reached
+        """
+        if self.eof:
+            return False
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        if self.digest is not None:
+            self.digest.update(data)
+        self.eof = not data
+        self.buffer = self.buffer[self.position :] + self.text_decoder.decode(
+            data, final=self.eof
+        )
+        self.position = 0
+        return True
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character, or "" at the end of the file
+        """
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read(self.chunk_size):
+                return ""
+
+    def expect(self, characters):
+        """
+        Consumes the next character, that must be one of `characters`, and returns it
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(
+                "Invalid JSON: expected one of %r near byte %s, found %r"
+                % (characters, self.bytes_read, character)
+            )
+        self.position += 1
+        return character
+
+    def value(self, decoder=None):
+        """
+        Decodes the next JSON value, with `decoder` if given
+        """
+        decoder = decoder or self.decoder
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.position)
+                # a number may have been cut by the end of the buffer
+                if self.eof or (
+                    end < len(self.buffer) and self.buffer[end] not in NUMBER_PARTS
+                ):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError as err:
+                if self.eof:
+                    raise ValueError("Invalid JSON: %s" % err) from err
+            # read ahead geometrically, so that a large value is decoded a few times
+            self.read(size)
+            size *= 2
+
+    def elements(self):
+        """
+        Iterates over the (position, element) pairs of the next array, or the (key,
+        value) pairs of the next object
+        """
+        closing = "]" if self.expect("[{") == "[" else "}"
+        if self.peek() == closing:
+            self.position += 1
+            return
+        position = 0
+        while True:
+            if closing == "}":
+                name = self.value()
+                if not isinstance(name, str):
+                    raise ValueError("Invalid JSON: object keys must be strings")
+                self.expect(":")
+            else:
+                name = position
+            yield name, self.value(self.element_decoder)
+            position += 1
+            if self.expect("," + closing) == closing:
+                return
+
+    def members(self):
+        """
+        Iterates over the (key, value) pairs of the top-level object. The value of the
+        streamed members is an iterator, see `elements`
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.position += 1
+        else:
+            while True:
+                key = self.value()
+                if not isinstance(key, str):
+                    raise ValueError("Invalid JSON: object keys must be strings")
+                self.expect(":")
+                if key in self.streamed and self.peek() in ("[", "{"):
+                    items = self.elements()
+                    yield key, items
+                    for _ in items:  # skips the elements that were not consumed
+                        pass
+                else:
+                    yield key, self.value()
+                if self.expect(",}") == "}":
+                    break
+        if self.peek():
+            raise ValueError("Invalid JSON: extra data after the top-level object")
@@ -0,0 +1,451 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Index files of the SAJE project
+
+An index file is written next to a catalog the first time it is opened, and stores the
+columns, indexes and presorted orders of its `jsondb.Database` so that later launches
+load them instead of building them from the data. It is only used if the catalog still
+has the size, modification time and content hash recorded in it. For a catalog whose
+items are in a JSON Lines data file, the key also covers the data file, and the byte
+offsets of the items in it are stored.
+
+Layout: the MAGIC bytes, the length of the header as a little-endian 64-bit integer,
+the JSON header, then the body, starting at the next multiple of 8 bytes. The header
+describes the stored structures, whose arrays are sections (offset in the body,
+length in bytes) of the body, each aligned on 8 bytes. The body is memory-mapped and
+its arrays used through memoryviews without copy; posting lists are decoded to Bitsets
+on first use
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import MutableMapping
+from pathlib import Path
+
+from ..json_utils import jsoncolumn, jsonindex
+from ..json_utils.bitset import Bitset
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = "0.1.0"
+__maintainer__ = "Quentin Soubeyran"
+__status__ = "beta"
+
+MAGIC = b"SAJE-IDX"
+FORMAT = 1
+ALIGNMENT = 8
+SUFFIX = ".saje-index"
+
+COLUMNS = {
+    cls.__name__: cls
+    for cls in (
+        jsoncolumn.Column,
+        jsoncolumn.IntegerColumn,
+        jsoncolumn.TextColumn,
+        jsoncolumn.DictionaryColumn,
+    )
+}
+INDEXES = {
+    cls.__name__: cls
+    for cls in (
+        jsonindex.PostingIndex,
+        jsonindex.SortedIndex,
+        jsonindex.TrigramIndex,
+    )
+}
+
+
+def index_path(catalog_path):
+    """
+    Returns the path of the index file of a catalog
+    """
+    catalog_path = Path(catalog_path)
+    return catalog_path.with_name(catalog_path.name + SUFFIX)
+
+
+def catalog_key(catalog_path, content):
+    """
+    Returns the key identifying a version of a catalog, stored in its index file
+
+    Args:
+        catalog_path: the path of the catalog file
+        content     : the bytes of the catalog file
+    """
+    return digest_key(catalog_path, len(content), hashlib.sha256(content))
+
+
+def digest_key(catalog_path, size, digest):
+    """
+    Same as catalog_key(), for a catalog whose content was hashed while being read
+
+    Args:
+        catalog_path: the path of the catalog file
+        size        : the number of bytes of the catalog file
+        digest      : the hashlib.sha256 object updated with the bytes of the catalog
+    """
+    return {
+        "size": size,
+        "mtime": os.stat(catalog_path).st_mtime_ns,
+        "sha256": digest.hexdigest(),
+    }
+
+
+def platform():
+    """
+    Returns the description of the machine types the arrays are stored with
+    """
+    return {
+        "byteorder": sys.byteorder,
+        "itemsizes": {typecode: array(typecode).itemsize for typecode in "iqd"},
+    }
+
+
+class Writer:
+    """
+    Collects the sections of the body of an index file
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def add(self, buffer):
+        """
+        Appends the bytes of an object supporting the buffer protocol, such as an
+        array or a bytearray
+
+        Returns:
+            The section of the bytes, an [offset, length] pair
+        """
+        data = memoryview(buffer).cast("B")
+        section = [self.offset, len(data)]
+        padding = -len(data) % ALIGNMENT
+        self.chunks.append(bytes(data) + b"\x00" * padding)
+        self.offset += len(data) + padding
+        return section
+
+    def bitset(self, bitset):
+        """
+        Appends a Bitset
+
+        Returns:
+            Its [offset, length, size] section
+        """
+        data = bitset.bits.to_bytes((bitset.size + 7) // 8, "little")
+        return self.add(data) + [bitset.size]
+
+    def postings(self, postings):
+        """
+        Appends a mapping of posting lists
+
+        Returns:
+            The list of the [key, section] pairs of the mapping
+        """
+        return [[key, self.bitset(bitset)] for key, bitset in postings.items()]
+
+    def write(self, file):
+        for chunk in self.chunks:
+            file.write(chunk)
+
+
+class Reader:
+    """
+    Reads the sections of the memory-mapped body of an index file
+    """
+
+    def __init__(self, buffer, start):
+        """
+        Create a new Reader object
+
+        Args:
+            buffer  : the mapped index file
+            start   : the position of the body in the file
+        """
+        self.buffer = memoryview(buffer)
+        self.start = start
+
+    def view(self, section, typecode):
+        """
+        Returns a memoryview of a section, as an array of `typecode` items
+        """
+        offset, length = section[:2]
+        start = self.start + offset
+        if start + length > len(self.buffer):
+            raise ValueError("Truncated index file")
+        return self.buffer[start : start + length].cast(typecode)
+
+    def bitset(self, section):
+        """
+        Returns the Bitset stored in a section
+        """
+        return Bitset(int.from_bytes(self.view(section, "B"), "little"), section[2])
+
+    def postings(self, pairs):
+        """
+        Returns the mapping of posting lists stored by Writer.postings, whose Bitsets
+        are decoded on first use
+        """
+        return LazyPostings(self, pairs)
+
+
+class LazyPostings(MutableMapping):
+    """
+    Mapping of posting lists loaded from an index file, decoding each Bitset the
+    first time it is read
+    """
+
+    def __init__(self, reader, pairs):
+        self.reader = reader
+        self.sections = {}
+        for key, section in pairs:
+            self.sections[key] = section
+        self.decoded = {}
+
+    def __getitem__(self, key):
+        bitset = self.decoded.get(key)
+        if bitset is None:
+            bitset = self.decoded[key] = self.reader.bitset(self.sections.pop(key))
+        return bitset
+
+    def get(self, key, default=None):
+        if key in self.decoded or key in self.sections:
+            return self[key]
+        return default
+
+    def __contains__(self, key):
+        return key in self.decoded or key in self.sections
+
+    def __setitem__(self, key, bitset):
+        self.sections.pop(key, None)
+        self.decoded[key] = bitset
+
+    def __delitem__(self, key):
+        if key in self.decoded:
+            del self.decoded[key]
+        else:
+            del self.sections[key]
+
+    def __iter__(self):
+        yield from self.decoded
+        yield from list(self.sections)
+
+    def __len__(self):
+        return len(self.decoded) + len(self.sections)
+
+
+class Stored:
+    """
+    The structures of a database loaded from an index file, that `jsondb.Database`
+    uses instead of building them
+    """
+
+    def __init__(self, reader, header):
+        self.reader = reader
+        self.header = header
+        self.size = header["size"]
+        self.columns = {}
+        self.indexes = {}
+
+    def column(self, field_name):
+        """
+        Returns the stored column of a field, or None if it is not stored. Fields
+        that shared a column get the same object
+        """
+        entry = self.header["field_columns"].get(field_name)
+        if entry is None or self.header["columns"][entry] is None:
+            return None
+        if entry not in self.columns:
+            description = self.header["columns"][entry]
+            self.columns[entry] = COLUMNS[description["class"]].load(
+                description, self.reader
+            )
+        return self.columns[entry]
+
+    def has_index(self, field_name):
+        """
+        Returns whether the index of a field is stored, possibly as the absence of index
+        """
+        if field_name not in self.header["field_indexes"]:
+            return False
+        entry = self.header["field_indexes"][field_name]
+        return entry is None or self.header["indexes"][entry] is not None
+
+    def index(self, field_name, column):
+        """
+        Returns the stored index of a field, None if the field has no index
+
+        Args:
+            field_name  : the name of the field, for which has_index() is True
+            column      : the column of the field
+        """
+        entry = self.header["field_indexes"][field_name]
+        if entry is None:
+            return None
+        if entry not in self.indexes:
+            description = self.header["indexes"][entry]
+            self.indexes[entry] = INDEXES[description["class"]].load(
+                description, self.reader, column
+            )
+        return self.indexes[entry]
+
+    def offsets(self):
+        """
+        Returns the stored byte offsets of the items in their JSON Lines data file, or
+        None if they are not stored
+        """
+        section = self.header.get("offsets")
+        if section is None:
+            return None
+        return self.reader.view(section, "q")
+
+    def sort_order(self, spec):
+        """
+        Returns the stored order of the item ids for a canonical sort key, or None
+        """
+        spec = [[field_name, order.value] for field_name, order in spec]
+        for stored_spec, section in self.header["sort_orders"]:
+            if stored_spec == spec:
+                return self.reader.view(section, "q")
+        return None
+
+
+def describe(structures, objects, writer):
+    """
+    Stores the distinct objects of a mapping from field names to columns or indexes
+
+    Args:
+        structures  : the list of the descriptions of the stored objects, extended
+            in-place
+        objects     : mapping from field names to columns or indexes
+
+    Returns:
+        The mapping from field names to the position of their object in `structures`,
+        or None for fields without index
+    """
+    positions, entries = {}, {}
+    for field_name, structure in objects.items():
+        if structure is None:
+            entries[field_name] = None
+            continue
+        if id(structure) not in positions:
+            description = structure.dump(writer)
+            if description is not None:
+                description["class"] = type(structure).__name__
+            positions[id(structure)] = len(structures)
+            structures.append(description)
+        entries[field_name] = positions[id(structure)]
+    return entries
+
+
+def dump(database, path, key, offsets=None):
+    """
+    Writes the index file of a database
+
+    Args:
+        database: the jsondb.Database to store
+        path    : the path of the index file, replaced atomically
+        key     : the key of the catalog, as returned by catalog_key()
+        offsets : the byte offsets of the items in their JSON Lines data file, if any
+    """
+    writer = Writer()
+    header = {
+        "format": FORMAT,
+        "platform": platform(),
+        "key": key,
+        "size": len(database.data),
+        "columns": [],
+        "indexes": [],
+    }
+    header["field_columns"] = describe(header["columns"], database.columns, writer)
+    header["field_indexes"] = describe(header["indexes"], database.indexes, writer)
+    header["sort_orders"] = [
+        [
+            [[field_name, order.value] for field_name, order in spec],
+            writer.add(array("q", database.sort_order(spec))),
+        ]
+        for spec in database.sort_keys
+    ]
+    if offsets is not None:
+        header["offsets"] = writer.add(array("q", offsets))
+    encoded = json.dumps(header).encode("utf-8")
+    start = len(MAGIC) + 8 + len(encoded)
+    path = Path(path)
+    temporary = path.with_name(path.name + ".tmp")
+    with temporary.open("wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<Q", len(encoded)))
+        file.write(encoded)
+        file.write(b"\x00" * (-start % ALIGNMENT))
+        writer.write(file)
+    os.replace(temporary, path)
+
+
+def read_header(file, path):
+    """
+    Reads the header of an opened index file
+
+    Returns:
+        The decoded header and the position of the body in the file
+
+    Raises:
+        ValueError if the file is not an index file or is corrupted
+    """
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("%s is not an index file" % path)
+    try:
+        (length,) = struct.unpack("<Q", file.read(8))
+        header = json.loads(file.read(length))
+    except (struct.error, UnicodeDecodeError, json.JSONDecodeError) as err:
+        raise ValueError("Corrupted index file %s: %s" % (path, err)) from err
+    start = len(MAGIC) + 8 + length
+    return header, start + (-start % ALIGNMENT)
+
+
+def stored_key(path):
+    """
+    Returns the key of the catalog an index file was written for, without loading it,
+    or None if there is no readable index file
+    """
+    try:
+        with open(path, "rb") as file:
+            header, _ = read_header(file, path)
+    except (OSError, ValueError):
+        return None
+    return header.get("key")
+
+
+def load(path, key):
+    """
+    Loads an index file
+
+    Args:
+        path: the path of the index file
+        key : the key of the catalog, as returned by catalog_key()
+
+    Returns:
+        A Stored object, or None if there is no index file or if it was written for
+        another version of the catalog or on another platform
+
+    Raises:
+        ValueError if the index file is corrupted
+    """
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with file:
+        header, start = read_header(file, path)
+        if (
+            header.get("format") != FORMAT
+            or header.get("platform") != platform()
+            or header.get("key") != key
+        ):
+            return None
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    return Stored(Reader(buffer, start), header)
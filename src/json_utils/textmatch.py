@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pattern and approximate text matching for the SAJE project
+
+Provides cached regular expression compilation, the extraction of the literal
+substrings a regular expression requires, and approximate substring matching with a
+bounded edit distance. The required substrings let an n-gram index pre-filter the
+items before the exact, slower test
+"""
+import functools
+import re
+
+try:
+    from re import _parser as sre_parse  # python >= 3.11
+except ImportError:
+    import sre_parse
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = "0.1.0"
+__maintainer__ = "Quentin Soubeyran"
+__status__ = "beta"
+
+# ASCII characters that re.IGNORECASE matches with non-ASCII characters whose
+# str.lower() differs, such as "s" and the long s "ſ"
+_UNSAFE_FOLD = frozenset("iIsS")
+
+
+@functools.lru_cache(maxsize=256)
+def compile_regex(pattern, case=False):
+    """
+    Returns the compiled regular expression, ignoring case if not `case`. Results are
+    cached so that repeating a search does not compile it again
+
+    Raises:
+        ValueError if the pattern is invalid
+    """
+    try:
+        return re.compile(pattern, 0 if case else re.IGNORECASE)
+    except re.error as err:
+        raise ValueError("Invalid regular expression %r: %s" % (pattern, err)) from err
+
+
+@functools.lru_cache(maxsize=256)
+def required_literals(pattern, case=False):
+    """
+    Returns a tuple of substrings that any string matched by the regular expression
+    contains, case-folded with str.lower() if not `case`. Only the literals at the top
+    level of the expression are extracted, so the tuple may be empty
+    """
+    try:
+        parsed = sre_parse.parse(pattern, 0 if case else re.IGNORECASE)
+    except re.error:
+        return ()
+    if case and parsed.state.flags & re.IGNORECASE:
+        # an inline (?i) flag: literals must be searched case-insensitively
+        return required_literals(pattern, case=False)
+    literals, run = [], []
+    for opcode, argument in parsed:
+        char = chr(argument) if opcode is sre_parse.LITERAL else None
+        if char is not None and (case or (char.isascii() and char not in _UNSAFE_FOLD)):
+            run.append(char)
+            continue
+        if run:
+            literals.append("".join(run))
+            run = []
+    if run:
+        literals.append("".join(run))
+    if not case:
+        literals = [literal.lower() for literal in literals]
+    return tuple(literals)
+
+
+def split_pieces(pattern, distance):
+    """
+    Splits `pattern` in `distance` + 1 pieces of nearly equal length. A string that
+    matches the pattern with at most `distance` edits contains one of the pieces
+    exactly, since each edit alters at most one piece
+
+    Returns:
+        The list of (offset in pattern, piece) pairs
+    """
+    parts = distance + 1
+    length, remainder = divmod(len(pattern), parts)
+    pieces, start = [], 0
+    for position in range(parts):
+        stop = start + length + (position < remainder)
+        pieces.append((start, pattern[start:stop]))
+        start = stop
+    return pieces
+
+
+class FuzzyMatcher:
+    """
+    Approximate substring matcher: tests whether a text contains a substring that is
+    within `distance` edits (insertions, deletions or substitutions) of the pattern
+
+    Uses the bit-vector algorithm of Myers, which tracks the edit distance of the best
+    match ending at each position of the text with python integers of len(pattern)
+    bits, whatever the allowed distance
+    """
+
+    def __init__(self, pattern, distance=1):
+        """
+        Create a new FuzzyMatcher object
+
+        Args:
+            pattern : the string to search for
+            distance: the maximum number of edits
+        """
+        if distance < 0:
+            raise ValueError("Edit distance must be positive, got %s" % distance)
+        self.pattern = pattern
+        self.distance = distance
+        self.pieces = [
+            (offset, piece)
+            for offset, piece in split_pieces(pattern, distance)
+            if piece
+        ]
+        self.masks = {}
+        for position, char in enumerate(pattern):
+            self.masks[char] = self.masks.get(char, 0) | 1 << position
+        self.accept = 1 << (len(pattern) - 1) if pattern else 0
+
+    def __repr__(self):
+        return "%s(%r, distance=%s)" % (
+            type(self).__name__,
+            self.pattern,
+            self.distance,
+        )
+
+    def __call__(self, text):
+        """
+        Returns whether `text` contains an approximate match of the pattern
+        """
+        distance, size = self.distance, len(self.pattern)
+        if size <= distance:
+            return True
+        # a match keeps one of the pieces unchanged, and spans at most `distance`
+        # characters more than the pattern around it: only scan around the pieces
+        for offset, piece in self.pieces:
+            position = text.find(piece)
+            while position != -1:
+                start = max(0, position - offset - distance)
+                if self.scan(text[start : position - offset + size + distance]):
+                    return True
+                position = text.find(piece, position + 1)
+        return False
+
+    def scan(self, text):
+        """
+        Returns whether `text` contains an approximate match of the pattern, testing
+        every position
+        """
+        size, distance, masks = len(self.pattern), self.distance, self.masks
+        if size <= distance:
+            return True
+        full, last = (1 << size) - 1, self.accept
+        # vertical deltas of the column of edit distances, as bitvectors: bit j of
+        # positive (resp. negative) is set if row j+1 is one more (resp. less) than row j
+        positive, negative, score = full, 0, size
+        for char in text:
+            equal = masks.get(char, 0)
+            vertical = equal | negative
+            horizontal = (((equal & positive) + positive) ^ positive) | equal
+            horizontal_positive = negative | (~(horizontal | positive) & full)
+            horizontal_negative = positive & horizontal
+            if horizontal_positive & last:
+                score += 1
+            elif horizontal_negative & last:
+                score -= 1
+            horizontal_positive = (horizontal_positive << 1) & full
+            horizontal_negative = (horizontal_negative << 1) & full
+            positive = horizontal_negative | (~(vertical | horizontal_positive) & full)
+            negative = horizontal_positive & vertical
+            if score <= distance:
+                return True
+        return False
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Opt-in timing instrumentation for the SAJE project
+
+Modules register the functions to measure with `instrument`. Nothing is measured by
+default: `enable` replaces the registered functions by wrappers recording the number
+and duration of their calls, and `disable` puts the original functions back, so that
+disabled timing costs nothing. The measures are returned by `stats` and `report`
+"""
+import functools
+import math
+import time
+from collections import deque
+
+__author__ = "Quentin Soubeyran"
+__copyright__ = "Copyright 2020, SAJE project"
+__license__ = "MIT"
+__version__ = "0.1.0"
+__maintainer__ = "Quentin Soubeyran"
+__status__ = "beta"
+
+SAMPLES = 1024
+
+_instrumented = []
+_enabled = False
+_stats = {}
+
+
+class Stat:
+    """
+    The measures of the calls recorded under one name. Percentiles are computed over
+    the last SAMPLES calls
+    """
+
+    __slots__ = ("count", "total", "last", "durations")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.durations = deque(maxlen=SAMPLES)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        self.durations.append(duration)
+
+    def percentile(self, percent):
+        """
+        Returns the duration under which `percent` % of the sampled calls took
+        """
+        durations = sorted(self.durations)
+        return durations[max(math.ceil(len(durations) * percent / 100) - 1, 0)]
+
+    def to_json(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count,
+            "p95": self.percentile(95),
+            "last": self.last,
+        }
+
+
+def record(name, duration):
+    """
+    Records the duration of a call, in seconds
+    """
+    stat = _stats.get(name)
+    if stat is None:
+        stat = _stats[name] = Stat()
+    stat.add(duration)
+
+
+def timed(function, naming):
+    """
+    Returns a wrapper of `function` recording its calls, see `instrument`
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            record(
+                naming if isinstance(naming, str) else naming(*args, **kwargs), duration
+            )
+
+    wrapper.timed = function
+    return wrapper
+
+
+def instrument(owner, attribute, naming=None):
+    """
+    Registers a function to measure when timing is enabled
+
+    Args:
+        owner       : the class or module defining the function
+        attribute   : the name of the function in `owner`
+        naming      : the name the calls are recorded under, or a function of the
+            arguments of a call returning it. By default "<owner>.<attribute>"
+    """
+    if naming is None:
+        naming = "%s.%s" % (owner.__name__, attribute)
+    _instrumented.append((owner, attribute, naming))
+    if _enabled:
+        setattr(owner, attribute, timed(vars(owner)[attribute], naming))
+
+
+def enabled():
+    """
+    Returns whether timing is enabled
+    """
+    return _enabled
+
+
+def enable():
+    """
+    Starts measuring the registered functions
+    """
+    global _enabled
+    if not _enabled:
+        _enabled = True
+        for owner, attribute, naming in _instrumented:
+            setattr(owner, attribute, timed(vars(owner)[attribute], naming))
+
+
+def disable():
+    """
+    Stops measuring the registered functions. The measures are kept
+    """
+    global _enabled
+    if _enabled:
+        _enabled = False
+        for owner, attribute, _ in _instrumented:
+            setattr(owner, attribute, vars(owner)[attribute].timed)
+
+
+def reset():
+    """
+    Discards the measures
+    """
+    _stats.clear()
+
+
+def stats():
+    """
+    Returns the measures as a mapping from names to dicts of the number of calls, and
+    the total, mean, 95th percentile and last durations in seconds
+    """
+    return {name: stat.to_json() for name, stat in _stats.items()}
+
+
+def last(name):
+    """
+    Returns the duration of the last call recorded under `name`, or None
+    """
+    stat = _stats.get(name)
+    return None if stat is None else stat.last
+
+
+def report():
+    """
+    Returns the measures as a text table, the longest total durations first
+    """
+    lines = [
+        "%-48s %10s %12s %12s %12s" % ("name", "calls", "total ms", "mean ms", "p95 ms")
+    ]
+    for name, stat in sorted(_stats.items(), key=lambda item: -item[1].total):
+        lines.append(
+            "%-48s %10d %12.3f %12.3f %12.3f"
+            % (
+                name,
+                stat.count,
+                stat.total * 1000,
+                stat.total * 1000 / stat.count,
+                stat.percentile(95) * 1000,
+            )
+        )
+    return "\n".join(lines)
@@ -3,13 +3,25 @@
 """
 Module for file parsing utilities of the SAJE project
 """
+import gc
+import glob
+import hashlib
+import itertools
 import logging
+import os
+import pickle
+import tracemalloc
 from abc import ABC, abstractmethod
 from collections import namedtuple
+from collections.abc import Iterator
+from concurrent import futures
+from contextlib import contextmanager
+from pathlib import Path
 
 from . import version
 from .json_utils import jsondb
 from .json_utils import jsonplus as json
+from .json_utils import jsoncompact, jsonlines, jsonstream, sidecar, timing
 from .utils import NocaseList, err_str
 
 __author__ = "Quentin Soubeyran"
@@ -24,20 +36,87 @@ LOGGER = logging.getLogger("SAJE.parsing")
 CACHE_KEY = "__CACHED_DISPLAY_STRING__"
 MISSING = object()
 MAYBE = object()
+BATCH_SIZE = 5000
+SHARD_WAIT = 0.05
+# the JSON types of the values decoded by the json module
+JSON_TYPES = {
+    dict: json.Object,
+    list: json.Array,
+    str: json.Value,
+    int: json.Value,
+    bool: json.Value,
+}
+SCALARS = (str, int, bool)
 
 ParsedFile = namedtuple(
     "ParsedFile",
-    ["name", "display_string", "gui_geometry", "gui_datas", "database", "modes"],
+    [
+        "name",
+        "display_string",
+        "gui_geometry",
+        "gui_datas",
+        "database",
+        "modes",
+        "loader",
+    ],
+    defaults=(None,),
 )
 
 
+def json_type(json_obj):
+    """
+    Same as json.Type(json_obj), faster for the values decoded by the json module
+    """
+    type_ = JSON_TYPES.get(type(json_obj))
+    if type_ is None:
+        return json.Type(json_obj)
+    return type_
+
+
+def check_flatten(json_obj):
+    """
+    Raises the error json.flatten raises on a JSON value, if any, without flattening it
+    """
+    type_ = type(json_obj)
+    if type_ not in JSON_TYPES:
+        type_ = json.Type.of(json_obj)
+    if type_ is dict or type_ is json.Object:
+        json_obj = json_obj.values()
+    elif type_ is not list and type_ is not json.Array:
+        return
+    for json_value in json_obj:
+        if type(json_value) not in SCALARS:
+            check_flatten(json_value)
+
+
+def format_values(json_obj):
+    """
+    Returns the values of a JSON object that a format string can refer to in the
+    flattened object, which are the scalar values at its top level. Raises the same
+    errors as json.flatten
+    """
+    values = {}
+    for key, json_value in json_obj.items():
+        if type(json_value) not in SCALARS:
+            check_flatten(json_value)
+            if json_type(json_value) is not json.Value:
+                continue
+        values[str(key)] = json_value
+    return values
+
+
 class DisplayString(ABC):
     """
     Class for handling display string format
+
+    `format` interprets the tree of display strings for each JSON object. `render`
+    gives the same result with the tree compiled once into nested closures, see
+    `compile`
     """
 
     CLASSES = []
     KEYWORDS = None
+    renderers = None
 
     def __init_subclass__(cls, **kwargs):
         """
@@ -83,11 +162,17 @@ class DisplayString(ABC):
         try:
             return self._format(json_obj)
         except Exception as err:
-            return (
-                f"&lt;&lt;ERROR: {err_str(err)}\n"
-                f"JSON VALUE:\n{json.dumps(json_obj, indent=4)}\n"
-                f"DISPLAY STRING DEF:\n{getattr(self, 'definition', '--Unknown--')}\n&gt;&gt;"
-            )
+            return self.error(err, json_obj)
+
+    def error(self, err, json_obj):
+        """
+        Returns the display of an error raised while formatting a json object
+        """
+        return (
+            f"&lt;&lt;ERROR: {err_str(err)}\n"
+            f"JSON VALUE:\n{json.dumps(json_obj, indent=4)}\n"
+            f"DISPLAY STRING DEF:\n{getattr(self, 'definition', '--Unknown--')}\n&gt;&gt;"
+        )
 
     @abstractmethod
     def _format(self, json_obj):
@@ -95,11 +180,59 @@ class DisplayString(ABC):
         the actual format implementation
         """
 
+    def render(self, json_obj):
+        """
+        Same as `format`, with the compiled display string. Timing is checked at each
+        call: while it is enabled, a tree compiled with timing wrappers records the
+        calls of each node, and otherwise a tree compiled without them is used
+        """
+        enabled = timing.enabled()
+        if self.renderers is None:
+            self.renderers = {}
+        renderer = self.renderers.get(enabled)
+        if renderer is None:
+            renderer = self.renderers[enabled] = self.compile(timed=enabled)
+        return renderer(json_obj)
+
+    def compile(self, timed=False):
+        """
+        Compiles the display string tree into a function of json objects equivalent
+        to `format`, errors included. The keys and sub-trees are resolved once, and
+        each node is a closure calling the closures of its children
+
+        Args:
+            timed: whether the calls of each node are recorded by the timing module,
+                under the same names as `format`
+        """
+        body = self._compile(timed)
+        error = self.error
+
+        def renderer(json_obj):
+            try:
+                return body(json_obj)
+            except Exception as err:
+                return error(err, json_obj)
+
+        if timed:
+            renderer = timing.timed(renderer, "display_string.%s" % type(self).__name__)
+        return renderer
+
+    def _compile(self, timed):
+        """
+        Returns the function implementing `_format`, for `compile`. Subclasses should
+        override this, the default is `_format` itself
+        """
+        return self._format
+
 
 class DefaultDS(DisplayString):
     def _format(self, json_obj):
         return json.dumps(json_obj, indent=2)
 
+    def _compile(self, timed):
+        dumps = json.dumps
+        return lambda json_obj: dumps(json_obj, indent=2)
+
 
 class StringDS(DisplayString):
     """
@@ -123,6 +256,20 @@ class StringDS(DisplayString):
         else:
             return self.string.format(value=json_obj)
 
+    def _compile(self, timed):
+        string = self.string
+
+        def body(json_obj):
+            type_ = json_type(json_obj)
+            if type_ is json.Object:
+                return string.format(**format_values(json_obj))
+            elif type_ is json.Array:
+                return string.format(*json_obj)
+            else:
+                return string.format(value=json_obj)
+
+        return body
+
 
 class ArrayDS(DisplayString):
     """
@@ -135,6 +282,10 @@ class ArrayDS(DisplayString):
     def _format(self, json_obj):
         return "".join(ds.format(json_obj) for ds in self.display_strings)
 
+    def _compile(self, timed):
+        renderers = [ds.compile(timed) for ds in self.display_strings]
+        return lambda json_obj: "".join([render(json_obj) for render in renderers])
+
 
 class HasKeyDS(DisplayString):
     """
@@ -145,18 +296,33 @@ class HasKeyDS(DisplayString):
 
     def __init__(self, json_obj):
         self.key = json_obj["has_key"]
+        self.path = json.Path(self.key)
         self.yes = self.from_json(json_obj["yes"])
         self.no = None
         if "no" in json_obj:
             self.no = self.from_json(json_obj["no"])
 
     def _format(self, json_obj):
-        if json.has(json_obj, self.key):
+        if self.path.has(json_obj):
             return self.yes.format(json_obj)
         elif self.no is not None:
             return self.no.format(json_obj)
         return ""
 
+    def _compile(self, timed):
+        resolve, missing = self.path.resolve, json.MISSING
+        yes = self.yes.compile(timed)
+        no = None if self.no is None else self.no.compile(timed)
+
+        def body(json_obj):
+            if resolve(json_obj) is not missing:
+                return yes(json_obj)
+            elif no is not None:
+                return no(json_obj)
+            return ""
+
+        return body
+
 
 class JsonTypeDS(DisplayString):
     """
@@ -167,14 +333,16 @@ class JsonTypeDS(DisplayString):
 
     def __init__(self, json_obj):
         self.key = json_obj["if_json_type"]
+        self.path = json.Path(self.key)
         self.table = {
             key: self.from_json(json_obj[key])
             for key in {"json_value", "json_array", "json_object"}
         }
 
     def _format(self, json_obj):
-        if json.has(json_obj, self.key):
-            t = json.Type(json.get(json_obj, self.key))
+        value = self.path.resolve(json_obj)
+        if value is not json.MISSING:
+            t = json.Type(value)
             if t is json.Value:
                 return self.table["json_value"].format(json_obj)
             elif t is json.Array:
@@ -183,6 +351,22 @@ class JsonTypeDS(DisplayString):
                 return self.table["json_object"].format(json_obj)
         raise KeyError(self.key)
 
+    def _compile(self, timed):
+        resolve, missing, key = self.path.resolve, json.MISSING, self.key
+        renderers = {
+            json.Value: self.table["json_value"].compile(timed),
+            json.Array: self.table["json_array"].compile(timed),
+            json.Object: self.table["json_object"].compile(timed),
+        }
+
+        def body(json_obj):
+            value = resolve(json_obj)
+            if value is not missing:
+                return renderers[json_type(value)](json_obj)
+            raise KeyError(key)
+
+        return body
+
 
 class TableDS(DisplayString):
     """
@@ -194,6 +378,7 @@ class TableDS(DisplayString):
 
     def __init__(self, json_obj):
         self.key = json_obj["key"]
+        self.path = json.Path(self.key)
         self.table = {
             key: self.from_json(display_string)
             for key, display_string in json_obj["table"].items()
@@ -204,8 +389,8 @@ class TableDS(DisplayString):
             )
 
     def _format(self, json_obj):
-        if json.has(json_obj, self.key):
-            value = json.get(json_obj, self.key)
+        value = self.path.resolve(json_obj)
+        if value is not json.MISSING:
             try:
                 if value in self.table:
                     return self.table[value].format(json_obj)
@@ -217,6 +402,30 @@ class TableDS(DisplayString):
                 )
         return self.table[""].format(json_obj)
 
+    def _compile(self, timed):
+        resolve, missing = self.path.resolve, json.MISSING
+        table = {
+            key: display_string.compile(timed)
+            for key, display_string in self.table.items()
+        }
+        default = table[""]
+
+        def body(json_obj):
+            value = resolve(json_obj)
+            if value is not missing:
+                try:
+                    if value in table:
+                        return table[value](json_obj)
+                except Exception as err:
+                    LOGGER.warn(
+                        f"Encountered {err_str(err)} in Table Display String\n"
+                        f"JSON OBJECT:\n{json.dumps(json_obj, indent=4)}\n"
+                        f"DISPLAY STRING DEF:\n{getattr(self, 'definition', '--unknonwn--')}"
+                    )
+            return default(json_obj)
+
+        return body
+
 
 class ForallDS(DisplayString):
     """
@@ -227,6 +436,7 @@ class ForallDS(DisplayString):
 
     def __init__(self, json_obj):
         self.key = json_obj["forall"]
+        self.path = json.Path(self.key)
         self.display_string = self.from_json(json_obj["display_string"])
         self.sep = json_obj.get("separator", "")
 
@@ -235,26 +445,67 @@ class ForallDS(DisplayString):
         if t is json.Array:
             return self.sep.join(self.display_string.format(e) for e in json_obj)
         elif t is json.Object:
-            if json.has(json_obj, self.key):
+            sub_jsons = self.path.resolve(json_obj)
+            if sub_jsons is not json.MISSING:
                 return self.sep.join(
-                    self.display_string.format(sub_json)
-                    for sub_json in json.get(json_obj, self.key)
+                    self.display_string.format(sub_json) for sub_json in sub_jsons
                 )
             return ""
         else:
             raise ValueError("ERROR: cannot use forall display string on value")
 
+    def _compile(self, timed):
+        resolve, missing, sep = self.path.resolve, json.MISSING, self.sep
+        render = self.display_string.compile(timed)
+
+        def body(json_obj):
+            type_ = json_type(json_obj)
+            if type_ is json.Array:
+                return sep.join([render(json_value) for json_value in json_obj])
+            elif type_ is json.Object:
+                sub_jsons = resolve(json_obj)
+                if sub_jsons is not missing:
+                    return sep.join([render(sub_json) for sub_json in sub_jsons])
+                return ""
+            else:
+                raise ValueError("ERROR: cannot use forall display string on value")
+
+        return body
+
+
+timing.instrument(
+    DisplayString,
+    "format",
+    lambda display_string, json_obj: "display_string.%s"
+    % type(display_string).__name__,
+)
+
 
 def get_display(display_string, json_obj):
     if CACHE_KEY not in json_obj:
-        json_obj[CACHE_KEY] = display_string.format(json_obj)
+        json_obj[CACHE_KEY] = display_string.render(json_obj)
     return json_obj[CACHE_KEY]
 
 
-def parse_file(json_file, filename):
+def forget_display(item_id, old_obj, new_obj):
     """
-    Parses a JSON file that was just loaded, and return a ParsedFile object, ready for
-    use to create a GUI and search the data
+    Database observer discarding the cached display strings of a modified item, so that
+    an object modified in place is displayed again
+    """
+    for json_obj in (old_obj, new_obj):
+        if json_obj is not None:
+            json_obj.pop(CACHE_KEY, None)
+
+
+def parse_headers(json_file, filename):
+    """
+    Parses the members of a JSON file other than its data, and returns a ParsedFile
+    object whose database has no item yet. The items are then given to the
+    `load` method of the database, or added with a jsondb.DatabaseBuilder
+
+    Args:
+        json_file   : the members of the JSON file, `data` excepted
+        filename    : the name of the file, used if it doesn't define one
     """
     json_version = json_file.get("version", None)
     if json_version is None:
@@ -271,18 +522,584 @@ def parse_file(json_file, filename):
     )
     fields = {name: gui_data.field_spec for name, gui_data in field_dict.items()}
     modes = set.union(*[gui_data.modes or set() for gui_data in field_dict.values()])
+    json_db = {
+        "fields": fields,
+        "data": [],
+        "sort_keys": json_file.get("sort_keys", []),
+    }
+    database = jsondb.Database.from_json(json_db)
+    database.observers.append(forget_display)
     return ParsedFile(
         name=json_file.get("name", filename),
         display_string=DisplayString.from_json(json_file.get("display_string")),
         gui_geometry=field_geometry,
         gui_datas=field_dict,
-        database=jsondb.Database.from_json(
-            {"fields": fields, "data": json_file["data"]}
-        ),
+        database=database,
         modes=modes,
     )
 
 
+def load_stored(database, data, index_file, catalog_key):
+    """
+    Loads the data into the database with the structures stored in its index file
+
+    Args:
+        data: the items, or a function returning them from the sidecar.Stored object,
+            or None if they cannot be loaded from it
+
+    Returns:
+        Whether the index file could be used
+    """
+    try:
+        stored = sidecar.load(index_file, catalog_key)
+        if stored is not None and callable(data):
+            data = data(stored)
+        if stored is not None and data is not None:
+            database.load(data, stored=stored)
+            return True
+    except (OSError, ValueError, KeyError) as err:
+        LOGGER.warning("Ignoring index file %s due to:\n%s", index_file, err_str(err))
+    return False
+
+
+def dump_stored(database, index_file, catalog_key, offsets=None):
+    """
+    Writes the index file of a database, logging the failures
+    """
+    try:
+        sidecar.dump(database, index_file, catalog_key, offsets=offsets)
+    except OSError as err:
+        LOGGER.warning(
+            "Couldn't write index file %s due to:\n%s", index_file, err_str(err)
+        )
+
+
+def parse_file(json_file, filename, index_file=None, catalog_key=None):
+    """
+    Parses a JSON file that was just loaded, and return a ParsedFile object, ready for
+    use to create a GUI and search the data
+
+    Args:
+        json_file   : the loaded JSON file
+        filename    : the name of the file, used if it doesn't define one
+        index_file (optional): the path of the index file of the JSON file. The
+            search structures are loaded from it if it matches `catalog_key`, else
+            they are built and written to it
+        catalog_key (optional): the key of the JSON file, as returned by
+            sidecar.catalog_key()
+    """
+    if "data" not in json_file and "data_file" in json_file:
+        raise ValueError("Catalogs with a `data_file` are opened with CatalogLoader")
+    parsed_file = parse_headers(json_file, filename)
+    database = parsed_file.database
+    data = jsondb.Database.valid_items(json_file["data"])
+    if index_file is None:
+        database.load(data)
+    elif not load_stored(database, data, index_file, catalog_key):
+        database.load(data)
+        dump_stored(database, index_file, catalog_key)
+    return parsed_file
+
+
+@contextmanager
+def gc_paused():
+    """
+    Disables the garbage collector in a block creating many objects, that would
+    trigger full collections finding no garbage
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def extract_shard(path, fields, build=True):
+    """
+    Decodes a data shard and builds the columns and indexes of its items. Run in the
+    worker processes of a CatalogLoader
+
+    Args:
+        path    : the path of the shard, a JSON file holding an array or object of
+            items like the `data` member of a catalog
+        fields  : the JSON representation of the fields of the catalog
+        build   : whether to build the columns and indexes, or only decode the items
+
+    Returns:
+        The pickled tuple of the list of the valid items, the `columns` and `indexes`
+        of the jsondb.DatabaseBuilder that extracted them or None, and the key of the
+        shard for the index file. The result is pickled here so that the loader
+        unpickles it with the garbage collector paused, see `gc_paused`
+    """
+    with open(path, "rb") as file:
+        content = file.read()
+    shard_key = sidecar.digest_key(path, len(content), hashlib.sha256(content))
+    items = jsondb.Database.valid_items(json.loads(content))
+    if not build:
+        result = items, None, None, shard_key
+    else:
+        database = jsondb.Database.from_json({"fields": fields, "data": []})
+        builder = jsondb.DatabaseBuilder(database)
+        with gc_paused():
+            builder.extend(items)
+        result = items, builder.columns, builder.indexes, shard_key
+    return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+
+
+class CatalogLoader:
+    """
+    Loads a catalog file incrementally, so that its tab can be shown before all the
+    data is read
+
+    `start` reads the members of the file preceding its `data` member and returns the
+    ParsedFile, whose database is empty. Each call to `step` then reads a batch of
+    items and adds them to the columns and indexes under construction, and the last
+    one loads them into the database. Only the items are kept in memory, not the text
+    of the file
+
+    The items are streamed if the `version`, `fields` and `display_string` members
+    precede `data` in the file. Otherwise the whole file is read by `start`
+
+    Instead of `data`, a catalog can have a `data_file` member, the path relative to
+    the catalog of a JSON Lines file holding one item per line. Only the columns and
+    indexes are then built from the items: the data is a jsonlines.JsonLines object,
+    that decodes the items from the file when they are displayed
+
+    A catalog can also split its items into shards, JSON files listed by its
+    `data_shards` member as a glob pattern or a list of them, relative to the
+    catalog. The shards are decoded and their columns extracted in a pool of
+    processes, then merged in order: the items of a shard follow those of the
+    previous shards
+
+    In compact mode, the items share their keys and equal values, see
+    jsoncompact.Compactor. It does not apply to the items of a data file or of shards
+    """
+
+    STREAMED_HEADERS = ("version", "fields", "display_string")
+
+    def __init__(
+        self,
+        path,
+        index_file=None,
+        compact=False,
+        records=False,
+        trace_memory=False,
+        workers=None,
+    ):
+        """
+        Create a new CatalogLoader object
+
+        Args:
+            path        : the path of the catalog file
+            index_file (optional): the path of the index file of the catalog, see
+                parse_file
+            compact     : whether to share the keys and equal values of the items
+            records     : whether to store the objects of the items as
+                jsoncompact.Record instead of dicts, implies `compact`
+            trace_memory: whether to log the memory allocated while loading the data,
+                measured with tracemalloc
+            workers     : the number of processes loading the shards of the catalog,
+                the number of processors by default
+        """
+        self.path = Path(path)
+        self.index_file = index_file
+        self.compactor = None
+        if compact or records:
+            self.compactor = jsoncompact.Compactor(records=records)
+        self.trace_memory = trace_memory
+        self.workers = workers
+        self.digest = hashlib.sha256()
+        self.file = None
+        self.data_path = None
+        self.data_digest = hashlib.sha256()
+        self.data_file = None
+        self.lines = None
+        self.shard_paths = None
+        self.shard_keys = []
+        self.shards = None
+        self.pool = None
+        self.stream = None
+        self.members = None
+        self.items = None
+        self.builder = None
+        self.parsed_file = None
+        self.size = 0
+        self.done = False
+        self.error = None
+
+    def start(self):
+        """
+        Reads the file up to its data and parses it
+
+        Returns:
+            The ParsedFile of the catalog, with its `loader` set to this object
+
+        Raises:
+            OSError if the file cannot be read, ValueError if it is not a valid catalog
+        """
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.file = self.path.open("rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.stream = jsonstream.ObjectStream(
+            self.file,
+            streamed=["data"],
+            digest=self.digest,
+            element_decoder=self.compactor
+            and json.JSONDecoder(object_pairs_hook=self.compactor),
+        )
+        self.members = self.stream.members()
+        headers = {}
+        for key, value in self.members:
+            if key == "data":
+                self.items = value
+                break
+            headers[key] = value
+        if "data_file" in headers:
+            if self.items is not None:
+                raise ValueError(
+                    "File %s has both `data` and `data_file` members" % self.path
+                )
+            return self.start_lines(headers)
+        if "data_shards" in headers:
+            if self.items is not None:
+                raise ValueError(
+                    "File %s has both `data` and `data_shards` members" % self.path
+                )
+            return self.start_shards(headers)
+        if self.items is None:
+            raise ValueError("File %s has no `data` member" % self.path)
+        if not isinstance(self.items, Iterator):
+            raise ValueError(
+                "Invalid json DB: `data` key must have type json array or object"
+            )
+        if self.compactor is not None:
+            self.items = self.unshared(self.items)
+        if not all(key in headers for key in self.STREAMED_HEADERS):
+            # the data must be read before the members it depends on
+            self.items = iter(list(self.items))
+            for key, value in self.members:
+                headers[key] = value
+        parsed_file = parse_headers(headers, self.path.stem)
+        self.parsed_file = parsed_file._replace(loader=self)
+        self.builder = jsondb.DatabaseBuilder(
+            parsed_file.database, build=not self.reusable()
+        )
+        return self.parsed_file
+
+    def start_lines(self, headers):
+        """
+        Parses the catalog of a JSON Lines data file, see `start`
+        """
+        if not isinstance(headers["data_file"], str):
+            raise ValueError("The `data_file` member of %s must be a path" % self.path)
+        self.data_path = self.path.parent / headers["data_file"]
+        self.data_file = self.data_path.open("rb")
+        self.size += os.fstat(self.data_file.fileno()).st_size
+        self.items = jsonlines.scan(self.data_file, self.data_digest)
+        self.lines = jsonlines.JsonLines(self.data_path)
+        parsed_file = parse_headers(headers, self.path.stem)
+        self.parsed_file = parsed_file._replace(loader=self)
+        self.builder = jsondb.DatabaseBuilder(
+            parsed_file.database, build=not self.reusable(), data=self.lines
+        )
+        return self.parsed_file
+
+    def start_shards(self, headers):
+        """
+        Parses the catalog of sharded data, and starts loading the shards, see `start`
+        """
+        patterns = headers["data_shards"]
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        if not isinstance(patterns, list) or not all(
+            isinstance(pattern, str) for pattern in patterns
+        ):
+            raise ValueError(
+                "The `data_shards` member of %s must be a glob pattern or a list of them"
+                % self.path
+            )
+        self.shard_paths = []
+        for pattern in patterns:
+            paths = sorted(glob.glob(str(self.path.parent / pattern)))
+            if not paths:
+                raise ValueError(
+                    "No data shard of %s matches '%s'" % (self.path, pattern)
+                )
+            self.shard_paths.extend(Path(path) for path in paths)
+        self.size += sum(os.stat(path).st_size for path in self.shard_paths)
+        parsed_file = parse_headers(headers, self.path.stem)
+        self.parsed_file = parsed_file._replace(loader=self)
+        database = parsed_file.database
+        self.builder = jsondb.DatabaseBuilder(database, build=not self.reusable())
+        fields = {name: field.to_json() for name, field in database.fields.items()}
+        self.pool = futures.ProcessPoolExecutor(max_workers=self.workers)
+        self.shards = [
+            self.pool.submit(extract_shard, str(path), fields, self.builder.build)
+            for path in self.shard_paths
+        ]
+        return self.parsed_file
+
+    def unshared(self, items):
+        """
+        Iterates over the decoded items, ensuring they are not shared by the compactor
+        """
+        for name, json_obj in items:
+            yield name, self.compactor.item(json_obj)
+
+    def reusable(self):
+        """
+        Returns whether the index file is likely to match the catalog, as it was written
+        for a file of the same size and modification time. Its content hash is only
+        known once the file is read
+        """
+        if self.index_file is None:
+            return False
+        key = sidecar.stored_key(self.index_file)
+        if not self.same_file(key, self.path):
+            return False
+        if self.data_path is not None:
+            return self.same_file(key.get("data"), self.data_path)
+        if self.shard_paths is not None:
+            shard_keys = key.get("shards")
+            return (
+                isinstance(shard_keys, list)
+                and len(shard_keys) == len(self.shard_paths)
+                and all(map(self.same_file, shard_keys, self.shard_paths))
+            )
+        return True
+
+    @staticmethod
+    def same_file(key, path):
+        """
+        Returns whether the key of a file in an index file has the size and
+        modification time of the file at `path`
+        """
+        stat = os.stat(path)
+        return (
+            isinstance(key, dict)
+            and key.get("size") == stat.st_size
+            and key.get("mtime") == stat.st_mtime_ns
+        )
+
+    def progress(self):
+        """
+        Returns the fraction of the file read so far
+        """
+        if self.done or not self.size:
+            return 1.0
+        read = self.stream.bytes_read
+        if self.data_file is not None:
+            read += self.data_file.tell()
+        read += sum(shard_key["size"] for shard_key in self.shard_keys)
+        return min(read / self.size, 1.0)
+
+    def step(self, count=BATCH_SIZE):
+        """
+        Adds up to `count` items to the database being built. For sharded data, adds
+        the items of the next shard if it is loaded within SHARD_WAIT seconds instead
+
+        Returns:
+            True if all the data was loaded, and the database is ready
+
+        Raises:
+            OSError if the file cannot be read, ValueError if it is not valid JSON.
+            The error is kept in the `error` attribute
+        """
+        if self.done:
+            return True
+        try:
+            if self.shards is not None:
+                if self.merge_shard():
+                    self.finish()
+                return self.done
+            batch = list(itertools.islice(self.items, count))
+            if self.lines is None:
+                self.builder.extend(
+                    [
+                        json_obj
+                        for name, json_obj in batch
+                        if jsondb.Database.valid_item(name, json_obj)
+                    ]
+                )
+            elif self.builder.build:
+                self.add_lines(batch)
+            if len(batch) < count:
+                self.finish()
+        except Exception as err:
+            self.error = err
+            self.close()
+            if self.trace_memory:
+                tracemalloc.stop()
+            raise
+        return self.done
+
+    def merge_shard(self):
+        """
+        Adds the items of the next shard to the database being built, if its worker
+        process is done
+
+        Returns:
+            True if all the shards were merged
+        """
+        shard = self.shards[len(self.shard_keys)]
+        futures.wait([shard], timeout=SHARD_WAIT)
+        if not shard.done():
+            return False
+        with gc_paused():
+            items, columns, indexes, shard_key = pickle.loads(shard.result())
+        if columns is None:
+            self.builder.data.extend(items)
+        else:
+            self.builder.merge(items, columns, indexes)
+        self.shard_keys.append(shard_key)
+        return len(self.shard_keys) == len(self.shards)
+
+    def add_lines(self, lines):
+        """
+        Decodes lines of the data file, and adds the items to the database being built
+
+        Args:
+            lines: the list of the (line number, offset, line) of the lines
+        """
+        offsets, json_objs = [], []
+        for number, offset, line in lines:
+            try:
+                json_obj = json.loads(line)
+            except ValueError as err:
+                raise ValueError(
+                    "Invalid JSON on line %s of %s: %s" % (number, self.data_path, err)
+                ) from err
+            if jsondb.Database.valid_item("on line %s" % number, json_obj):
+                offsets.append(offset)
+                json_objs.append(json_obj)
+        start = len(self.lines)
+        self.lines.extend_offsets(offsets)
+        self.builder.extract(json_objs, start)
+
+    def finish(self):
+        """
+        Reads the end of the file, and loads the items into the database. The `name`
+        and `sort_keys` members following `data` replace those of the ParsedFile and
+        its database, the tabs already shown must be updated with `parsed_file`
+        """
+        database = self.parsed_file.database
+        for key, value in self.members:
+            if key in ("data_file", "data_shards"):
+                raise ValueError(
+                    "File %s has both `data` and `%s` members" % (self.path, key)
+                )
+            if key == "name":
+                self.parsed_file = self.parsed_file._replace(name=value)
+            elif key == "sort_keys":
+                database.sort_keys = [
+                    database.sort_spec(sort_key) for sort_key in value
+                ]
+        if self.lines is not None:
+            self.finish_lines()
+        else:
+            self.close()
+            self.finish_data()
+        self.done = True
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            LOGGER.info(
+                "Loaded %s items of %s%s: %.1f MiB in use, peak of %.1f MiB",
+                len(database.data),
+                self.path,
+                "" if self.compactor is None else " in compact mode",
+                current / 2**20,
+                peak / 2**20,
+            )
+        # only the database is kept once loaded
+        self.stream = self.members = self.items = self.builder = None
+        self.compactor = self.shards = None
+
+    def finish_lines(self):
+        """
+        Loads the items of the data file into the database, see `finish`
+        """
+        database = self.parsed_file.database
+        catalog_key = None
+        if self.index_file is not None:
+            catalog_key = sidecar.digest_key(
+                self.path, self.stream.bytes_read, self.digest
+            )
+            catalog_key["data"] = sidecar.digest_key(
+                self.data_path, self.data_file.tell(), self.data_digest
+            )
+            if load_stored(database, self.stored_lines, self.index_file, catalog_key):
+                self.close()
+                return
+        if not self.builder.build:
+            # the index file did not match: the data file must be read again
+            self.lines = jsonlines.JsonLines(self.data_path)
+            self.builder = jsondb.DatabaseBuilder(database, data=self.lines)
+            self.data_file.seek(0)
+            lines = jsonlines.scan(self.data_file)
+            while True:
+                batch = list(itertools.islice(lines, BATCH_SIZE))
+                if not batch:
+                    break
+                self.add_lines(batch)
+        self.close()
+        self.builder.finish()
+        if self.index_file is not None:
+            dump_stored(
+                database, self.index_file, catalog_key, offsets=self.lines.offsets
+            )
+
+    def stored_lines(self, stored):
+        """
+        Returns the items of the data file from the offsets stored in the index file
+        """
+        offsets = stored.offsets()
+        if offsets is None:
+            return None
+        self.lines = jsonlines.JsonLines(self.data_path, offsets=offsets)
+        return self.lines
+
+    def finish_data(self):
+        """
+        Loads the items of the `data` member or of the shards into the database, see
+        `finish`
+        """
+        database = self.parsed_file.database
+        if self.index_file is None:
+            self.builder.finish()
+        else:
+            catalog_key = sidecar.digest_key(
+                self.path, self.stream.bytes_read, self.digest
+            )
+            if self.shards is not None:
+                catalog_key["shards"] = self.shard_keys
+            if not load_stored(
+                database, self.builder.data, self.index_file, catalog_key
+            ):
+                if not self.builder.build:
+                    # the index file did not match: the columns must be extracted
+                    data = self.builder.data
+                    self.builder = jsondb.DatabaseBuilder(database)
+                    self.builder.extend(data)
+                self.builder.finish()
+                dump_stored(database, self.index_file, catalog_key)
+
+    def close(self):
+        """
+        Closes the catalog file and the data file, and stops the worker processes
+        """
+        if self.file is not None:
+            self.file.close()
+        if self.data_file is not None:
+            self.data_file.close()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
 class GuiDataBase:
     """
     Base class for parsing JSON data. Separates the Field JSON specification from the data
@@ -406,7 +1223,7 @@ class OptionGuiData(GuiDataBase):
             key="operator",
             type_=str,
             default="or",
-            is_array=None,
+            is_array=MAYBE,
             valid_values=self.OPS,
         )
         self.field_spec = json_obj
@@ -430,7 +1247,7 @@ class IntegerGuiData(GuiDataBase):
             key="comparison",
             type_=str,
             default="eq",
-            is_array=None,
+            is_array=MAYBE,
             valid_values=self.COMP,
         )
         self.field_spec = json_obj
@@ -450,11 +1267,46 @@ class TextGuiData(GuiDataBase):
             key="operator",
             type_=str,
             default=["Any", "All"],
-            is_array=None,
+            is_array=MAYBE,
             valid_values=self.OPS,
         )
         self.case = self.coerce(
-            json_obj, key="case", type_=bool, default=[False, True], is_array=None
+            json_obj, key="case", type_=bool, default=[False, True], is_array=MAYBE
+        )
+        self.field_spec = json_obj
+
+
+class RegexGuiData(GuiDataBase):
+    """
+    Parses the json and stores the Field object and GUI data for a Regex field
+    """
+
+    TYPE = jsondb.RegexField.TYPE
+    NAME = "regex"
+
+    def __init__(self, json_obj):
+        super().__init__(json_obj)
+        self.case = self.coerce(
+            json_obj, key="case", type_=bool, default=[False, True], is_array=MAYBE
+        )
+        self.field_spec = json_obj
+
+
+class FuzzyGuiData(GuiDataBase):
+    """
+    Parses the json and stores the Field object and GUI data for a Fuzzy field
+    """
+
+    TYPE = jsondb.FuzzyField.TYPE
+    NAME = "fuzzy"
+
+    def __init__(self, json_obj):
+        super().__init__(json_obj)
+        self.distance = self.coerce(
+            json_obj, key="distance", type_=int, default=[1, 2, 0], is_array=MAYBE
+        )
+        self.case = self.coerce(
+            json_obj, key="case", type_=bool, default=[False, True], is_array=MAYBE
         )
         self.field_spec = json_obj
 
@@ -0,0 +1,61 @@
+"""
+Shared helpers of the tests: a synthetic catalog, its searches, and the plain scan
+that the optimized searches of a database must agree with
+"""
+import copy
+
+import pytest
+
+from benchmarks import generator, scenarios
+from src import parsing
+from src.json_utils import jsondb
+
+SPEC = generator.Spec(items=400)
+QUERIES = scenarios.queries(SPEC)
+
+
+def make_catalog(spec=SPEC):
+    return generator.catalog(spec)
+
+
+def make_parsed_file(spec=SPEC):
+    # the fields of a catalog are consumed by the parsing of their GUI data
+    return parsing.parse_file(copy.deepcopy(make_catalog(spec)), "synthetic")
+
+
+def reference(database, criteria, operator="and"):
+    """
+    Returns the items of `database` that fulfill a search, calling the compare()
+    method of the fields on each item as the unoptimized search did
+    """
+    ops = jsondb.Operator(operator)
+    return [
+        json_obj
+        for json_obj in database.data
+        if json_obj is not None
+        and ops.function(
+            database.fields[field_name].compare(json_obj, **kwargs)
+            for field_name, kwargs in criteria.items()
+        )
+    ]
+
+
+def without_indexes(database):
+    """
+    Drops the indexes of a database, so that its searches scan the items
+    """
+    for field_name in database.indexes:
+        database.indexes[field_name] = None
+    database.cache_clear()
+    return database
+
+
+@pytest.fixture
+def database():
+    return make_parsed_file().database
+
+
+@pytest.fixture(params=QUERIES, ids=[name for name, _, _ in QUERIES])
+def query(request):
+    _, criteria, operator = request.param
+    return criteria, operator
@@ -0,0 +1,51 @@
+"""
+Tests of the synthetic catalogs and scenarios of the benchmarks
+"""
+import copy
+
+from benchmarks import generator, scenarios
+from conftest import reference
+from src import parsing
+
+
+def test_catalogs_only_depend_on_their_spec():
+    spec = generator.Spec(items=50, depth=3, seed=4)
+    assert generator.catalog(spec) == generator.catalog(spec)
+    assert generator.catalog(spec) != generator.catalog(spec._replace(seed=5))
+
+
+def test_catalogs_follow_their_spec():
+    spec = generator.Spec(items=60, depth=3, option_cardinality=4, array_fields=1)
+    catalog = generator.catalog(spec)
+    parsed_file = parsing.parse_file(copy.deepcopy(catalog), "synthetic")
+    database = parsed_file.database
+    assert len(database.data) == 60
+    assert sorted(database.fields) == [
+        "Category",
+        "Description",
+        "Description fuzzy",
+        "Description regex",
+        "Id",
+        "Level",
+        "Name",
+        "Tags 0",
+    ]
+    categories = {json_obj["n1"]["n2"]["category"] for json_obj in catalog["data"]}
+    assert categories <= set(generator.option_values(spec))
+    for json_obj in catalog["data"]:
+        assert len(json_obj["description"]) == spec.text_length
+        parsing.get_display(parsed_file.display_string, json_obj)
+
+
+def test_scenarios_count_the_scanned_results():
+    spec = generator.Spec(items=200)
+    results = scenarios.run(spec, repeat=1, page_size=10)
+    database = parsing.parse_file(generator.catalog(spec), "synthetic").database
+    for name, criteria, operator in scenarios.queries(spec):
+        found = reference(database, criteria, operator)
+        assert results["search." + name]["results"] == len(found)
+        assert found, "search %s has no results" % name
+    assert results["get_display"]["items"] == 10
+    for timings in results.values():
+        assert timings["repeat"] == 1
+        assert 0 <= timings["min"] <= timings["median"]
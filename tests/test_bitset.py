@@ -0,0 +1,63 @@
+"""
+Tests of the Bitset result sets against Python sets of ids
+"""
+import random
+
+import pytest
+
+from conftest import reference
+from src.json_utils.bitset import Bitset
+
+SIZES = [0, 1, 7, 8, 9, 64, 1000]
+
+
+def random_ids(rng, size):
+    return {item_id for item_id in range(size) if rng.random() < 0.3}
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_bitset_matches_set(size):
+    rng = random.Random(size)
+    left, right, third = (random_ids(rng, size) for _ in range(3))
+    a, b, c = (Bitset.from_ids(ids, size) for ids in (left, right, third))
+    assert list(a) == sorted(left)
+    assert len(a) == a.count() == len(left)
+    assert bool(a) is bool(left)
+    assert set(a & b) == left & right
+    assert set(a | b) == left | right
+    assert set(a ^ b) == left ^ right
+    assert set(a - b) == left - right
+    assert set(~a) == set(range(size)) - left
+    assert set(a.union(b, c)) == left | right | third
+    assert set(a.intersection(b, c)) == left & right & third
+    assert Bitset.full(size) == Bitset.from_ids(range(size), size)
+    assert not Bitset.empty(size)
+    for item_id in range(-1, size + 1):
+        assert (item_id in a) is (item_id in left)
+
+
+def test_bitset_add_and_discard():
+    ids = Bitset.from_ids([1, 5], 6)
+    assert list(ids.add(9)) == [1, 5, 9] and ids.add(9).size == 10
+    assert list(ids.discard(5)) == [1]
+    assert list(ids.discard(3)) == [1, 5]
+    assert list(ids) == [1, 5]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_bitset_mask_round_trip(size):
+    numpy = pytest.importorskip("numpy")
+    rng = random.Random(size)
+    ids = random_ids(rng, size)
+    mask = Bitset.from_ids(ids, size).to_mask()
+    assert mask.dtype == numpy.bool_ and len(mask) == size
+    assert set(numpy.flatnonzero(mask).tolist()) == ids
+    assert Bitset.from_mask(mask) == Bitset.from_ids(ids, size)
+
+
+def test_selected_bitsets_match_scan(database, query):
+    criteria, operator = query
+    expected = reference(database, criteria, operator)
+    selected = database.select(criteria, operator)
+    assert [database.data[item_id] for item_id in selected] == expected
+    assert selected.size == len(database.data)
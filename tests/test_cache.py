@@ -0,0 +1,141 @@
+"""
+Tests of the search cache of jsondb.Database against a plain scan of the items
+"""
+import pytest
+
+from conftest import reference
+from src.json_utils import jsondb
+
+EQUIVALENT_CRITERIA = [
+    (
+        {"Category": {"valid_values": jsondb.ValueSet(["category_1", "category_2"])}},
+        {
+            "Category": {
+                "valid_values": jsondb.ValueSet(["category_2", "category_1"]),
+                "operator": "any",
+            }
+        },
+    ),
+    (
+        {"Level": {"value": 50, "comparison": "geq"}},
+        {"Level": {"value": 50, "comparison": ">=", "accept_missing": 1}},
+    ),
+    (
+        {"Description": {"value": ["ka", "LO"]}},
+        {"Description": {"value": ["lo", "KA"], "operator": "or", "case": False}},
+    ),
+]
+
+
+def test_repeated_searches_hit_the_cache(database, query):
+    criteria, operator = query
+    expected = reference(database, criteria, operator)
+    database.cache_clear()
+    assert database.search(criteria, operator) == expected
+    assert database.search(criteria, operator) == expected
+    info = database.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+
+@pytest.mark.parametrize("first, second", EQUIVALENT_CRITERIA)
+def test_equivalent_criteria_share_an_entry(database, first, second):
+    database.cache_clear()
+    assert database.search(first) == reference(database, first)
+    assert database.search(second) == reference(database, second)
+    info = database.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+
+def test_cache_evicts_least_recently_used(database):
+    database.cache_size = 2
+    database.cache_clear()
+    searches = [{"Level": {"value": value, "comparison": "eq"}} for value in (1, 2, 3)]
+    database.search(searches[0])
+    database.search(searches[1])
+    database.search(searches[0])  # now the most recently used
+    database.search(searches[2])
+    assert database.cache_info().currsize == 2
+    for criteria in (searches[0], searches[2]):
+        assert database.search(criteria) == reference(database, criteria)
+    assert database.cache_info().hits == 3
+    assert database.search(searches[1]) == reference(database, searches[1])
+    assert database.cache_info().misses == 4
+
+
+def test_disabled_cache_matches_scan(database, query):
+    criteria, operator = query
+    database.cache_size = 0
+    database.cache_clear()
+    for _ in range(2):
+        assert database.search(criteria, operator) == reference(
+            database, criteria, operator
+        )
+    assert database.cache_info() == (0, 2, 0, 0, 0)
+
+NARROWING_CRITERIA = [
+    (
+        {"Level": {"value": 30, "comparison": "geq"}},
+        {"Level": {"value": 60, "comparison": "gt"}},
+    ),
+    (
+        {"Category": {"valid_values": jsondb.ValueSet(["category_1", "category_2"])}},
+        {"Category": {"valid_values": "category_2"}},
+    ),
+    (
+        {"Tags 0": {"valid_values": jsondb.ValueSet(["tag_1", "tag_2"])}},
+        {
+            "Tags 0": {
+                "valid_values": jsondb.ValueSet(["tag_1", "tag_2"]),
+                "operator": "and",
+            }
+        },
+    ),
+    (
+        {"Description": {"value": ["ka"]}},
+        {"Description": {"value": ["kar", "lo"], "operator": "and"}},
+    ),
+    (
+        {"Level": {"value": 50, "comparison": "lt", "accept_missing": False}},
+        {
+            "Level": {"value": 50, "comparison": "lt", "accept_missing": False},
+            "Name": {"value": ["a"]},
+        },
+    ),
+]
+
+
+@pytest.mark.parametrize("broad, narrow", NARROWING_CRITERIA)
+def test_refined_searches_match_scan(database, broad, narrow):
+    database.cache_clear()
+    assert database.search(broad) == reference(database, broad)
+    assert "refines a cached broader search" in database.explain(narrow)
+    assert database.search(narrow) == reference(database, narrow)
+    assert database.cache_info().refinements == 1
+
+
+@pytest.mark.parametrize("broad, narrow", NARROWING_CRITERIA)
+def test_broader_searches_are_not_refined(database, broad, narrow):
+    database.cache_clear()
+    database.search(narrow)
+    assert database.search(broad) == reference(database, broad)
+    assert database.cache_info().refinements == 0
+
+
+def test_repeated_searches_are_not_refined(database):
+    broad, narrow = NARROWING_CRITERIA[0]
+    database.cache_clear()
+    database.search(broad)
+    database.search(narrow)
+    assert "answered from the cache" in database.explain(narrow)
+    assert database.search(narrow) == reference(database, narrow)
+    info = database.cache_info()
+    assert (info.hits, info.refinements) == (1, 1)
+
+
+def test_searches_without_refinement_match_scan(database):
+    database.refine = False
+    database.cache_clear()
+    for broad, narrow in NARROWING_CRITERIA:
+        database.search(broad)
+        assert database.search(narrow) == reference(database, narrow)
+    assert database.cache_info().refinements == 0
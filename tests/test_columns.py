@@ -0,0 +1,94 @@
+"""
+Tests of the columns of jsondb.Database against the values of the items
+"""
+import pytest
+
+from conftest import reference, without_indexes
+from src.json_utils import jsoncolumn, jsondb
+from src.json_utils import jsonplus as json
+
+COLUMNS = {
+    "Integer": jsoncolumn.IntegerColumn,
+    "Text": jsoncolumn.TextColumn,
+    "Regex": jsoncolumn.TextColumn,
+    "Fuzzy": jsoncolumn.TextColumn,
+    "Option": jsoncolumn.DictionaryColumn,
+}
+
+MIXED_DATA = [
+    {"level": 3, "kind": "a", "text": "alpha"},
+    {"level": "high", "kind": ["a", "b"], "text": "beta"},
+    {"level": 7, "kind": {"x": "b"}, "text": 12},
+    {"kind": [["a"]]},
+    {"level": 2**70, "kind": "b", "text": "gamma"},
+]
+
+
+def same_value(column, item_id, json_value):
+    stored = column.get(item_id)
+    if json_value is json.MISSING or stored is json.MISSING:
+        return stored is json_value
+    if isinstance(column, jsoncolumn.DictionaryColumn):
+        # arrays holding the same values share the value of the first one
+        return column.encoding_key(stored) == column.encoding_key(json_value)
+    return stored == json_value
+
+
+def test_columns_hold_item_values(database):
+    for field_name, field in database.fields.items():
+        column = database.columns[field_name]
+        assert type(column) is COLUMNS[field.TYPE]
+        assert column.size == len(database.data)
+        for item_id, json_obj in enumerate(database.data):
+            assert same_value(column, item_id, field.path.resolve(json_obj))
+
+
+def make_mixed_database():
+    return jsondb.Database.from_json(
+        {
+            "fields": {
+                "level": {"type": "Integer", "key": "level"},
+                "kind": {"type": "Option", "key": "kind", "values": ["a", "b"]},
+                "text": {"type": "Text", "key": "text"},
+            },
+            "data": MIXED_DATA,
+        }
+    )
+
+
+def test_unfit_values_use_generic_columns():
+    database = make_mixed_database()
+    for field_name in ("level", "kind", "text"):
+        column = database.columns[field_name]
+        assert type(column) is jsoncolumn.Column
+        for item_id, json_obj in enumerate(database.data):
+            expected = database.fields[field_name].path.resolve(json_obj)
+            assert same_value(column, item_id, expected)
+
+
+@pytest.mark.parametrize(
+    "criteria",
+    [
+        {"level": {"value": 3, "comparison": "eq"}},
+        {"level": {"value": 5, "comparison": "neq", "accept_missing": False}},
+        {"level": {"value": 7, "comparison": "eq", "invert": True}},
+    ],
+)
+def test_generic_columns_match_scan(criteria):
+    database = without_indexes(make_mixed_database())
+    assert database.search(criteria) == reference(database, criteria)
+
+
+@pytest.mark.parametrize(
+    "criteria",
+    [
+        {"level": {"value": 5, "comparison": "lt"}},
+        {"kind": {"valid_values": jsondb.ValueSet(["a"]), "operator": "and"}},
+    ],
+)
+def test_generic_columns_fail_like_scan(criteria):
+    database = without_indexes(make_mixed_database())
+    with pytest.raises(TypeError):
+        reference(database, criteria)
+    with pytest.raises(TypeError):
+        database.search(criteria)
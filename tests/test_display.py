@@ -0,0 +1,66 @@
+"""
+Tests of the compiled display strings against their interpretation by format()
+"""
+import pytest
+
+from conftest import make_catalog
+from src import parsing
+
+DISPLAY_STRINGS = [
+    None,
+    "<b>{name}</b> {n1.level}",
+    "{missing}",
+    "{0} and {1}",
+    [
+        "{name}",
+        {"has_key": "n1.level", "yes": " level {n1.level}", "no": " no level"},
+        {"has_key": "n1.missing", "yes": "never"},
+    ],
+    {
+        "if_json_type": "tags_0",
+        "json_value": "one tag",
+        "json_array": {"forall": "tags_0", "display_string": "[{value}]"},
+        "json_object": "object",
+    },
+    {
+        "if_json_type": "missing",
+        "json_value": "",
+        "json_array": "",
+        "json_object": "",
+    },
+    {
+        "key": "n1.category",
+        "table": {"category_0": "first", "category_1": "{id}", "": "other"},
+    },
+    {"key": "tags_0", "table": {"": "unhashable values use the default"}},
+    {
+        "forall": "tags_1",
+        "display_string": {"key": "value", "table": {"tag_1": "!", "": "{value}"}},
+        "separator": ", ",
+    },
+    {"forall": "id", "display_string": "{value}"},
+    {"forall": "tags_0", "display_string": {"forall": "x", "display_string": "y"}},
+]
+
+OBJECTS = [
+    {"name": "a", "tags_0": "single", "n1": {"level": 1, "category": "category_1"}},
+    {"name": "b", "tags_0": {"x": 1}, "tags_1": ["tag_1", "tag_2"]},
+    ["first", "second"],
+    {},
+]
+
+
+@pytest.mark.parametrize("definition", DISPLAY_STRINGS)
+def test_compiled_display_strings_match_format(definition):
+    display_string = parsing.DisplayString.from_json(definition)
+    for json_obj in make_catalog()["data"][:50] + OBJECTS:
+        assert display_string.render(json_obj) == display_string.format(json_obj)
+
+
+def test_catalog_displays_match_format():
+    catalog = make_catalog()
+    display_string = parsing.DisplayString.from_json(catalog["display_string"])
+    for json_obj in catalog["data"]:
+        expected = display_string.format(json_obj)
+        assert parsing.get_display(display_string, json_obj) == expected
+        assert json_obj[parsing.CACHE_KEY] == expected
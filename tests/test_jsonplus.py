@@ -0,0 +1,53 @@
+"""
+Tests of the compiled key paths of jsonplus against the get() and has() functions
+"""
+import pytest
+
+from conftest import make_catalog, make_parsed_file
+from src.json_utils import jsonplus as json
+
+OBJECTS = [
+    {},
+    {"a": 1},
+    {"a": {"b": None}},
+    {"a": {"b": {"c": [1, 2]}}},
+    {"a": {"c": 3}, "b": 4},
+    {"a.b": 5},
+]
+
+
+@pytest.mark.parametrize("obj", OBJECTS)
+@pytest.mark.parametrize("key", ["a", "b", "a.b", "a.c", "a.b.c", ("a.b",)])
+def test_path_matches_get_and_has(obj, key):
+    path = json.Path(key)
+    try:
+        expected = json.get(obj, key)
+    except (KeyError, TypeError):
+        expected = json.MISSING
+    assert path.resolve(obj) == expected
+    if expected is not json.MISSING:
+        assert path.resolve(obj) is expected
+        assert path.has(obj) and json.has(obj, key)
+    else:
+        assert path.resolve(obj, default=None) is None
+        assert not path.has(obj)
+
+
+def test_field_paths_match_get():
+    database = make_parsed_file().database
+    for json_obj in make_catalog()["data"]:
+        for field in database.fields.values():
+            expected = (
+                json.get(json_obj, field.key)
+                if json.has(json_obj, field.key)
+                else json.MISSING
+            )
+            assert field.path.resolve(json_obj) == expected
+
+
+def test_path_indexes_sequences():
+    obj = {"a": [{"b": 1}, {"b": 2}]}
+    assert json.Path(("a", 1, "b")).resolve(obj) == 2
+    assert json.Path(("a", -2, "b")).resolve(obj) == 1
+    assert json.Path(("a", 2, "b")).resolve(obj) is json.MISSING
+    assert json.Path("a.1.b").resolve(obj) is json.MISSING
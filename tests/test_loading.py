@@ -0,0 +1,168 @@
+"""
+Tests of the incremental catalog loader against parse_file
+"""
+import copy
+
+import pytest
+
+from benchmarks import generator
+from conftest import QUERIES, reference
+from src import parsing
+from src.json_utils import jsonplus as json
+from src.json_utils import jsoncompact, jsonlines, sidecar
+
+HEADERS_FIRST = ("version", "fields", "display_string", "data", "name", "sort_keys")
+DATA_FIRST = ("data", "name", "sort_keys", "version", "fields", "display_string")
+NAME_FIRST = ("name", "version", "fields", "display_string", "sort_keys", "data")
+
+
+def make_catalog():
+    catalog = generator.catalog(generator.Spec(items=300))
+    catalog["name"] = "My Catalog"
+    catalog["sort_keys"] = ["Level", ["-Name", "Id"]]
+    return catalog
+
+
+def write_catalog(path, catalog, order):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({key: catalog[key] for key in order}, file)
+
+
+def load(path, **kwargs):
+    loader = parsing.CatalogLoader(path, **kwargs)
+    loader.start()
+    while not loader.step(count=64):
+        pass
+    return loader.parsed_file
+
+
+def check_searches(database, expected):
+    assert list(database.data) == expected.data
+    for _, criteria, operator in QUERIES:
+        found = reference(expected, criteria, operator)
+        assert database.search(criteria, operator) == found
+        assert database.search(criteria, operator, sort_by="-Name") == (
+            expected.search(criteria, operator, sort_by="-Name")
+        )
+
+
+@pytest.mark.parametrize("order", [HEADERS_FIRST, DATA_FIRST, NAME_FIRST])
+def test_loader_matches_parse_file(tmp_path, order):
+    catalog = make_catalog()
+    path = tmp_path / "catalog.json"
+    write_catalog(path, catalog, order)
+    expected = parsing.parse_file(copy.deepcopy(catalog), "catalog")
+    parsed_file = load(path)
+    assert parsed_file.name == expected.name == "My Catalog"
+    database, reference = parsed_file.database, expected.database
+    assert database.sort_keys == reference.sort_keys
+    assert database.data == reference.data
+    for spec in reference.sort_keys:
+        assert list(database.sort_order(spec)) == list(reference.sort_order(spec))
+    criteria = {"Level": {"value": 50, "comparison": "geq"}}
+    assert database.search(criteria, sort_by="-Name") == reference.search(
+        criteria, sort_by="-Name"
+    )
+
+
+@pytest.mark.parametrize("order", [HEADERS_FIRST, DATA_FIRST])
+def test_streamed_searches_match_scan(tmp_path, order):
+    catalog = make_catalog()
+    path = tmp_path / "catalog.json"
+    write_catalog(path, catalog, order)
+    expected = parsing.parse_file(copy.deepcopy(catalog), "catalog").database
+    index_file = sidecar.index_path(path)
+    # built from the items, then loaded from the index file written the first time
+    for _ in range(2):
+        check_searches(load(path, index_file=index_file).database, expected)
+        assert index_file.exists()
+
+
+@pytest.mark.parametrize("compact, records", [(True, False), (False, True)])
+def test_compact_items_match_scan(tmp_path, compact, records):
+    catalog = make_catalog()
+    path = tmp_path / "catalog.json"
+    write_catalog(path, catalog, HEADERS_FIRST)
+    expected = parsing.parse_file(copy.deepcopy(catalog), "catalog")
+    parsed_file = load(path, compact=compact, records=records)
+    database = parsed_file.database
+    if records:
+        assert all(isinstance(item, jsoncompact.Record) for item in database.data)
+    # the items are not shared, so that their displays are cached apart
+    assert len({id(item) for item in database.data}) == len(database.data)
+    check_searches(database, expected.database)
+    for json_obj, expected_obj in zip(database.data, expected.database.data):
+        assert parsing.get_display(parsed_file.display_string, json_obj) == (
+            expected.display_string.format(expected_obj)
+        )
+
+
+def write_lines(tmp_path, catalog):
+    """
+    Writes a catalog with its items in a JSON Lines data file, separated by blank lines
+    """
+    lines = tmp_path / "items.jsonl"
+    with open(lines, "w", encoding="utf-8") as file:
+        for json_obj in catalog["data"]:
+            file.write(json.dumps(json_obj) + "\n\n")
+    headers = {key: value for key, value in catalog.items() if key != "data"}
+    headers["data_file"] = lines.name
+    path = tmp_path / "catalog.json"
+    write_catalog(path, headers, list(headers))
+    return path
+
+
+def test_data_file_items_match_scan(tmp_path):
+    catalog = make_catalog()
+    path = write_lines(tmp_path, catalog)
+    expected = parsing.parse_file(copy.deepcopy(catalog), "catalog").database
+    index_file = sidecar.index_path(path)
+    for _ in range(2):
+        database = load(path, index_file=index_file).database
+        assert isinstance(database.data, jsonlines.JsonLines)
+        check_searches(database, expected)
+    # the modified items are kept in memory
+    operations = [("update", 3, {"id": 3}), ("insert", {"id": 400}), ("delete", 7)]
+    database.bulk_apply(operations)
+    expected.bulk_apply(operations)
+    check_searches(database, expected)
+
+
+def write_shards(tmp_path, catalog, shards):
+    """
+    Writes a catalog with its items split into `shards` files
+    """
+    (tmp_path / "shards").mkdir()
+    size = -(-len(catalog["data"]) // shards)
+    for shard in range(shards):
+        items = catalog["data"][shard * size : (shard + 1) * size]
+        shard_path = tmp_path / "shards" / ("%02d.json" % shard)
+        with open(shard_path, "w", encoding="utf-8") as file:
+            json.dump(items, file)
+    headers = {key: value for key, value in catalog.items() if key != "data"}
+    headers["data_shards"] = ["shards/0*.json", "shards/1*.json"]
+    path = tmp_path / "catalog.json"
+    write_catalog(path, headers, list(headers))
+    return path
+
+
+def test_sharded_items_match_scan(tmp_path):
+    catalog = make_catalog()
+    path = write_shards(tmp_path, catalog, 12)
+    expected = parsing.parse_file(copy.deepcopy(catalog), "catalog").database
+    index_file = sidecar.index_path(path)
+    # built in the worker processes, then loaded from the index file
+    for _ in range(2):
+        check_searches(load(path, index_file=index_file, workers=2).database, expected)
+
+
+def test_loader_rejects_data_file_after_data(tmp_path):
+    catalog = make_catalog()
+    catalog["data_file"] = "items.jsonl"
+    path = tmp_path / "catalog.json"
+    write_catalog(path, catalog, HEADERS_FIRST + ("data_file",))
+    loader = parsing.CatalogLoader(path)
+    loader.start()
+    with pytest.raises(ValueError, match="data_file"):
+        while not loader.step():
+            pass
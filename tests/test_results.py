@@ -0,0 +1,125 @@
+"""
+Tests of the pages, counts and orders of search results against a plain scan
+"""
+import itertools
+from collections import Counter
+
+import pytest
+
+from conftest import make_catalog, reference, without_indexes
+from src import parsing
+from src.json_utils import jsoncolumn
+from src.json_utils import jsonplus as json
+
+PAGES = [(None, 0), (10, 0), (10, 25), (100, 350), (50, 1000), (0, 5)]
+SORT_KEYS = [
+    "Level",
+    "-Level",
+    ["-Level", "Id"],
+    [("Category", "asc"), ("Name", "desc")],
+    "Name",
+    "-Description",
+    "Tags 0",
+]
+
+
+def test_pages_match_scan(database, query):
+    criteria, operator = query
+    expected = reference(database, criteria, operator)
+    for limit, offset in PAGES:
+        stop = None if limit is None else offset + limit
+        page = database.search(criteria, operator, limit=limit, offset=offset)
+        assert page == expected[offset:stop]
+
+
+def test_lazy_results_match_scan(database, query):
+    criteria, operator = query
+    expected = reference(database, criteria, operator)
+    assert database.count(criteria, operator) == len(expected)
+    results = database.search_iter(criteria, operator)
+    assert list(itertools.islice(results, 5)) == expected[:5]
+    assert list(results) == expected[5:]
+
+
+def reference_facet(database, criteria, operator, field_name):
+    """
+    Counts the items of each value of a field by testing the items one by one
+    """
+    field = database.fields[field_name]
+    if operator == "and":
+        criteria = {
+            name: kwargs for name, kwargs in criteria.items() if name != field_name
+        }
+    values = [
+        field.path.resolve(json_obj)
+        for json_obj in reference(database, criteria, operator)
+    ]
+    values = [json_value for json_value in values if json_value is not json.MISSING]
+    if field.TYPE == "Integer":
+        return dict(sorted(Counter(values).items()))
+    return {
+        value: sum(1 for json_value in values if field.test(json_value, value))
+        for value in field.values
+    }
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_facets_match_scan(database, query, indexed):
+    criteria, operator = query
+    if not indexed:
+        without_indexes(database)
+    facets = database.facets(criteria, operator=operator)
+    assert set(facets) == {"Id", "Level", "Category", "Tags 0", "Tags 1"}
+    for field_name, counts in facets.items():
+        assert counts == reference_facet(database, criteria, operator, field_name)
+
+
+def reference_sort(database, items, sort_by):
+    """
+    Sorts items by comparing their values, with one stable sort per key from the last
+    one. Items without a sortable value come last
+    """
+    for field_name, order in reversed(database.sort_spec(sort_by)):
+        path = database.fields[field_name].path
+        keyed = [
+            (jsoncolumn.Column.sort_key(path.resolve(json_obj)), json_obj)
+            for json_obj in items
+        ]
+        sortable = sorted(
+            (pair for pair in keyed if pair[0] is not None),
+            key=lambda pair: pair[0],
+            reverse=order.value == "desc",
+        )
+        items = [json_obj for _, json_obj in sortable] + [
+            json_obj for key, json_obj in keyed if key is None
+        ]
+    return items
+
+
+def test_sorted_searches_match_scan(database, query):
+    criteria, operator = query
+    found = reference(database, criteria, operator)
+    for sort_by in SORT_KEYS:
+        expected = reference_sort(database, found, sort_by)
+        for limit, offset in [(None, 0), (15, 0), (20, 30)]:
+            stop = None if limit is None else offset + limit
+            page = database.search(
+                criteria, operator, limit=limit, offset=offset, sort_by=sort_by
+            )
+            assert page == expected[offset:stop]
+        results = database.search_iter(criteria, operator, sort_by=sort_by)
+        assert list(results) == expected
+
+
+def test_presorted_searches_match_scan(query):
+    criteria, operator = query
+    catalog = make_catalog()
+    catalog["sort_keys"] = SORT_KEYS
+    database = parsing.parse_file(catalog, "sorted").database
+    assert len(database.sort_orders) == len(SORT_KEYS)
+    found = reference(database, criteria, operator)
+    for sort_by in SORT_KEYS:
+        expected = reference_sort(database, found, sort_by)
+        for limit in (None, 15):
+            page = database.search(criteria, operator, limit=limit, sort_by=sort_by)
+            assert page == expected[:limit]
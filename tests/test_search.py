@@ -0,0 +1,157 @@
+"""
+Tests of the searches of jsondb.Database against a plain scan of the items
+"""
+import pytest
+
+from conftest import make_catalog, reference
+from src.json_utils import jsoncolumn, jsondb, jsonindex
+
+OPTION_CRITERIA = [
+    {"Category": {"valid_values": "category_3"}},
+    {"Category": {"valid_values": "category_3", "invert": True}},
+    {"Category": {"valid_values": jsondb.ValueSet(["category_1", "category_5"])}},
+    {"Tags 0": {"valid_values": "tag_2"}},
+    {"Tags 0": {"valid_values": jsondb.ValueSet(["tag_1", "tag_4"]), "operator": "or"}},
+    {
+        "Tags 0": {
+            "valid_values": jsondb.ValueSet(["tag_1", "tag_4"]),
+            "operator": "and",
+            "invert": True,
+        }
+    },
+    {"Tags 1": {"valid_values": jsondb.ValueSet([]), "operator": "and"}},
+]
+
+COMPARISONS = ["eq", "neq", "lt", "leq", "gt", "geq"]
+INTEGER_CRITERIA = [
+    {"Level": {"value": value, "comparison": comparison}}
+    for value in (1, 50, 100)
+    for comparison in COMPARISONS
+] + [
+    {"Level": {"value": 30, "comparison": "lt", "accept_missing": False}},
+    {"Level": {"value": 30, "comparison": "geq", "invert": True}},
+    {"Id": {"value": 0, "comparison": "lt"}},
+    {"Id": {"value": 399, "comparison": "leq"}},
+]
+
+# words of the first item, so that the text searches have results
+WORDS = make_catalog()["data"][0]["description"].split()
+TEXT_CRITERIA = [
+    {"Description": {"value": [WORDS[0]]}},
+    {"Description": {"value": [WORDS[0].upper()]}},
+    {"Description": {"value": [WORDS[0].upper()], "case": True}},
+    {"Description": {"value": [WORDS[0], WORDS[1]], "operator": "and"}},
+    {"Description": {"value": [WORDS[0], WORDS[1]], "operator": "or"}},
+    {"Description": {"value": ["%s %s" % (WORDS[0], WORDS[1])]}},
+    {"Description": {"value": ["ka"]}},
+    {"Description": {"value": ["a", "zz"], "operator": "and"}},
+    {"Description": {"value": [""]}},
+    {"Description": {"value": ["qqq"], "invert": True}},
+    {"Name": {"value": [WORDS[0][:3]], "accept_missing": False}},
+]
+
+
+@pytest.fixture(autouse=True)
+def no_vectors(monkeypatch):
+    # the indexes are used for the fields NumPy would vectorize otherwise
+    monkeypatch.setattr(jsoncolumn, "numpy", None)
+
+
+def check(database, criteria, operator="and"):
+    database.cache_clear()
+    assert database.search(criteria, operator) == reference(
+        database, criteria, operator
+    )
+
+
+def test_option_fields_are_indexed(database):
+    for field_name in ("Category", "Tags 0", "Tags 1"):
+        assert isinstance(database.indexes[field_name], jsonindex.PostingIndex)
+
+
+@pytest.mark.parametrize("criteria", OPTION_CRITERIA)
+def test_option_index_matches_scan(database, criteria):
+    check(database, criteria)
+
+
+def test_integer_fields_are_indexed(database):
+    for field_name in ("Id", "Level"):
+        assert isinstance(database.indexes[field_name], jsonindex.SortedIndex)
+
+
+@pytest.mark.parametrize("criteria", INTEGER_CRITERIA)
+def test_integer_index_matches_scan(database, criteria):
+    check(database, criteria)
+
+
+def test_text_fields_are_indexed(database):
+    for field_name in ("Name", "Description"):
+        assert isinstance(database.indexes[field_name], jsonindex.TrigramIndex)
+
+
+@pytest.mark.parametrize("criteria", TEXT_CRITERIA)
+def test_trigram_index_matches_scan(database, criteria):
+    check(database, criteria)
+
+
+def test_scenario_searches_match_scan(database, query):
+    check(database, *query)
+
+
+@pytest.mark.parametrize("operator", ["and", "or"])
+@pytest.mark.parametrize(
+    "criteria",
+    [
+        {**OPTION_CRITERIA[2], **INTEGER_CRITERIA[4], **TEXT_CRITERIA[6]},
+        {**OPTION_CRITERIA[5], **INTEGER_CRITERIA[-3], **TEXT_CRITERIA[3]},
+        {**OPTION_CRITERIA[0], **INTEGER_CRITERIA[0], **TEXT_CRITERIA[-1]},
+    ],
+)
+def test_planned_searches_match_scan(database, criteria, operator):
+    database.indexes["Name"] = None  # one field tests the items
+    check(database, criteria, operator)
+
+
+@pytest.mark.parametrize("operator", ["and", "or"])
+def test_plan_orders_fields_by_engine_and_estimate(database, operator):
+    database.indexes["Name"] = None
+    criteria = {**OPTION_CRITERIA[2], **INTEGER_CRITERIA[4], **TEXT_CRITERIA[-1]}
+    plan = database.plan(criteria, operator)
+    assert plan.steps[-1].engine is jsondb.Engine.SCAN
+    engines = [jsondb.QueryPlan.ENGINE_ORDER[step.engine] for step in plan.steps]
+    assert engines == sorted(engines)
+    for engine in jsondb.Engine:
+        estimates = [step.estimate for step in plan.steps if step.engine is engine]
+        assert estimates == sorted(estimates, reverse=operator == "or")
+    explanation = database.explain(criteria, operator)
+    for field_name in criteria:
+        assert field_name in explanation
+
+
+def test_prepared_searches_match_scan(database, query):
+    criteria, operator = query
+    expected = reference(database, criteria, operator)
+    prepared = database.prepare(criteria, operator)
+    assert database.prepare(prepared) is prepared
+    assert [json_obj for json_obj in database.data if prepared.match(json_obj)] == (
+        expected
+    )
+    for _ in range(2):
+        database.cache_clear()
+        assert database.search(prepared) == expected
+
+
+@pytest.mark.parametrize(
+    "criteria, error",
+    [
+        ({"Category": {"valid_values": "category_99"}}, ValueError),
+        ({"Tags 0": {"valid_values": jsondb.ValueSet(["tag_1", "x"])}}, ValueError),
+        ({"Level": {"value": 0}}, ValueError),
+        ({"Description regex": {"value": "("}}, ValueError),
+        ({"Description fuzzy": {"value": "ka", "distance": -1}}, ValueError),
+        ({"Unknown": {"value": 1}}, ValueError),
+    ],
+)
+def test_invalid_criteria_fail_when_prepared(database, criteria, error):
+    with pytest.raises(error):
+        database.prepare(criteria)
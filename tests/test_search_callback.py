@@ -0,0 +1,99 @@
+"""
+Tests of the paging of search results shown by the GUI
+"""
+import copy
+
+import pytest
+
+# the backends package imports the tkinter backend and its dependencies
+pytest.importorskip("dotmap")
+pytest.importorskip("tk_html_widgets")
+
+from benchmarks import generator
+from src import parsing
+from src.backends import common
+
+
+class Display(common.AbstractHTMLDisplay):
+    def __init__(self):
+        self.html = None
+
+    def display_html(self, html):
+        self.html = html
+
+
+class Button(common.AbstractKwargsProvider):
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def get_kwargs(self):
+        return dict(self.kwargs)
+
+
+class SearchCallback(common.AbstractSearchCallback):
+    PAGE_SIZE = 40
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.status = None
+        self.paging = None
+        self.shown = []
+
+    def show_error(self, title="", message=""):
+        raise AssertionError(message)
+
+    def set_status(self, msg):
+        self.status = msg
+
+    def set_paging(self, previous, next_):
+        self.paging = (previous, next_)
+
+    def show_results(self, results):
+        self.shown = list(results)
+
+
+def make_callback(items=100, sort_key=None):
+    catalog = generator.catalog(generator.Spec(items=items))
+    parsed_file = parsing.parse_file(copy.deepcopy(catalog), "catalog")
+    button_kwargs = {}
+    if sort_key is not None:
+        button_kwargs["sort_by"] = parsed_file.database.sort_spec(sort_key)
+    return SearchCallback(
+        parsed_file=parsed_file,
+        search_button=Button(operator="All", **button_kwargs),
+        gui_dict={},
+        display=Display(),
+        modes_getter=lambda: None,
+    )
+
+
+def test_pages_cover_the_results():
+    callback = make_callback(sort_key=["-Level", "Id"])
+    callback()
+    expected = callback.parsed_file.database.search(
+        criteria={}, sort_by=callback.query[2]
+    )
+    pages = [callback.shown]
+    assert callback.paging == (False, True)
+    assert callback.status.startswith("Found 100 items, showing 1 to 40")
+    while callback.paging[1]:
+        callback.next_page()
+        pages.append(callback.shown)
+    assert callback.paging == (True, False)
+    assert [len(page) for page in pages] == [40, 40, 20]
+    assert [item for page in pages for item in page] == expected
+    callback.next_page()
+    assert callback.page == 2
+    callback.previous_page()
+    assert callback.shown == pages[1]
+    assert callback.paging == (True, True)
+
+
+def test_single_page_disables_paging():
+    callback = make_callback(items=30)
+    callback()
+    assert callback.paging == (False, False)
+    assert callback.status == "Found 30 items"
+    callback.previous_page()
+    callback.next_page()
+    assert callback.page == 0
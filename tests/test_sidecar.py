@@ -0,0 +1,96 @@
+"""
+Tests of the databases loaded from index files against a plain scan of the items
+"""
+import random
+
+import pytest
+
+from benchmarks import generator
+from conftest import QUERIES, SPEC, make_catalog, reference
+from src import parsing
+from src.json_utils import jsonplus as json
+from src.json_utils import sidecar
+
+SORT_KEYS = ["Level", ["-Name", "Id"]]
+
+
+@pytest.fixture
+def catalog_file(tmp_path):
+    catalog = make_catalog()
+    catalog["sort_keys"] = SORT_KEYS
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(catalog), encoding="utf-8")
+    return path
+
+
+def open_catalog(path):
+    content = path.read_bytes()
+    return parsing.parse_file(
+        json.loads(content),
+        path.name,
+        index_file=sidecar.index_path(path),
+        catalog_key=sidecar.catalog_key(path, content),
+    ).database
+
+
+def check_searches(database, built):
+    for _, criteria, operator in QUERIES:
+        expected = reference(database, criteria, operator)
+        assert database.search(criteria, operator) == expected
+        for sort_by in SORT_KEYS + ["Category"]:
+            assert database.search(
+                criteria, operator, sort_by=sort_by
+            ) == built.search(criteria, operator, sort_by=sort_by)
+        assert database.facets(criteria, operator=operator) == built.facets(
+            criteria, operator=operator
+        )
+
+
+def test_loaded_database_matches_scan(catalog_file):
+    built = open_catalog(catalog_file)
+    index_file = sidecar.index_path(catalog_file)
+    assert index_file.exists()
+    key = sidecar.catalog_key(catalog_file, catalog_file.read_bytes())
+    assert sidecar.stored_key(index_file) == key
+    loaded = open_catalog(catalog_file)
+    # the arrays of the loaded columns are views of the index file
+    assert isinstance(loaded.columns["Level"].values, memoryview)
+    assert loaded.data == built.data
+    check_searches(loaded, built)
+
+
+def test_loaded_database_can_be_modified(catalog_file):
+    open_catalog(catalog_file)
+    loaded = open_catalog(catalog_file)
+    built = open_catalog(catalog_file)
+    rng = random.Random(0)
+    new_items = generator.items(SPEC._replace(seed=1))
+    operations = [("insert", next(new_items)) for _ in range(10)]
+    operations += [("update", rng.randrange(400), next(new_items)) for _ in range(10)]
+    operations += [("delete", item_id) for item_id in rng.sample(range(400), 10)]
+    for database in (loaded, built):
+        database.bulk_apply(operations)
+    check_searches(loaded, built)
+
+
+@pytest.mark.parametrize("damage", [b"", b"SAJE-IDX\x05", b"not an index file"])
+def test_unusable_index_files_are_rebuilt(catalog_file, damage):
+    built = open_catalog(catalog_file)
+    index_file = sidecar.index_path(catalog_file)
+    index_file.write_bytes(damage)
+    database = open_catalog(catalog_file)
+    check_searches(database, built)
+    key = sidecar.catalog_key(catalog_file, catalog_file.read_bytes())
+    assert sidecar.stored_key(index_file) == key
+
+
+def test_index_file_of_another_version_is_ignored(catalog_file):
+    open_catalog(catalog_file)
+    catalog = json.loads(catalog_file.read_bytes())
+    catalog["data"] = catalog["data"][::-1]
+    catalog_file.write_text(json.dumps(catalog), encoding="utf-8")
+    database = open_catalog(catalog_file)
+    assert database.data == catalog["data"]
+    for _, criteria, operator in QUERIES:
+        expected = reference(database, criteria, operator)
+        assert database.search(criteria, operator) == expected
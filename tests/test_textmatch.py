@@ -0,0 +1,113 @@
+"""
+Tests of the text matchers against plain substring and edit-distance checks
+"""
+import random
+import re
+
+import pytest
+
+from benchmarks import generator
+from conftest import SPEC, reference, without_indexes
+from src.json_utils import ahocorasick, jsondb, textmatch
+
+ALPHABET = "abc"
+
+
+def random_text(rng, length):
+    return "".join(rng.choice(ALPHABET) for _ in range(length))
+
+
+def substring_distance(pattern, text):
+    """
+    Returns the smallest edit distance between `pattern` and a substring of `text`
+    """
+    # row[j] is the distance of the pattern prefix to the best match ending at j
+    row = [0] * (len(text) + 1)
+    for position, char in enumerate(pattern, start=1):
+        previous, row = row, [position]
+        for index, text_char in enumerate(text, start=1):
+            row.append(
+                min(
+                    previous[index] + 1,
+                    row[index - 1] + 1,
+                    previous[index - 1] + (char != text_char),
+                )
+            )
+    return min(row)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_automaton_matches_substrings(seed):
+    rng = random.Random(seed)
+    patterns = [random_text(rng, rng.randint(0 if seed else 1, 4)) for _ in range(8)]
+    automaton = ahocorasick.Automaton(patterns)
+    for _ in range(50):
+        text = random_text(rng, rng.randint(0, 12))
+        found = {pattern for pattern in patterns if pattern in text}
+        assert automaton.find(text) == found
+        assert automaton.match_any(text) is bool(found)
+        assert automaton.match_all(text) is (found == set(patterns))
+
+
+@pytest.mark.parametrize("operator", ["or", "and"])
+@pytest.mark.parametrize("case", [False, True])
+def test_many_subtexts_match_scan(database, operator, case):
+    words = generator.vocabulary(SPEC)
+    count = jsondb.TextField.AUTOMATON_THRESHOLD + 6
+    subtexts = words[:count] if operator == "or" else ["ka", "LO", "mi"] * 10
+    criteria = {
+        "Description": {"value": subtexts, "operator": operator, "case": case}
+    }
+    expected = reference(database, criteria)
+    assert database.search(criteria) == expected
+    assert without_indexes(database).search(criteria) == expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fuzzy_matcher_matches_edit_distance(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        pattern = random_text(rng, rng.randint(0, 6))
+        text = random_text(rng, rng.randint(0, 15))
+        distance = rng.randint(0, 2)
+        matcher = textmatch.FuzzyMatcher(pattern, distance)
+        expected = substring_distance(pattern, text) <= distance
+        assert matcher(text) is expected
+        assert matcher.scan(text) is expected
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    ["ab+c", "a(b|c)d", "x[yz]w", "^ab", "a.?b", "(?i)Ab", "abc|d", "ab{2}c"],
+)
+@pytest.mark.parametrize("case", [False, True])
+def test_required_literals_are_in_matches(pattern, case):
+    regex = textmatch.compile_regex(pattern, case)
+    literals = textmatch.required_literals(pattern, case)
+    literal_case = case and not regex.flags & re.IGNORECASE
+    rng = random.Random(pattern)
+    for _ in range(300):
+        text = "".join(rng.choice("abcdxyzwABC") for _ in range(rng.randint(0, 8)))
+        if regex.search(text):
+            folded = text if literal_case else text.lower()
+            assert all(literal in folded for literal in literals)
+
+
+REGEX_AND_FUZZY_CRITERIA = [
+    {"Description regex": {"value": "ka.*lo"}},
+    {"Description regex": {"value": "^(ka|lo)"}},
+    {"Description regex": {"value": "ka[^ ]+ ", "case": True}},
+    {"Description regex": {"value": "(?i)KAZU"}},
+    {"Description regex": {"value": "sa ", "invert": True}},
+    {"Description fuzzy": {"value": "karulo", "distance": 1}},
+    {"Description fuzzy": {"value": "kaRUlo", "distance": 2, "case": True}},
+    {"Description fuzzy": {"value": "ka", "distance": 2}},
+    {"Description fuzzy": {"value": "karu", "distance": 0}},
+]
+
+
+@pytest.mark.parametrize("criteria", REGEX_AND_FUZZY_CRITERIA)
+def test_regex_and_fuzzy_searches_match_scan(database, criteria):
+    expected = reference(database, criteria)
+    assert database.search(criteria) == expected
+    assert without_indexes(database).search(criteria) == expected
@@ -0,0 +1,79 @@
+"""
+Tests of the opt-in timing instrumentation
+"""
+import pytest
+
+from conftest import reference, without_indexes
+from src import parsing
+from src.json_utils import jsoncolumn, jsondb, timing
+
+
+@pytest.fixture
+def timing_off():
+    timing.disable()
+    timing.reset()
+    yield
+    timing.disable()
+    timing.reset()
+
+
+def make_database():
+    return jsondb.Database.from_json(
+        {
+            "fields": {"level": {"type": "Integer", "key": "level"}},
+            "data": [{"level": level} for level in range(20)],
+        }
+    )
+
+
+def test_display_nodes_follow_timing_at_render_time(timing_off):
+    display_string = parsing.DisplayString.from_json(
+        ["{name}: ", {"has_key": "level", "yes": "{level}"}]
+    )
+    json_obj = {"name": "a", "level": 3}
+    expected = display_string.format(json_obj)
+    # compiled while timing is disabled
+    assert display_string.render(json_obj) == expected
+    assert timing.stats() == {}
+    timing.enable()
+    assert display_string.render(json_obj) == expected
+    assert any(name.startswith("display_string.") for name in timing.stats())
+    timing.disable()
+    timing.reset()
+    assert display_string.render(json_obj) == expected
+    assert timing.stats() == {}
+
+
+def test_field_test_times_the_items_tested(timing_off, monkeypatch):
+    monkeypatch.setattr(jsoncolumn, "numpy", None)  # not vectorized
+    database = make_database()
+    database.indexes["level"] = None  # scan the items with the compiled test
+    criteria = {"level": {"value": 5, "comparison": "geq"}}
+    prepared = database.prepare(criteria)
+    timing.enable()
+    database.cache_clear()
+    assert len(database.search(prepared)) == 15
+    stats = timing.stats()
+    assert stats["Integer(level).test"]["count"] == 20
+    assert stats["Integer(level).select"]["count"] == 1
+    timing.disable()
+    timing.reset()
+    database.cache_clear()
+    assert len(database.search(prepared)) == 15
+    assert timing.stats() == {}
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_timed_searches_match_scan(timing_off, database, query, indexed):
+    criteria, operator = query
+    if not indexed:
+        without_indexes(database)
+    expected = reference(database, criteria, operator)
+    timing.enable()
+    assert database.search(criteria, operator) == expected
+    assert database.count(criteria, operator) == len(expected)
+    stats = timing.stats()
+    assert stats["Database.search"]["count"] == 1
+    assert stats["Database.count"]["count"] == 1
+    assert timing.last("Database.search") >= 0
+    assert "Database.search" in timing.report()
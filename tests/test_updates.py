@@ -0,0 +1,146 @@
+"""
+Tests of the modifications of jsondb.Database against a database rebuilt from the
+modified data, and a plain scan of its items
+"""
+import random
+
+import pytest
+
+from benchmarks import generator
+from conftest import QUERIES, SPEC, make_catalog, reference
+from src import parsing
+from src.json_utils import jsondb
+
+SORT_KEYS = ["Level", ["-Category", "Name"], "-Id"]
+
+
+def make_database():
+    catalog = make_catalog()
+    catalog["sort_keys"] = SORT_KEYS
+    return parsing.parse_file(catalog, "updated").database
+
+
+def random_operations(rng, data, new_items, count):
+    """
+    Returns `count` random operations on the items of `data`
+    """
+    operations, deleted = [], set()
+    alive = [item_id for item_id, json_obj in enumerate(data) if json_obj is not None]
+    for _ in range(count):
+        kind = rng.choice(["insert", "update", "delete"])
+        if kind == "insert":
+            operations.append(("insert", next(new_items)))
+            continue
+        item_id = rng.choice([item_id for item_id in alive if item_id not in deleted])
+        if kind == "update":
+            operations.append(("update", item_id, next(new_items)))
+        else:
+            deleted.add(item_id)
+            operations.append(("delete", item_id))
+    return operations
+
+
+def replay(data, operations):
+    """
+    Applies operations to a copy of `data`, as a list
+
+    Returns:
+        The new list, and the (item id, old object, new object) of each operation
+    """
+    data, changes = list(data), []
+    for kind, *arguments in operations:
+        if kind == "insert":
+            item_id, json_obj = len(data), arguments[0]
+            data.append(json_obj)
+            changes.append((item_id, None, json_obj))
+            continue
+        item_id = arguments[0]
+        json_obj = arguments[1] if kind == "update" else None
+        changes.append((item_id, data[item_id], json_obj))
+        data[item_id] = json_obj
+    return data, changes
+
+
+def rebuild(database):
+    return jsondb.Database(
+        data=[json_obj for json_obj in database.data if json_obj is not None],
+        fields=database.fields,
+        sort_keys=SORT_KEYS,
+    )
+
+
+def check_searches(database):
+    rebuilt = rebuild(database)
+    for _, criteria, operator in QUERIES:
+        expected = reference(database, criteria, operator)
+        assert database.search(criteria, operator) == expected
+        assert rebuilt.search(criteria, operator) == expected
+        for sort_by in SORT_KEYS:
+            assert database.search(
+                criteria, operator, sort_by=sort_by
+            ) == rebuilt.search(criteria, operator, sort_by=sort_by)
+        assert database.facets(criteria, operator=operator) == rebuilt.facets(
+            criteria, operator=operator
+        )
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_bulk_apply_matches_rebuild(seed):
+    rng = random.Random(seed)
+    database = make_database()
+    new_items = generator.items(SPEC._replace(seed=seed + 1))
+    notifications = []
+    database.observers.append(lambda *change: notifications.append(change))
+    check_searches(database)  # fills the cache and the ranks
+    for batch in range(4):
+        operations = random_operations(rng, database.data, new_items, 1 + 20 * batch)
+        expected_data, changes = replay(database.data, operations)
+        notifications.clear()
+        item_ids = database.bulk_apply(operations)
+        assert item_ids == [item_id for item_id, _, _ in changes]
+        assert notifications == changes
+        assert database.data == expected_data
+        check_searches(database)
+
+
+def test_single_operations_match_rebuild():
+    database = make_database()
+    new_items = generator.items(SPEC._replace(seed=1))
+    check_searches(database)
+    item_id = database.insert(next(new_items))
+    assert item_id == len(database.data) - 1
+    database.update(3, next(new_items))
+    database.delete(5)
+    database.delete(item_id)
+    check_searches(database)
+
+
+def test_values_of_another_type_match_scan():
+    database = make_database()
+    criteria = {"Level": {"value": 50, "comparison": "eq"}}
+    database.search(criteria)
+    database.bulk_apply(
+        [("update", 0, {"id": 0, "n1": {"level": "high"}}), ("insert", {"id": 400})]
+    )
+    assert database.indexes["Level"] is None
+    assert database.search(criteria) == reference(database, criteria)
+    criteria = {"Level": {"value": 50, "comparison": "neq", "accept_missing": False}}
+    assert database.search(criteria) == reference(database, criteria)
+
+
+@pytest.mark.parametrize(
+    "operations, error",
+    [
+        ([("update", 400, {})], KeyError),
+        ([("delete", 3), ("delete", 3)], KeyError),
+        ([("insert", {}), ("update", 0, [])], ValueError),
+        ([("upsert", {})], ValueError),
+    ],
+)
+def test_invalid_batches_change_nothing(operations, error):
+    database = make_database()
+    data = list(database.data)
+    with pytest.raises(error):
+        database.bulk_apply(operations)
+    assert database.data == data
+    check_searches(database)
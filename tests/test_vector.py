@@ -0,0 +1,45 @@
+"""
+Tests of the NumPy-vectorized searches against a plain scan of the items
+"""
+import pytest
+
+from conftest import QUERIES, make_parsed_file, reference
+from src.json_utils import jsoncolumn, jsondb
+
+pytest.importorskip("numpy")
+
+VECTOR_CRITERIA = [
+    {"Category": {"valid_values": "category_3", "invert": True}},
+    {
+        "Tags 0": {
+            "valid_values": jsondb.ValueSet(["tag_1", "tag_4"]),
+            "operator": "and",
+        }
+    },
+    {"Level": {"value": 40, "comparison": "lt", "accept_missing": False}},
+    {"Level": {"value": 40, "comparison": "geq", "invert": True}},
+]
+
+
+@pytest.fixture(
+    params=QUERIES + [(None, criteria, "and") for criteria in VECTOR_CRITERIA]
+)
+def vector_query(request):
+    _, criteria, operator = request.param
+    return criteria, operator
+
+
+def test_integer_and_option_fields_are_vectorized(database):
+    criteria = {**VECTOR_CRITERIA[0], **VECTOR_CRITERIA[2]}
+    plan = database.plan(criteria)
+    assert [step.engine for step in plan.steps] == [jsondb.Engine.VECTOR] * 2
+
+
+def test_vectorized_searches_match_scan(vector_query, monkeypatch):
+    criteria, operator = vector_query
+    database = make_parsed_file().database
+    found = database.search(criteria, operator)
+    assert found == reference(database, criteria, operator)
+    monkeypatch.setattr(jsoncolumn, "numpy", None)
+    database.cache_clear()
+    assert database.search(criteria, operator) == found